@@ -1,6 +1,12 @@
-from tuner.tuner import Tuner
+import sys
 
 def main():
+    if len(sys.argv) > 1 and not sys.argv[1].startswith("-"):
+        # headless command line modes (e.g. `analyze`), these must not import PyQt6. options like -platform go to Qt
+        from tuner.cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
+
+    from tuner.tuner import Tuner
     tuner = Tuner()
     tuner.start()
 
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from tuner.audio_capture import BlockCapture
+from tuner.audio_source import SyntheticSource
+from tuner.pipeline import AnalysisPipeline
+
+@pytest.mark.parametrize("engine", ["fft", "cqt", "mpm", "yin"])
+def test_channels_in_one_worker_keep_separate_spectra(engine):
+    # run_channels keeps one pipeline per channel in the same process, like this. more channels than
+    # a plan has output slots, so channels sharing a plan would also share a published spectrum
+    frequencies = (110.0, 146.8, 196.0, 246.9)
+    sources = [SyntheticSource(12000, 1, frequency=frequency, harmonics=(1.0, 0.5)) for frequency in frequencies]
+    pipelines = [AnalysisPipeline(BlockCapture(4096), 12000, 4096, 256, engine=engine) for _ in sources]
+
+    for pipeline, source in zip(pipelines, sources):
+        pipeline.capture.push(source.read(4096))
+    for _ in range(4):
+        results = []
+        for pipeline, source in zip(pipelines, sources):
+            pipeline.capture.push(source.read(256))
+            results.append(pipeline.step()[0])
+
+    for index, first in enumerate(results):
+        for second in results[index + 1:]:
+            assert not np.shares_memory(first.magnitudes, second.magnitudes)
+    for result, frequency in zip(results, frequencies):
+        assert abs(1200 * np.log2(result.fundamental / frequency)) < 5
+        # the spectrum handed on is still this channel's, not overwritten by another channel's frame
+        strongest = result.frequencies[np.argmax(result.magnitudes)]
+        assert abs(1200 * np.log2(strongest / frequency)) < 50
@@ -0,0 +1,118 @@
+from functools import lru_cache
+import numpy as np
+
+from tuner.pitch_estimation import create_window
+
+class AnalysisTables:
+    """The read-only part of an analysis plan: the window and the frequency axis, shared by every plan of a configuration."""
+
+    def __init__(self, sample_rate, buffer_size, window="hann"):
+        self.window = create_window(window, buffer_size)
+        self.frequencies = np.fft.rfftfreq(buffer_size, 1 / sample_rate)
+        self.window.flags.writeable = False
+        self.frequencies.flags.writeable = False
+
+@lru_cache(maxsize=8)
+def get_analysis_tables(sample_rate, buffer_size, window="hann"):
+    """Return the cached tables for this configuration, building them on first use."""
+    return AnalysisTables(sample_rate, buffer_size, window)
+
+class AnalysisPlan:
+    """
+    Precomputed state for analysing frames of one (sample rate, buffer size, window) combination.
+
+    Holds the window, the frequency axis and every array written per frame, so analysing a frame
+    does not allocate anything proportional to the buffer size. The arrays are overwritten by the
+    next call to `analyse`; copy them if they have to outlive the frame. The window and the axis
+    are shared between plans (see `get_analysis_tables`), the arrays written per frame are not, so
+    every pipeline needs a plan of its own.
+    """
+
+    def __init__(self, sample_rate, buffer_size, window="hann", max_peaks=10, output_slots=3):
+        self.sample_rate = sample_rate
+        self.buffer_size = buffer_size
+        self.window_name = window
+        self.max_peaks = max_peaks
+
+        tables = get_analysis_tables(sample_rate, buffer_size, window)
+        self.window = tables.window
+        self.frequencies = tables.frequencies
+        self.bin_count = len(self.frequencies)
+
+        self.frame = np.zeros(buffer_size)  # Input frame, filled by the caller (e.g. from the ring buffer)
+        self.windowed = np.zeros(buffer_size)
+        self.spectrum = np.zeros(self.bin_count, dtype=np.complex128)
+        self.magnitudes = np.zeros(self.bin_count)
+        self.partitioned = np.zeros(self.bin_count)  # Scratch copy of the magnitudes for top-k selection
+        self.peak_mask = np.zeros(self.bin_count, dtype=bool)
+        self.comparison = np.zeros(self.bin_count, dtype=bool)  # Scratch for local maximum detection
+
+        # rotating copies of the magnitudes handed to other threads, see `publish_magnitudes`
+        self.output_magnitudes = np.zeros((output_slots, self.bin_count))
+        self.output_index = 0
+
+    def analyse(self, frame=None):
+        """Window and transform a frame. Returns (spectrum, magnitudes, peaks_idx), peaks sorted by ascending magnitude."""
+        self.transform(frame)
+        return self.spectrum, self.magnitudes, self.top_peaks(self.magnitudes)
+
+    def transform(self, frame=None):
+        """Window and transform a frame into `spectrum` and `magnitudes`."""
+        if frame is None:
+            frame = self.frame
+
+        np.multiply(frame, self.window, out=self.windowed)
+        np.fft.rfft(self.windowed, out=self.spectrum)
+        np.abs(self.spectrum, out=self.magnitudes)
+
+    def top_peaks(self, magnitudes):
+        """Indices of the `max_peaks` largest magnitudes, in ascending order of magnitude."""
+        count = min(self.max_peaks, self.bin_count)
+        kth = self.bin_count - count
+
+        # partition a scratch copy in place to find the k-th largest magnitude without a full sort
+        np.copyto(self.partitioned, magnitudes)
+        self.partitioned.partition(kth)
+        np.greater_equal(magnitudes, self.partitioned[kth], out=self.peak_mask)
+
+        peaks_idx = np.flatnonzero(self.peak_mask)[-count:]
+        return peaks_idx[np.argsort(magnitudes[peaks_idx], kind="stable")]
+
+    def local_maxima(self, magnitudes, min_frequency=20.0, relative_threshold=0.01):
+        """
+        Indices of up to `max_peaks` true local maxima, in ascending order of magnitude.
+
+        A bin is a local maximum if it is larger than its left and not smaller than its right
+        neighbour, lies above `min_frequency` and reaches `relative_threshold` of the largest magnitude.
+        """
+        mask = self.peak_mask
+        inner = slice(1, self.bin_count - 1)
+
+        np.greater(magnitudes[inner], magnitudes[:-2], out=mask[inner])
+        np.greater_equal(magnitudes[inner], magnitudes[2:], out=self.comparison[inner])
+        mask[inner] &= self.comparison[inner]
+        np.greater_equal(magnitudes, relative_threshold * magnitudes.max(), out=self.comparison)
+        mask &= self.comparison
+        mask[0] = mask[-1] = False
+        mask[:int(np.ceil(min_frequency * self.buffer_size / self.sample_rate))] = False
+
+        peaks_idx = np.flatnonzero(mask)
+        if len(peaks_idx) > self.max_peaks:
+            peaks_idx = peaks_idx[np.argpartition(magnitudes[peaks_idx], -self.max_peaks)[-self.max_peaks:]]
+        return peaks_idx[np.argsort(magnitudes[peaks_idx], kind="stable")]
+
+    def publish_magnitudes(self):
+        """
+        Copy the current magnitudes into the next output slot and return it.
+
+        A published array stays untouched for the next `output_slots - 1` frames, which gives a
+        consumer on another thread time to read it without the worker allocating per frame.
+        """
+        self.output_index = (self.output_index + 1) % len(self.output_magnitudes)
+        output = self.output_magnitudes[self.output_index]
+        np.copyto(output, self.magnitudes)
+        return output
+
+def get_analysis_plan(sample_rate, buffer_size, window="hann", max_peaks=10):
+    """A new analysis plan for this configuration, on the cached window and frequency axis."""
+    return AnalysisPlan(sample_rate, buffer_size, window, max_peaks)
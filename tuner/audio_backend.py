@@ -0,0 +1,108 @@
+import threading
+
+from tuner.audio_capture import create_capture
+from tuner.audio_source import import_pyaudio
+from tuner.config import load_config, save_config
+
+class AudioBackend:
+    """
+    The process's one PortAudio instance, and the input device choice cached across runs.
+
+    Initialising PortAudio enumerates every host API and device, the slowest part of a cold start,
+    so it happens once: on first use, or on a background thread started by `prepare` while the
+    window is being built. The device and sample rate that opened last time are stored in the
+    config file (see `tuner.config`) and opened directly on the next start, the default device is
+    only probed again when they fail.
+    """
+
+    def __init__(self, config_path=None):
+        self.config_path = config_path  # None for the default location
+        self.pyaudio = None
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def prepare(self):
+        """Start initialising PortAudio in the background, `get` then only waits for what is left."""
+        if self.pyaudio is None and self.thread is None:
+            self.thread = threading.Thread(target=self.warm_up, name="stroby-audio-init", daemon=True)
+            self.thread.start()
+
+    def warm_up(self):
+        try:
+            self.get()
+        except Exception:
+            pass  # reported by the `get` that opens the input
+
+    def get(self):
+        """The PyAudio instance, initialised on first use."""
+        with self.lock:
+            if self.pyaudio is None:
+                self.pyaudio = import_pyaudio().PyAudio()
+            return self.pyaudio
+
+    def open_input(self, mode, sample_rate, channels, frames_per_buffer, capacity, mixdown=True):
+        """
+        Open a live capture (see `create_capture`) on the cached device, or on the default one.
+        Returns (capture, sample_rate), the rate differs from the requested one if the device does not support it.
+        """
+        p = self.get()
+        cached = self.cached_input(sample_rate, channels)
+        if cached is not None:
+            try:
+                capture = create_capture(mode, p, cached["sample_rate"], channels, frames_per_buffer, capacity,
+                                         cached["device_index"], mixdown)
+                return capture, cached["sample_rate"]
+            except (OSError, ValueError) as e:
+                print(f"warning: cached input device failed ({e}), using the default device.")
+
+        device, rate = self.probe_input(sample_rate, channels)
+        capture = create_capture(mode, p, rate, channels, frames_per_buffer, capacity, device["index"], mixdown)
+        self.remember_input(sample_rate, channels, device, rate)
+        return capture, rate
+
+    def cached_input(self, sample_rate, channels):
+        """The cached settings for this request, if their device is still the one at the cached index."""
+        cached = load_config(self.config_path).get("input")
+        if not cached or cached.get("requested") != [sample_rate, channels]:
+            return None
+
+        try:
+            device = self.get().get_device_info_by_index(cached["device_index"])
+        except (OSError, ValueError, KeyError):
+            return None
+        return cached if device["name"] == cached.get("device_name") else None
+
+    def probe_input(self, sample_rate, channels):
+        """The default input device and the rate to open it at: `sample_rate` if supported, else the device's own."""
+        p = self.get()
+        pyaudio = import_pyaudio()
+        try:
+            device = p.get_default_input_device_info()
+        except OSError:
+            raise RuntimeError("no audio input device found") from None
+
+        try:
+            p.is_format_supported(sample_rate, input_device=device["index"], input_channels=channels,
+                                  input_format=pyaudio.paInt16)
+            return device, sample_rate
+        except ValueError:
+            rate = int(device["defaultSampleRate"])
+            print(f"warning: {device['name']} does not support {sample_rate} Hz, capturing at {rate} Hz.")
+            return device, rate
+
+    def remember_input(self, sample_rate, channels, device, rate):
+        config = load_config(self.config_path)
+        config["input"] = {
+            "requested": [sample_rate, channels],
+            "device_index": device["index"],
+            "device_name": device["name"],
+            "sample_rate": rate,
+        }
+        save_config(config, self.config_path)
+
+    def terminate(self):
+        if self.thread is not None:
+            self.thread.join()
+        if self.pyaudio is not None:
+            self.pyaudio.terminate()
+            self.pyaudio = None
@@ -0,0 +1,259 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+import numpy as np
+
+from tuner.audio_source import PyAudioSource, import_pyaudio
+from tuner.decimation import PolyphaseDecimator
+from tuner.ring_buffer import RingBuffer
+
+class Capture(ABC):
+    """
+    Collects incoming audio frames in a ring buffer for the analysis side.
+
+    The analysis thread calls `wait_for_frames` to block until a hop of new frames has arrived,
+    then copies the latest analysis window with `read_latest`.
+
+    With a decimation factor set, incoming audio is lowpassed and decimated before it reaches the
+    ring, so every count of frames here (capacity, hops, windows) is at the decimated rate.
+
+    Multi-channel input is mixed down to mono, unless `mixdown` is False: then the ring holds one
+    row of `channels` samples per frame (and decimation is left to the per-channel pipelines).
+    """
+
+    def __init__(self, capacity, channels=1, mixdown=True):
+        self.channels = channels
+        self.mixdown = mixdown or channels == 1
+        self.ring = RingBuffer(capacity, shape=() if self.mixdown else (channels,))
+        self.decimator = None  # A PolyphaseDecimator between the input and the ring, see set_decimation
+        self.finished = False  # Set once a finite input is exhausted
+        self.condition = threading.Condition()
+        self.read_position = 0  # Value of ring.total_written when the analysis side last consumed frames
+        self.position = 0  # Frames consumed by the analysis side since the capture was created
+        self.overflows = 0  # Input overflows reported by PortAudio
+        self.underflows = 0  # Input underflows reported by PortAudio
+        self.input_frames = 0  # Frames received from the input, before mixdown and decimation
+        self.input_position = 0  # Value of input_frames when the analysis side last consumed frames
+        self.recorder = None  # A SessionRecorder the raw input is copied to, see tuner.recording
+
+    def start(self):
+        """Start (or resume) capturing. The input is kept open while paused."""
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+    @abstractmethod
+    def wait_for_frames(self, count, timeout=0.5):
+        """Block until at least `count` frames arrived since the last call. Returns False on timeout or at the end of input."""
+
+    @property
+    def decimation(self):
+        return 1 if self.decimator is None else self.decimator.factor
+
+    def set_decimation(self, factor):
+        """Decimate the input by `factor` (1 for none) from now on. Drops the buffered frames, they are at the old rate."""
+        with self.condition:
+            self.decimator = PolyphaseDecimator(factor) if factor > 1 else None
+            self.ring.clear()
+            self.read_position = 0
+
+    def write_frames(self, data):
+        """Append interleaved int16 frames to the ring, mixed down to mono and decimated. Call with the condition held."""
+        if self.recorder is not None:
+            self.recorder.write_audio(data)
+        self.input_frames += len(data) // self.channels
+        if self.channels > 1:
+            data = data.reshape(-1, self.channels)
+            if self.mixdown:
+                data = data.mean(axis=1)
+        if self.decimator is not None:
+            data = self.decimator.process(data)
+        self.ring.write(data)
+
+    def consume(self):
+        """Mark every frame written so far as read by the analysis side. Call with the condition held."""
+        self.position += self.ring.total_written - self.read_position
+        self.read_position = self.ring.total_written
+        self.input_position = self.input_frames
+
+    def available(self):
+        """Number of frames currently held in the ring."""
+        with self.condition:
+            return len(self.ring)
+
+    def read_latest(self, count, out=None):
+        """Copy the `count` most recent frames into `out`. Returns None if fewer frames have been captured."""
+        with self.condition:
+            if len(self.ring) < count:
+                return None
+            return self.ring.read_latest(count, out=out)
+
+    def resize(self, capacity):
+        """Change the ring capacity in place, keeping the most recent frames."""
+        with self.condition:
+            self.ring.resize(capacity)
+            self.read_position = self.ring.total_written
+
+    def reserve(self, capacity):
+        """Grow the ring to hold at least `capacity` frames. It never shrinks, so a longer window is available again at once."""
+        with self.condition:
+            if capacity > self.ring.capacity:
+                self.ring.resize(capacity)
+                self.read_position = self.ring.total_written
+
+    def clear(self):
+        with self.condition:
+            self.ring.clear()
+            self.read_position = 0
+            if self.decimator is not None:
+                self.decimator.reset()
+
+    def stats(self):
+        # frames captured but not yet taken by the analysis side, i.e. the input queue depth
+        pending = self.ring.total_written - self.read_position
+        return {"overflows": self.overflows, "underflows": self.underflows, "pending_frames": pending}
+
+class SourceCapture(Capture):
+    """
+    Pulls audio from an `AudioSource` on the analysis thread itself.
+
+    Sources that are not real time (files, synthetic signals) are read as fast as the analysis
+    allows, unless `paced` is set, in which case reads are throttled to the source's sample rate.
+    """
+
+    def __init__(self, source, capacity, paced=False, mixdown=True):
+        super().__init__(capacity, source.channels, mixdown)
+        self.source = source
+        self.paced = paced and not source.realtime
+        self.started_at = None
+        self.frames_read = 0
+
+    def start(self):
+        self.source.start()
+        self.started_at = None
+
+    def stop(self):
+        self.source.stop()
+
+    def close(self):
+        self.source.close()
+
+    def wait_for_frames(self, count, timeout=0.5):
+        if self.finished:
+            return False
+
+        # `count` frames at the decimated rate
+        count *= self.decimation
+        if self.paced:
+            self.wait_for_source_clock(count)
+
+        data = self.source.read(count)
+        self.overflows = self.source.overflows
+
+        if len(data) < count * self.channels:
+            self.finished = True  # end of input, whatever is left is too short for a hop
+            return False
+
+        with self.condition:
+            self.write_frames(data)
+            self.consume()
+        return True
+
+    def wait_for_source_clock(self, count):
+        now = time.perf_counter()
+        if self.started_at is None:
+            self.started_at = now
+            self.frames_read = 0
+
+        self.frames_read += count
+        delay = self.started_at + self.frames_read / self.source.sample_rate - now
+        if delay > 0:
+            time.sleep(delay)
+
+class CallbackCapture(Capture):
+    """
+    Captures audio with PortAudio's callback API.
+
+    PortAudio calls `callback` on its own thread with each incoming buffer, which is copied into
+    the preallocated ring, so a slow analysis frame never stalls the input and causes overflows.
+    """
+
+    def __init__(self, p, sample_rate, channels, frames_per_buffer, capacity, input_device_index=None, mixdown=True):
+        super().__init__(capacity, channels, mixdown)
+        pyaudio = import_pyaudio()
+        self.overflow_flag = pyaudio.paInputOverflow
+        self.underflow_flag = pyaudio.paInputUnderflow
+        self.continue_flag = pyaudio.paContinue
+
+        self.stream = p.open(format=pyaudio.paInt16,
+                             channels=channels,
+                             rate=sample_rate,
+                             input=True,
+                             input_device_index=input_device_index,
+                             frames_per_buffer=frames_per_buffer,
+                             stream_callback=self.callback,
+                             start=False)
+
+    def callback(self, in_data, frame_count, time_info, status_flags):
+        if status_flags & self.overflow_flag:
+            self.overflows += 1
+        if status_flags & self.underflow_flag:
+            self.underflows += 1
+
+        with self.condition:
+            self.write_frames(np.frombuffer(in_data, dtype=np.int16))
+            self.condition.notify_all()
+
+        return (None, self.continue_flag)
+
+    def wait_for_frames(self, count, timeout=0.5):
+        with self.condition:
+            arrived = self.condition.wait_for(lambda: self.ring.total_written - self.read_position >= count, timeout)
+            if arrived:
+                self.consume()
+            return arrived
+
+    def start(self):
+        if self.stream.is_stopped():
+            self.stream.start_stream()
+
+    def stop(self):
+        if not self.stream.is_stopped():
+            self.stream.stop_stream()
+
+    def close(self):
+        self.stop()
+        self.stream.close()
+
+class BlockCapture(Capture):
+    """
+    A capture fed with blocks of mono frames by `push`, e.g. one channel of a multi-channel capture
+    handed to another process. `wait_for_frames` never blocks, the caller pushes before it steps.
+    """
+
+    def push(self, block):
+        with self.condition:
+            self.write_frames(block)
+
+    def wait_for_frames(self, count, timeout=0.5):
+        with self.condition:
+            if self.ring.total_written - self.read_position < count:
+                return False
+            self.consume()
+            return True
+
+CAPTURE_MODES = ("blocking", "callback")
+
+def create_capture(mode, p, sample_rate, channels, frames_per_buffer, capacity, input_device_index=None, mixdown=True):
+    """Open a live PyAudio capture of the given mode (see `CAPTURE_MODES`) on the PyAudio instance `p`."""
+    if mode == "callback":
+        return CallbackCapture(p, sample_rate, channels, frames_per_buffer, capacity, input_device_index, mixdown)
+    if mode == "blocking":
+        source = PyAudioSource(p, sample_rate, channels, frames_per_buffer, input_device_index)
+        return SourceCapture(source, capacity, mixdown=mixdown)
+
+    raise ValueError(f"unknown capture mode '{mode}'")
@@ -1,142 +1,242 @@
-import numpy as np
-import pyaudio
-from multiprocessing import Process, Queue
-from PyQt6.QtCore import QThread, pyqtSignal, QTimer
+import traceback
+from PyQt6.QtCore import QThread
+
+from tuner.audio_backend import AudioBackend
+from tuner.audio_capture import SourceCapture
+from tuner.decimation import decimation_for
+from tuner.instrumentation import Instrumentation
+from tuner.pipeline import AnalysisPipeline
+from tuner.pitch_engines import AnalysisResult
+from tuner.result_channel import ResultChannel
 
 class AudioProcessor:
-    def __init__(self, sample_rate=12000, buffer_size=4096, channels=1):
+    def __init__(self, sample_rate=12000, buffer_size=4096, hop_size=256, channels=1, window="hann", refinement="phase_vocoder",
+                 capture_mode="callback", source=None, engine="fft", instrumentation=None, adaptive_window=False, decimation=1,
+                 multichannel=False, engine_process=False):
         self.ui = None
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
         self.sample_rate = sample_rate
-        self.buffer_size = buffer_size
-        self.channels = channels
-        self.stream = None
-        self.pyaudio = pyaudio.PyAudio()
+        self.buffer_size = buffer_size  # Analysis window length
+        self.hop_size = hop_size  # Frames read per update, sets the update rate
+        self.channels = source.channels if source is not None else channels
+        self.window = window
+        self.refinement = refinement
+        self.capture_mode = capture_mode
+        self.engine = engine
+        self.adaptive_window = adaptive_window  # Let the buffer size follow the detected pitch
+        # decimation factor of the input before analysis, or "auto" to choose it from the target note (see set_target)
+        self.decimation = decimation
+        # analyse every input channel on its own (in a process pool) instead of their mix, see tuner.multichannel
+        self.multichannel = multichannel and self.channels > 1
+        # capture and analyse in a process of their own, see tuner.engine_process. multi-channel input already is
+        self.engine_process = engine_process and not self.multichannel
+        self.source = source  # An AudioSource to read instead of the live input, see tuner.audio_source
+        # PortAudio, initialised once on first use. the engine process has its own
+        self.backend = AudioBackend() if source is None and not self.engine_process else None
         self.worker = None
-        self.worker_interval = round(self.sample_rate / self.buffer_size)
-        self.queue = Queue()
+        self.channel = None
+
+    def create_capture(self):
+        if self.source is not None:
+            # play back files and synthetic signals at their natural speed
+            self.sample_rate = self.source.sample_rate
+            return SourceCapture(self.source, self.buffer_size, paced=True, mixdown=not self.multichannel)
+
+        capture, self.sample_rate = self.backend.open_input(self.capture_mode, self.sample_rate, self.channels, self.hop_size,
+                                                            self.buffer_size, mixdown=not self.multichannel)
+        return capture
+
+    def prepare(self):
+        """Get the audio backend going in the background, before `start` needs it."""
+        if self.backend is not None:
+            self.backend.prepare()
+
+    @property
+    def decimation_factor(self):
+        return 1 if self.decimation == "auto" else self.decimation
+
+    @property
+    def analysis_rate(self):
+        """Sample rate the analysis starts at, after decimation."""
+        return self.sample_rate / self.decimation_factor
+
+    def set_target(self, frequency):
+        """
+        Track the note near `frequency` with narrowband detectors instead of searching the whole spectrum (see
+        `AnalysisPipeline.set_target`). In "auto" decimation mode, also decimate as far as its partials allow.
+        """
+        if self.worker is None:
+            return
+        if self.decimation == "auto":
+            self.worker.set_decimation(decimation_for(frequency, self.sample_rate))
+        self.worker.set_target(frequency)
 
     def start(self, ui):
         self.ui = ui
-        self.worker = AudioWorker(self.queue, self.ui, self.sample_rate, self.buffer_size, channels=self.channels)
+        # latest-frame-wins delivery, pushed to the UI thread by a Qt signal
+        receiver = self.ui.update_display_channel_data if self.multichannel else self.ui.update_display_fft_data
+        if self.engine_process:
+            self.start_engine_process(receiver)
+            return
+
+        self.channel = ResultChannel(receiver, instrumentation=self.instrumentation)
+        capture = self.create_capture()
+        if self.multichannel:
+            from tuner.multichannel import MultiChannelPipeline  # multiprocessing is only needed here
+            pipeline_type = MultiChannelPipeline
+        else:
+            pipeline_type = AnalysisPipeline
+        pipeline = pipeline_type(capture, self.sample_rate, self.buffer_size, self.hop_size,
+                                 window=self.window, refinement=self.refinement, engine=self.engine,
+                                 instrumentation=self.instrumentation, decimation=self.decimation_factor)
+        pipeline.set_adaptive_window(self.adaptive_window)
+        self.worker = AudioWorker(self.channel, self.ui, pipeline)
+        self.worker.finished.connect(self.ui.hold_strobes)  # paused, out of input or stopped by errors
+
+        self.instrumentation.add_source("capture", self.worker.capture_stats)
+        self.instrumentation.add_source("delivery", self.delivery_stats)
+
+    def start_engine_process(self, receiver):
+        """Capture and analyse in another process, the frame clock takes its frames from shared memory."""
+        from tuner.engine_process import EngineProcess
+
+        if self.source is not None:
+            self.sample_rate = self.source.sample_rate
+        self.worker = EngineProcess(receiver, self.source, self.sample_rate, self.buffer_size, self.hop_size, self.channels,
+                                    window=self.window, refinement=self.refinement, engine=self.engine,
+                                    capture_mode=self.capture_mode, decimation=self.decimation_factor,
+                                    adaptive_window=self.adaptive_window, instrumentation=self.instrumentation)
+        self.channel = self.worker
+        self.ui.frame_clock.add_poller(self.poll_engine_process)
+
+        self.instrumentation.add_source("capture", self.worker.capture_stats)
+        self.instrumentation.add_source("delivery", self.delivery_stats)
+        self.instrumentation.add_source("engine", self.worker.engine_stats)
+
+    def poll_engine_process(self):
+        self.worker.poll()
+        self.sample_rate = self.worker.sample_rate  # The live device may not support the requested rate
 
     def start_audio_worker(self):
         """Start the audio worker thread."""
         self.worker.start()
-        # Use a QTimer to periodically check for new results from the queue
-        self.check_worker()
 
-    def check_worker(self):
-        # Check if the queue has any new data from the worker process
-        if not self.queue.empty():
-            result = self.queue.get()  # Get data from the queue
-            self.ui.update_display_fft_data(result)
-
-        # Re-run this method to check the queue every 100ms
-        QTimer.singleShot(round(self.sample_rate / self.buffer_size), self.check_worker)
+    def delivery_stats(self):
+        """Counters for posted, delivered, dropped and late frames."""
+        return self.channel.stats()
 
     def pause_audio_worker(self):
         self.worker.pause_stream()
 
     def unpause_audio_worker(self):
         self.worker.unpause_stream()
-    
+
     def stop_audio_worker(self):
         self.worker.terminate_stream()
+        if self.backend is not None:
+            self.backend.terminate()
 
-# TODO: rewrite audio worker
-# Worker class that processes audio data and calculates FFT
+# Worker thread that runs the analysis pipeline and hands its results to the UI
 class AudioWorker(QThread):
-    result = (np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray)
+    result = AnalysisResult
+    max_consecutive_errors = 10  # Give up after this many failed frames in a row, e.g. when the device is gone
 
-    def __init__(self, queue, ui, sample_rate=48000, buffer_size=1024, channels=1):
+    def __init__(self, channel, ui, pipeline):
         super().__init__()
-        self.queue = queue
+        self.channel = channel
         self.ui = ui
-        self.sample_rate = sample_rate
-        self.buffer_size = buffer_size
-        self.channels = channels
-        self.p = pyaudio.PyAudio()
-        self.stream = self.p.open(format=pyaudio.paInt16,
-                                  channels=self.channels,
-                                  rate=self.sample_rate,
-                                  input=True,
-                                  frames_per_buffer=self.buffer_size)
-        self.max_fft_peaks = 10
-        self.running = True  # Flag to control the worker's run loop
-    
-    def increase_buffer_size(self):
-        self.close_stream()
-        self.buffer_size *= 2
-        self.create_stream()
+        self.pipeline = pipeline
+        self.capture = pipeline.capture
+        self.instrumentation = pipeline.instrumentation
+        self.running = False  # Flag to control the worker's run loop
 
-    def decrease_buffer_size(self):
-        self.close_stream()
-        self.buffer_size //= 2
-        self.create_stream()
-        
-    def create_stream(self):
-        if self.p is None:
-            self.p = pyaudio.PyAudio()
-
-        if self.running:
-            print(f"warning: stream already created, not starting another.")
-            return
+    @property
+    def requested_engine(self):
+        return self.pipeline.requested_engine
 
-        self.stream = self.p.open(format=pyaudio.paInt16,
-                                  channels=self.channels,
-                                  rate=self.sample_rate,
-                                  input=True,
-                                  frames_per_buffer=self.buffer_size)
-        self.max_fft_peaks = 10
-        self.running = True  # Flag to control the worker's run loop
-        self.start()
+    def set_refinement(self, refinement):
+        self.pipeline.set_refinement(refinement)
 
-    def run(self):
-        while self.running:
-            try:
-                # Capture audio data
-                audio_data = np.frombuffer(self.stream.read(self.buffer_size), dtype=np.int16)
+    def set_hop_size(self, hop_size):
+        self.pipeline.set_hop_size(hop_size)
 
-                # Perform FFT
-                fft_data = np.fft.fft(audio_data)
-                frequencies = np.fft.fftfreq(len(fft_data), 1 / self.sample_rate)
-                magnitudes = np.abs(fft_data)
+    def set_engine(self, engine):
+        self.pipeline.set_engine(engine)
 
-                # Get positive frequencies and corresponding magnitudes
-                positive_frequencies = frequencies[:len(frequencies) // 2]
-                positive_magnitudes = magnitudes[:len(magnitudes) // 2]
+    def set_adaptive_window(self, enabled):
+        self.pipeline.set_adaptive_window(enabled)
 
-                # positive_magnitudes[0] = 0
+    def set_decimation(self, factor):
+        self.pipeline.set_decimation(factor)
 
-                # Identify the peaks
-                peaks_idx = np.argsort(positive_magnitudes)[-self.max_fft_peaks:]  # Get top 5 peaks
-                peak_frequencies = positive_frequencies[peaks_idx]
-                peak_magnitudes = positive_magnitudes[peaks_idx]
+    def set_target(self, frequency):
+        self.pipeline.set_target(frequency)
 
-                # Emit the frequency and magnitude data to the UI thread
-                # self.fft_data_signal.emit(positive_frequencies, positive_magnitudes, peaks_idx, peak_frequencies, peak_magnitudes)  # Emit signal
-                result = (positive_frequencies, positive_magnitudes, peaks_idx, peak_frequencies, peak_magnitudes)
-                self.queue.put(result)
+    def start_recording(self, path):
+        self.pipeline.start_recording(path)
+
+    def stop_recording(self):
+        self.pipeline.stop_recording()
+
+    def increase_buffer_size(self):
+        # choosing a size by hand ends the adaptive mode
+        self.pipeline.set_adaptive_window(False)
+        self.pipeline.set_buffer_size(self.pipeline.requested_buffer_size * 2)
+
+    def decrease_buffer_size(self):
+        self.pipeline.set_adaptive_window(False)
+        self.pipeline.set_buffer_size(self.pipeline.requested_buffer_size // 2)
+
+    def start(self):
+        self.running = True
+        self.capture.start()
+        super().start()
+
+    def run(self):
+        consecutive_errors = 0
+        while self.running and not self.pipeline.finished:
+            try:
+                frame = self.pipeline.step()
+                if frame is None:
+                    continue
+
+                # Hand the frequency and magnitude data to the UI thread, replacing any unread frame
+                result, capture_time = frame
+                start = self.instrumentation.start()
+                self.channel.publish(result, capture_time)
+                self.instrumentation.stop("enqueue", start)
+                consecutive_errors = 0
 
             except Exception as e:
-                print(f"error while processing audio data: {e}")
-                break
+                # a bad frame is counted and skipped, only a persistent failure stops the analysis
+                self.instrumentation.count("errors")
+                if consecutive_errors == 0:
+                    print(f"error while processing audio data: {e}")
+                    traceback.print_exc()
+                consecutive_errors += 1
+                if consecutive_errors >= self.max_consecutive_errors:
+                    print("warning: too many errors in a row, audio processing stopped.")
+                    break
+
+    def capture_stats(self):
+        """Overflow and underflow counts reported by the audio input."""
+        return self.capture.stats()
 
     def pause_stream(self):
-        """Gracefully stop the worker thread."""
+        """Gracefully stop the worker thread. The stream is stopped, but stays open."""
         self.running = False
         self.wait()  # Wait for the thread to finish
-    
+        self.capture.stop()
+
     def unpause_stream(self):
-        self.running = True
+        self.pipeline.reset()  # frames before the pause are not contiguous with the new ones
         self.start()
-    
+
     def close_stream(self):
-        # Stop the audio stream and terminate PyAudio
+        # Stop and close the audio stream
         self.pause_stream()
-        self.stream.stop_stream()
-        self.stream.close()
-    
+        self.capture.close()
+        self.pipeline.close()
+
     def terminate_stream(self):
         self.close_stream()
-        self.p.terminate()
\ No newline at end of file
@@ -0,0 +1,263 @@
+import sys
+import wave
+from abc import ABC, abstractmethod
+import numpy as np
+
+def import_pyaudio():
+    """Import pyaudio on first use, loading PortAudio is only worth it for live input."""
+    try:
+        import pyaudio
+    except ImportError:  # headless installs can still analyse files, raw PCM and synthetic signals
+        raise RuntimeError("live audio input requires pyaudio") from None
+    return pyaudio
+
+class AudioSource(ABC):
+    """
+    Base class for everything the analysis side can read audio from.
+
+    `read` returns interleaved int16 samples for up to `frames` frames. Fewer frames are only
+    returned at the end of the input, an empty array once it is exhausted.
+    """
+
+    realtime = False  # True if reads block until the audio actually arrives, e.g. a sound card
+
+    def __init__(self, sample_rate, channels=1):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.overflows = 0  # Input overflows, for sources that can overflow
+
+    @abstractmethod
+    def read(self, frames):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+class PyAudioSource(AudioSource):
+    """Live input read from a blocking PyAudio stream."""
+
+    realtime = True
+
+    def __init__(self, p, sample_rate, channels=1, frames_per_buffer=256, input_device_index=None):
+        super().__init__(sample_rate, channels)
+        pyaudio = import_pyaudio()
+        self.overflowed_error = pyaudio.paInputOverflowed
+
+        self.stream = p.open(format=pyaudio.paInt16,
+                             channels=channels,
+                             rate=sample_rate,
+                             input=True,
+                             input_device_index=input_device_index,
+                             frames_per_buffer=frames_per_buffer,
+                             start=False)
+
+    def read(self, frames):
+        try:
+            data = self.stream.read(frames)
+        except IOError as e:
+            if e.errno != self.overflowed_error:
+                raise
+            # the frames read are lost, but the stream stays usable
+            self.overflows += 1
+            data = self.stream.read(frames, exception_on_overflow=False)
+
+        return np.frombuffer(data, dtype=np.int16)
+
+    def start(self):
+        if self.stream.is_stopped():
+            self.stream.start_stream()
+
+    def stop(self):
+        if not self.stream.is_stopped():
+            self.stream.stop_stream()
+
+    def close(self):
+        self.stop()
+        self.stream.close()
+
+class WaveFileSource(AudioSource):
+    """Reads a PCM WAV file (8, 16, 24 or 32 bit), optionally looping it forever."""
+
+    def __init__(self, path, loop=False):
+        self.path = path
+        self.file = wave.open(str(path), "rb")
+        super().__init__(self.file.getframerate(), self.file.getnchannels())
+        self.sample_width = self.file.getsampwidth()
+        self.loop = loop
+
+        if self.sample_width not in (1, 2, 3, 4):
+            raise ValueError(f"unsupported WAV sample width: {self.sample_width} bytes")
+
+    def read(self, frames):
+        data = self.file.readframes(frames)
+        if len(data) == 0 and self.loop:
+            self.file.rewind()
+            data = self.file.readframes(frames)
+
+        return self.to_int16(data)
+
+    def __reduce__(self):
+        # pickled by path and reopened, e.g. when handed to the engine process (see tuner.engine_process)
+        return type(self), (self.path, self.loop)
+
+    def to_int16(self, data):
+        if self.sample_width == 1:
+            # 8 bit WAV is unsigned
+            return ((np.frombuffer(data, dtype=np.uint8).astype(np.int16) - 128) << 8).astype(np.int16)
+        if self.sample_width == 2:
+            return np.frombuffer(data, dtype=np.int16)
+        if self.sample_width == 3:
+            # keep the two most significant bytes of each little-endian 24 bit sample
+            samples = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+            return samples[:, 1:].copy().view(np.int16).reshape(-1)
+        return (np.frombuffer(data, dtype=np.int32) >> 16).astype(np.int16)
+
+    def close(self):
+        self.file.close()
+
+class RawPcmSource(AudioSource):
+    """Reads raw interleaved little-endian int16 PCM from a binary stream, stdin by default."""
+
+    def __init__(self, sample_rate, channels=1, stream=None):
+        super().__init__(sample_rate, channels)
+        self.stream = sys.stdin.buffer if stream is None else stream
+
+    def read(self, frames):
+        frame_bytes = 2 * self.channels
+        data = self.stream.read(frames * frame_bytes)
+
+        # drop a trailing partial frame at the end of the input
+        return np.frombuffer(data[:len(data) - len(data) % frame_bytes], dtype="<i2").astype(np.int16)
+
+    def close(self):
+        if self.stream is not sys.stdin.buffer:
+            self.stream.close()
+
+class SyntheticSource(AudioSource):
+    """
+    Generates a test signal faster than real time: a tone with harmonics, noise, vibrato and a detune sweep.
+
+    :param frequency: float, fundamental frequency in Hz at time 0
+    :param harmonics: sequence of float, amplitudes of the fundamental and its overtones, relative to `amplitude`
+    :param noise: float, white noise level relative to full scale
+    :param vibrato_rate: float, vibrato frequency in Hz
+    :param vibrato_depth: float, vibrato depth in cents
+    :param sweep: float, detune sweep in cents per second
+    :param detune: float, constant detune in cents
+    :param amplitude: float, peak level relative to full scale
+    :param duration: float or None, length in seconds, endless if None
+    """
+
+    def __init__(self, sample_rate=12000, channels=1, frequency=440.0, harmonics=(1.0,), noise=0.0,
+                 vibrato_rate=0.0, vibrato_depth=0.0, sweep=0.0, detune=0.0, amplitude=0.5, duration=None, seed=None):
+        super().__init__(sample_rate, channels)
+        self.frequency = frequency
+        self.harmonics = np.asarray(harmonics, dtype=np.float64)
+        self.noise = noise
+        self.vibrato_rate = vibrato_rate
+        self.vibrato_depth = vibrato_depth
+        self.sweep = sweep
+        self.detune = detune
+        self.amplitude = amplitude
+        self.total_frames = None if duration is None else round(duration * sample_rate)
+        self.random = np.random.default_rng(seed)
+
+        self.harmonic_numbers = np.arange(1, len(self.harmonics) + 1)
+        self.normalisation = amplitude / max(np.sum(np.abs(self.harmonics)), 1e-12)
+        self.position = 0  # Frames generated so far
+        self.phase = 0.0  # Phase of the fundamental in cycles, carried across blocks
+
+    def frequency_at(self, t):
+        """Instantaneous fundamental frequency at time(s) `t` in seconds."""
+        cents = self.detune + self.sweep * t + self.vibrato_depth * np.sin(2 * np.pi * self.vibrato_rate * t)
+        return self.frequency * 2 ** (cents / 1200)
+
+    def read(self, frames):
+        if self.total_frames is not None:
+            frames = max(min(frames, self.total_frames - self.position), 0)
+        if frames == 0:
+            return np.zeros(0, dtype=np.int16)
+
+        t = (self.position + np.arange(frames)) / self.sample_rate
+        phase = self.phase + np.cumsum(self.frequency_at(t)) / self.sample_rate
+        self.phase = phase[-1] % 1.0
+        self.position += frames
+
+        # harmonics above Nyquist would alias, so they are left out
+        audible = self.harmonic_numbers * self.frequency_at(t[-1]) < self.sample_rate / 2
+        signal = np.sin(2 * np.pi * np.outer(phase, self.harmonic_numbers[audible])) @ self.harmonics[audible]
+        signal *= self.normalisation
+
+        if self.noise > 0:
+            signal += self.random.normal(0, self.noise, frames)
+
+        samples = np.clip(signal * 32767, -32768, 32767).astype(np.int16)
+        return np.repeat(samples, self.channels) if self.channels > 1 else samples
+
+class ChannelStackSource(AudioSource):
+    """Interleaves mono sources into one multi-channel source, e.g. one synthetic instrument per input of an interface."""
+
+    def __init__(self, sources):
+        super().__init__(sources[0].sample_rate, len(sources))
+        self.sources = sources
+        self.realtime = any(source.realtime for source in sources)
+
+    def read(self, frames):
+        blocks = [source.read(frames) for source in self.sources]
+        frames = min(len(block) for block in blocks)
+        return np.stack([block[:frames] for block in blocks], axis=1).reshape(-1)
+
+    def start(self):
+        for source in self.sources:
+            source.start()
+
+    def stop(self):
+        for source in self.sources:
+            source.stop()
+
+    def close(self):
+        for source in self.sources:
+            source.close()
+
+def parse_synthetic_spec(options):
+    """Parse 'frequency=110,noise=0.01,harmonics=1/0.5' (or just '110') into `SyntheticSource` arguments."""
+    kwargs = {}
+    for option in filter(None, options.split(",")):
+        key, _, value = option.rpartition("=")
+        key = key or "frequency"
+        if key == "harmonics" or key == "frequency" and "/" in value:
+            kwargs[key] = tuple(float(h) for h in value.split("/"))
+        elif key == "seed":
+            kwargs[key] = int(value)
+        else:
+            kwargs[key] = float(value)
+    return kwargs
+
+def open_source(spec, sample_rate=12000, channels=1):
+    """
+    Open a non-live source from a short description.
+
+    - `-`: raw int16 PCM on stdin at `sample_rate` with `channels` channels
+    - `synth:<options>`: a `SyntheticSource`, see `parse_synthetic_spec`, or one per channel for
+      several frequencies ('synth:41.2/110/196,noise=0.01')
+    - a path ending in `.stroby`: the input of a session recording, see `tuner.recording`
+    - anything else: the path of a WAV file
+    """
+    if spec == "-":
+        return RawPcmSource(sample_rate, channels)
+    if spec.endswith(".stroby"):
+        from tuner.recording import RecordingSource  # the recording module imports this one
+        return RecordingSource(spec)
+    if spec.startswith("synth:"):
+        kwargs = parse_synthetic_spec(spec[len("synth:"):])
+        if isinstance(kwargs.get("frequency"), tuple):
+            frequencies = kwargs.pop("frequency")
+            return ChannelStackSource([SyntheticSource(sample_rate, 1, frequency=frequency, **kwargs) for frequency in frequencies])
+        return SyntheticSource(sample_rate, channels, **kwargs)
+    return WaveFileSource(spec)
@@ -0,0 +1,270 @@
+"""
+End-to-end latency, throughput and accuracy benchmark of the analysis hot path, driven by synthetic signals.
+
+The Qt stages (signal transport and UI update) are only measured with `include_ui`, everything
+else runs headless.
+"""
+
+import json
+import os
+import platform
+import queue
+import subprocess
+import threading
+import time
+import numpy as np
+
+from tuner.audio_capture import SourceCapture
+from tuner.audio_source import SyntheticSource
+from tuner.pipeline import AnalysisPipeline
+from tuner.mailbox import LatestResultMailbox
+
+BENCHMARK_FORMAT_VERSION = 1
+
+DEFAULT_BUFFER_SIZES = (1024, 2048, 4096, 8192)
+
+# open strings of bass and guitar, concert pitch and a few notes above it
+DEFAULT_TEST_FREQUENCIES = (30.87, 41.20, 82.41, 110.0, 196.0, 329.63, 440.0, 880.0, 1318.51)
+
+STAGES = ("capture", "fft", "peak_pick", "transport", "ui_update")
+
+class StageTimer:
+    """Collects per-stage durations in nanoseconds."""
+
+    def __init__(self, stages=STAGES):
+        self.samples = {stage: [] for stage in stages}
+
+    def add(self, stage, duration_ns):
+        self.samples[stage].append(duration_ns)
+
+    def summary(self):
+        summary = {}
+        for stage, samples in self.samples.items():
+            if len(samples) == 0:
+                continue
+            us = np.asarray(samples) / 1000
+            summary[stage] = {
+                "count": len(us),
+                "mean_us": float(np.mean(us)),
+                "median_us": float(np.median(us)),
+                "p95_us": float(np.percentile(us, 95)),
+                "max_us": float(np.max(us)),
+            }
+        return summary
+
+    def total_mean_us(self):
+        return sum(np.mean(samples) / 1000 for samples in self.samples.values() if len(samples) > 0)
+
+class UiStages:
+    """
+    Delivers results through the real `ResultChannel` to an offscreen `TunerWindow`.
+
+    Results are published from a worker thread, like the `AudioWorker` does, so the transport
+    stage measures the queued cross-thread signal up to its delivery on the UI thread.
+    """
+
+    def __init__(self, sample_rate, buffer_size, hop_size):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+        from PyQt6.QtWidgets import QApplication
+        from tuner.result_channel import ResultChannel
+        from tuner.tuner import Tuner
+        from tuner.ui import TunerWindow
+
+        self.app = QApplication.instance() or QApplication([])
+        self.tuner = Tuner(source=SyntheticSource(sample_rate))
+        self.tuner.audio_processor.buffer_size = buffer_size
+        self.tuner.audio_processor.hop_size = hop_size
+        self.window = TunerWindow(self.tuner)
+        self.tuner.ui = self.window
+        self.tuner.audio_processor.start(self.window)
+        self.window.strobe_container.reset_strobe_wheels()
+        self.window.show()
+
+        self.received = None
+        self.channel = ResultChannel(self.receive)
+        self.requests = queue.Queue()  # (result, capture_time) to publish, None to stop the publisher
+        self.published_ns = None  # When the publisher handed the last result to the channel
+        self.publisher = threading.Thread(target=self.publish, name="stroby-bench-publisher", daemon=True)
+        self.publisher.start()
+
+    def publish(self):
+        """Publisher thread: hand every requested result to the channel."""
+        while (request := self.requests.get()) is not None:
+            self.published_ns = time.perf_counter_ns()
+            self.channel.publish(*request)
+
+    def receive(self, result):
+        self.received = result
+
+    def deliver(self, result, capture_time):
+        """Returns (transport_ns, ui_update_ns)."""
+        from PyQt6.QtCore import QEventLoop
+
+        self.requests.put((result, capture_time))
+        while self.received is None:
+            self.app.processEvents(QEventLoop.ProcessEventsFlag.WaitForMoreEvents)
+        delivered = time.perf_counter_ns()
+        start = self.published_ns
+
+        self.window.update_display_fft_data(self.received)
+        self.window.repaint()
+        self.received = None
+        return delivered - start, time.perf_counter_ns() - delivered
+
+    def close(self):
+        self.requests.put(None)
+        self.publisher.join()
+        self.window.close()
+
+def run_case(frequency, buffer_size, hop_size, sample_rate, frames, refinement, engine, timer, ui=None, decimation=1):
+    """Analyse `frames` frames of a synthetic tone. Returns the cents error of every frame, NaN where no pitch was detected."""
+    source = SyntheticSource(sample_rate, frequency=frequency, harmonics=(1.0, 0.5, 0.33, 0.25), noise=0.005, seed=0)
+    capture = SourceCapture(source, buffer_size)
+    pipeline = AnalysisPipeline(capture, sample_rate, buffer_size, hop_size, refinement=refinement, engine=engine,
+                                decimation=decimation)
+    mailbox = LatestResultMailbox()
+    errors = []
+
+    capture.start()
+    while len(errors) < frames:
+        start = time.perf_counter_ns()
+        if not pipeline.read_frame():
+            continue
+        capture_time = time.perf_counter()
+        captured = time.perf_counter_ns()
+
+        pipeline.feed_engine()
+        pipeline.engine.transform(pipeline.plan)
+        transformed = time.perf_counter_ns()
+
+        result = pipeline.engine.estimate(pipeline.plan)
+        picked = time.perf_counter_ns()
+
+        timer.add("capture", captured - start)
+        timer.add("fft", transformed - captured)
+        timer.add("peak_pick", picked - transformed)
+
+        if ui is None:
+            # without the UI only the hand-off through the mailbox is timed
+            mailbox.put((capture_time, result))
+            mailbox.take()
+            timer.add("transport", time.perf_counter_ns() - picked)
+        else:
+            transport_ns, ui_update_ns = ui.deliver(result, capture_time)
+            timer.add("transport", transport_ns)
+            timer.add("ui_update", ui_update_ns)
+
+        fundamental = result.fundamental
+        errors.append(1200 * np.log2(fundamental / frequency) if fundamental > 0 else np.nan)
+
+    capture.close()
+    return np.asarray(errors)
+
+def run_benchmark(buffer_sizes=DEFAULT_BUFFER_SIZES, frequencies=DEFAULT_TEST_FREQUENCIES, hop_size=256,
+                  sample_rate=12000, frames=200, refinement="phase_vocoder", engine="fft", include_ui=False, progress=None,
+                  decimation=1):
+    """Run every (buffer size, test frequency) combination and return the results as a JSON-serialisable dict."""
+    results = []
+    for buffer_size in buffer_sizes:
+        timer = StageTimer()
+        ui = UiStages(sample_rate / decimation, buffer_size, hop_size) if include_ui else None
+        accuracy = []
+
+        for frequency in frequencies:
+            if progress is not None:
+                progress(f"buffer {buffer_size}, {frequency} Hz")
+
+            # the first frames only fill the analysis window and the phase vocoder history, skip them
+            errors = np.abs(run_case(frequency, buffer_size, hop_size, sample_rate, frames + 2, refinement, engine, timer, ui,
+                                     decimation)[2:])
+            detected = errors[~np.isnan(errors)]
+            accuracy.append({
+                "frequency": frequency,
+                "detected": len(detected) / len(errors),
+                "median_abs_cents": float(np.median(detected)) if len(detected) > 0 else None,
+                "p95_abs_cents": float(np.percentile(detected, 95)) if len(detected) > 0 else None,
+                "within_1_cent": float(np.sum(detected <= 1) / len(errors)),
+            })
+
+        if ui is not None:
+            ui.close()
+
+        results.append({
+            "buffer_size": buffer_size,
+            "hop_size": hop_size,
+            "latency_ms": 1000 * buffer_size * decimation / sample_rate,  # Time spanned by one analysis window
+            "frames_per_second": 1e6 / timer.total_mean_us(),
+            "stages": timer.summary(),
+            "accuracy": accuracy,
+        })
+
+    return {
+        "format_version": BENCHMARK_FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": current_commit(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "config": {
+            "sample_rate": sample_rate,
+            "hop_size": hop_size,
+            "frames": frames,
+            "refinement": refinement,
+            "engine": engine,
+            "decimation": decimation,
+            "include_ui": include_ui,
+        },
+        "results": results,
+    }
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(baseline, current):
+    """Relative change per buffer size and stage between two benchmark results, e.g. {4096: {"fft": 0.93}}."""
+    baseline_results = {result["buffer_size"]: result for result in baseline["results"]}
+    changes = {}
+    for result in current["results"]:
+        before = baseline_results.get(result["buffer_size"])
+        if before is None:
+            continue
+
+        changes[result["buffer_size"]] = {
+            stage: timing["median_us"] / before["stages"][stage]["median_us"]
+            for stage, timing in result["stages"].items()
+            if stage in before["stages"] and before["stages"][stage]["median_us"] > 0
+        }
+    return changes
+
+def format_report(report, changes=None):
+    lines = []
+    for result in report["results"]:
+        buffer_size = result["buffer_size"]
+        lines.append(f"buffer {buffer_size} (hop {result['hop_size']}, window {result['latency_ms']:.0f} ms): "
+                     f"{result['frames_per_second']:.0f} frames/s")
+
+        for stage, timing in result["stages"].items():
+            change = ""
+            if changes is not None and stage in changes.get(buffer_size, {}):
+                change = f"  ({changes[buffer_size][stage]:.2f}x baseline)"
+            lines.append(f"  {stage:<10} median {timing['median_us']:9.1f} us   p95 {timing['p95_us']:9.1f} us{change}")
+
+        for accuracy in result["accuracy"]:
+            if accuracy["median_abs_cents"] is None:
+                lines.append(f"  {accuracy['frequency']:8.2f} Hz  not detected")
+                continue
+            lines.append(f"  {accuracy['frequency']:8.2f} Hz  median error {accuracy['median_abs_cents']:8.2f} cents"
+                         f"   p95 {accuracy['p95_abs_cents']:8.2f} cents   detected {100 * accuracy['detected']:5.1f} %")
+    return "\n".join(lines)
+
+def save(report, path):
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
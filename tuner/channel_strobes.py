@@ -0,0 +1,69 @@
+from PyQt6.QtCore import Qt, QRect
+from PyQt6.QtGui import QPainter, QColor
+import numpy as np
+
+from tuner.strobe_bands import StrobeBandContainer
+
+class ChannelStrobeContainer(StrobeBandContainer):
+    """
+    One strobe band per input channel, for tuning several instruments at once (see `tuner.multichannel`).
+
+    Band i follows the fundamental of channel i and is labelled with the channel, note and cents.
+    Each channel tunes to its own nearest note unless a common target is set.
+    """
+
+    stripe_order = 2  # Every band gets the stripes of a 2nd harmonic band
+
+    def __init__(self, parent=None, channel_count=2):
+        super().__init__(parent, strobe_count=channel_count)
+        self.target_midi = None
+        self.fundamentals = np.zeros(channel_count)  # Last detected pitch per channel, 0 until there is one
+        self.labels = [f"{channel + 1}" for channel in range(channel_count)]
+        self.bands.orders[:] = self.stripe_order
+        self.bands.resize(self.bands.width, self.bands.height)
+        self.setMinimumHeight(20 * channel_count)
+
+    def set_channel_data(self, results):
+        """Take one `AnalysisResult` (or None) per channel. Channels without a pitch keep their last one and hold still."""
+        for channel, result in enumerate(results):
+            voiced = result is not None and result.fundamental > 0
+            if voiced:
+                self.fundamentals[channel] = result.fundamental
+            self.bands.moving[channel] = voiced
+
+        self.strobe_data = (self.fundamentals, None)
+        self.update_deltas()
+
+    def update_deltas(self):
+        if self.strobe_data is None:
+            return
+
+        tuning = self.tuner.tuning
+        if self.target_midi is None:
+            notes, cents = tuning.nearest(self.fundamentals)
+        else:
+            notes = np.full(self.strobe_count, self.target_midi)
+            cents = tuning.cents(self.fundamentals, tuning.frequency(self.target_midi))
+        self.bands.deltas[:] = cents / 100
+
+        for channel in range(self.strobe_count):
+            if self.fundamentals[channel] > 0:
+                self.labels[channel] = f"{channel + 1}  {tuning.note_name(notes[channel])} {cents[channel]:+.1f}"
+        self.changed = True
+
+    def paint_bands(self):
+        super().paint_bands()
+        if self.strobe_data is None:
+            return
+
+        # labels on a dark box at the left end of each band, readable over either stripe colour
+        painter = QPainter(self)
+        painter.setPen(QColor(255, 255, 255))
+        pitch = self.height() // self.strobe_count
+        band_height = pitch - min(self.bands.gap, pitch // 4)
+        metrics = painter.fontMetrics()
+        for channel, label in enumerate(self.labels):
+            box = QRect(0, channel * pitch, metrics.horizontalAdvance(label) + 12, band_height)
+            painter.fillRect(box, QColor(0, 0, 0, 160))
+            painter.drawText(box, Qt.AlignmentFlag.AlignCenter, label)
+        painter.end()
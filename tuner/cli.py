@@ -0,0 +1,277 @@
+"""
+Headless command line modes. Nothing in here may import PyQt6, so `stroby analyze` starts fast
+and runs on machines without a display.
+"""
+
+import argparse
+import json
+import struct
+import sys
+import time
+import numpy as np
+
+from tuner.audio_backend import AudioBackend
+from tuner.audio_capture import SourceCapture
+from tuner.audio_source import open_source
+from tuner.decimation import DECIMATION_FACTORS
+from tuner.instrumentation import Instrumentation
+from tuner.pipeline import AnalysisPipeline, frame_summary
+from tuner.pitch_engines import ENGINES
+from tuner.pitch_estimation import REFINERS, WINDOW_FUNCTIONS
+from tuner.tuning import TEMPERAMENTS, get_tuning_system
+import tuner.utils as utility
+
+# Binary record: timestamp (s), fundamental (Hz), MIDI note, cents, confidence; little-endian, 22 bytes.
+# With --multichannel every frame writes one record per channel, in channel order
+BINARY_RECORD = struct.Struct("<dfhff")
+
+class JsonlWriter:
+    def __init__(self, stream, fields=None):
+        self.stream = stream
+        self.fields = fields or {}  # Written first in every record, e.g. the engine of a replay
+
+    def write(self, timestamp, fundamental, note, cents, confidence, channel=None):
+        record = dict(self.fields)
+        if channel is not None:
+            record["channel"] = channel
+        record.update({
+            "t": round(timestamp, 6),
+            "f0": round(fundamental, 4),
+            "note": utility.midi_to_note_name(note),
+            "midi": note,
+            "cents": round(cents, 2),
+            "confidence": round(confidence, 3),
+        })
+        self.stream.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def flush(self):
+        self.stream.flush()
+
+class BinaryWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, timestamp, fundamental, note, cents, confidence, channel=None):
+        self.stream.write(BINARY_RECORD.pack(timestamp, fundamental, note, cents, confidence))
+
+    def flush(self):
+        self.stream.flush()
+
+def open_capture(args):
+    """Open the capture described by the command line arguments."""
+    if args.input == "live":
+        backend = AudioBackend()
+        capture, args.sample_rate = backend.open_input(args.capture_mode, args.sample_rate, args.channels, args.hop_size,
+                                                       args.buffer_size, mixdown=not args.multichannel)
+        return capture, backend
+
+    source = open_source(args.input, args.sample_rate, args.channels)
+    args.sample_rate = source.sample_rate
+    return SourceCapture(source, args.buffer_size, paced=args.realtime, mixdown=not args.multichannel), None
+
+def analyze(args):
+    capture, backend = open_capture(args)
+    instrumentation = Instrumentation(enabled=args.stats is not None)
+    instrumentation.add_source("capture", capture.stats)
+    if args.multichannel:
+        from tuner.multichannel import MultiChannelPipeline  # multiprocessing is only needed here
+        pipeline_type = MultiChannelPipeline
+    else:
+        pipeline_type = AnalysisPipeline
+    pipeline = pipeline_type(capture, args.sample_rate, args.buffer_size, args.hop_size,
+                             window=args.window, refinement=args.refinement, engine=args.engine,
+                             instrumentation=instrumentation, decimation=args.decimation)
+    pipeline.set_adaptive_window(args.adaptive_window)
+    pipeline.set_target(args.target)
+    tuning = get_tuning_system(args.reference, args.temperament)
+    if args.record is not None:
+        if args.multichannel:
+            print("warning: multi-channel sessions cannot be recorded, --record ignored.", file=sys.stderr)
+        else:
+            pipeline.start_recording(args.record)
+
+    binary = args.format == "binary"
+    if args.output == "-":
+        stream = sys.stdout.buffer if binary else sys.stdout
+    else:
+        stream = open(args.output, "wb" if binary else "w")
+    writer = BinaryWriter(stream) if binary else JsonlWriter(stream)
+
+    # live input is flushed per frame, files are written as fast as possible
+    flush_each_frame = args.input == "live" or args.realtime
+
+    frames = 0
+    capture.start()
+    try:
+        while not pipeline.finished and (args.max_frames is None or frames < args.max_frames):
+            frame = pipeline.step()
+            if frame is None:
+                continue
+
+            result, _ = frame
+            start = instrumentation.start()
+            if args.multichannel:
+                # the capture itself is not decimated, the channel pipelines are
+                timestamp = capture.position / pipeline.input_rate
+                for channel, channel_result in enumerate(result):
+                    if channel_result is not None:
+                        writer.write(timestamp, *frame_summary(channel_result, tuning), channel=channel)
+            else:
+                timestamp = capture.position / pipeline.sample_rate
+                writer.write(timestamp, *frame_summary(result, tuning))
+            instrumentation.stop("write", start)
+            frames += 1
+
+            if flush_each_frame:
+                writer.flush()
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        capture.close()
+        pipeline.close()
+        if backend is not None:
+            backend.terminate()
+        if stream not in (sys.stdout, sys.stdout.buffer):
+            stream.close()
+        else:
+            try:
+                writer.flush()
+            except BrokenPipeError:
+                pass
+        if args.stats is not None:
+            instrumentation.dump(args.stats)
+
+    return 0
+
+def replay(args):
+    from tuner import recording  # only replay reads recordings
+    from tuner.pitch_engines import ENGINE_VERSION
+
+    session = recording.Recording(args.recording)
+    results = len(session.chunks(recording.RESULT_TAG))
+    print(f"{args.recording}: {session.duration:.1f} s at {session.sample_rate:g} Hz, {session.channels} channel(s), "
+          f"{results} frames, starting with {session.engine}", file=sys.stderr)
+    if session.engine_version != ENGINE_VERSION:
+        print(f"warning: recorded with engine version {session.engine_version}, this is version {ENGINE_VERSION}, "
+              f"results of the recorded engine may differ.", file=sys.stderr)
+
+    tuning = get_tuning_system(args.reference, args.temperament)
+    stream = open(args.output, "w") if args.output else None
+    print(f"{'engine':<8} {'frames':>7} {'voiced':>7} {'median |Δ¢|':>12} {'p95 |Δ¢|':>9} {'time':>8} {'speed':>9}")
+    try:
+        # without --engine, the engines as recorded, including switches during the session
+        for engine in args.engine or [None]:
+            name = engine or "recorded"
+            writer = JsonlWriter(stream, {"engine": name}) if stream else None
+            frames = voiced = 0
+            differences = []  # Cents between the replayed and the recorded fundamental, where both are voiced
+            started_at = time.perf_counter()
+            for position, result, recorded in recording.replay(session, engine, args.speed):
+                if result is None:
+                    continue
+                frames += 1
+                if result.fundamental > 0:
+                    voiced += 1
+                    if recorded[0] > 0:
+                        differences.append(1200 * np.log2(result.fundamental / recorded[0]))
+                if writer is not None:
+                    writer.write(position / session.sample_rate, *frame_summary(result, tuning))
+            elapsed = time.perf_counter() - started_at
+
+            if differences:
+                differences = np.abs(differences)
+                agreement = f"{np.median(differences):>12.3f} {np.percentile(differences, 95):>9.3f}"
+            else:
+                agreement = f"{'-':>12} {'-':>9}"
+            print(f"{name:<8} {frames:>7} {voiced / max(frames, 1):>7.1%} {agreement} {elapsed:>7.2f}s "
+                  f"{session.duration / max(elapsed, 1e-9):>8.1f}x")
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        if stream is not None:
+            stream.close()
+        session.close()
+    return 0
+
+def bench(args):
+    # imported here, so `analyze` does not pay for it
+    from tuner import benchmark
+
+    frequencies = args.frequencies or benchmark.DEFAULT_TEST_FREQUENCIES
+    report = benchmark.run_benchmark(args.buffer_sizes, frequencies, args.hop_size, args.sample_rate, args.frames,
+                                     args.refinement, args.engine, include_ui=args.ui,
+                                     progress=lambda text: print(f"benchmarking {text}", file=sys.stderr),
+                                     decimation=args.decimation)
+
+    changes = benchmark.compare(benchmark.load(args.compare), report) if args.compare else None
+    print(benchmark.format_report(report, changes))
+
+    if args.output:
+        benchmark.save(report, args.output)
+    return 0
+
+def add_analysis_arguments(parser):
+    parser.add_argument("--sample-rate", type=int, default=12000, help="sample rate of live and raw PCM input")
+    parser.add_argument("--channels", type=int, default=1, help="channel count of live and raw PCM input")
+    parser.add_argument("--decimation", type=int, choices=DECIMATION_FACTORS, default=1,
+                        help="lowpass and decimate the input by this factor before analysis, e.g. 4 for 48 kHz input")
+    parser.add_argument("--buffer-size", type=int, default=4096, help="analysis window length in frames, after decimation")
+    parser.add_argument("--hop-size", type=int, default=256, help="frames between analysis frames, after decimation")
+    parser.add_argument("--window", choices=sorted(WINDOW_FUNCTIONS), default="hann")
+    parser.add_argument("--refinement", choices=sorted(REFINERS), default="phase_vocoder")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="fft",
+                        help="pitch engine: FFT or constant-Q peaks, or the time-domain McLeod (mpm) and YIN detectors")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="stroby", description="a fast and accurate digital strobe tuner")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    analyze_parser = commands.add_parser("analyze", help="write one pitch record per analysis frame, without a display")
+    analyze_parser.add_argument("input", nargs="?", default="live",
+                                help="'live' (default), a WAV file, '-' for raw int16 PCM on stdin, or 'synth:<options>'")
+    analyze_parser.add_argument("-o", "--output", default="-", help="output file, stdout by default")
+    analyze_parser.add_argument("-f", "--format", choices=("jsonl", "binary"), default="jsonl")
+    analyze_parser.add_argument("--capture-mode", choices=("callback", "blocking"), default="callback")
+    analyze_parser.add_argument("--realtime", action="store_true", help="pace file input to its sample rate")
+    analyze_parser.add_argument("--max-frames", type=int, default=None)
+    analyze_parser.add_argument("--stats", metavar="PATH", help="write per-stage timings and counters as JSON when done")
+    analyze_parser.add_argument("--target", type=float, metavar="HZ",
+                                help="follow the note near this frequency with narrowband detectors, full search as fallback")
+    analyze_parser.add_argument("--multichannel", action="store_true",
+                                help="analyse every input channel on its own, in a pool of processes, instead of their mix")
+    analyze_parser.add_argument("--reference", type=float, default=440.0, metavar="HZ", help="frequency of A4")
+    analyze_parser.add_argument("--temperament", choices=list(TEMPERAMENTS), default="equal",
+                                help="target of every note that the cents are measured against")
+    analyze_parser.add_argument("--adaptive-window", action="store_true",
+                                help="pick the window length from the detected pitch, --buffer-size is the starting length")
+    analyze_parser.add_argument("--record", metavar="PATH",
+                                help="also record the raw input and every result to PATH, for `stroby replay`")
+    add_analysis_arguments(analyze_parser)
+    analyze_parser.set_defaults(handler=analyze)
+
+    replay_parser = commands.add_parser("replay", help="analyse a recorded session again, and compare with what was recorded")
+    replay_parser.add_argument("recording", help="a .stroby file written by --record or Ctrl+R")
+    replay_parser.add_argument("--engine", choices=sorted(ENGINES), nargs="+",
+                               help="pitch engines to replay with, one after the other, instead of the recorded ones")
+    replay_parser.add_argument("--speed", type=float, default=0.0,
+                               help="input speed relative to real time, 0 (default) for as fast as possible")
+    replay_parser.add_argument("-o", "--output", help="write one JSON record per replayed frame and engine")
+    replay_parser.add_argument("--reference", type=float, default=440.0, metavar="HZ", help="frequency of A4")
+    replay_parser.add_argument("--temperament", choices=list(TEMPERAMENTS), default="equal")
+    replay_parser.set_defaults(handler=replay)
+
+    bench_parser = commands.add_parser("bench", help="measure per-stage latency, throughput and accuracy on synthetic signals")
+    bench_parser.add_argument("-o", "--output", help="write the results as JSON")
+    bench_parser.add_argument("--compare", metavar="BASELINE", help="JSON results of an earlier run to compare against")
+    bench_parser.add_argument("--buffer-sizes", type=int, nargs="+", default=[1024, 2048, 4096, 8192])
+    bench_parser.add_argument("--frequencies", type=float, nargs="+", default=None, help="test frequencies in Hz")
+    bench_parser.add_argument("--frames", type=int, default=200, help="frames per buffer size and test frequency")
+    bench_parser.add_argument("--ui", action="store_true", help="include the queued Qt signal from a worker thread and an offscreen UI update")
+    add_analysis_arguments(bench_parser)
+    bench_parser.set_defaults(handler=bench)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
@@ -0,0 +1,38 @@
+"""
+Settings that outlive a session, e.g. the input device that worked last time, as one JSON file.
+
+The file lives at $STROBY_CONFIG, or stroby/config.json in $XDG_CONFIG_HOME (~/.config). A
+missing or unreadable file is an empty config, so deleting it is always safe.
+"""
+
+import json
+import os
+
+def config_path():
+    if os.environ.get("STROBY_CONFIG"):
+        return os.environ["STROBY_CONFIG"]
+    base = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+    return os.path.join(base, "stroby", "config.json")
+
+def load_config(path=None):
+    path = path or config_path()
+    try:
+        with open(path) as file:
+            config = json.load(file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"warning: ignoring unreadable config {path}: {e}")
+        return {}
+    return config if isinstance(config, dict) else {}
+
+def save_config(config, path=None):
+    """Write the config atomically, a crash halfway never leaves a truncated file behind."""
+    path = path or config_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w") as file:
+            json.dump(config, file, indent=2)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"warning: could not write config {path}: {e}")
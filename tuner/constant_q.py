@@ -0,0 +1,89 @@
+from functools import lru_cache
+import numpy as np
+
+from tuner.decimation import usable_bandwidth
+
+class ConstantQKernel:
+    """
+    Sparse spectral kernels of a multi-resolution constant-Q transform (Brown & Puckette, computed
+    octave by octave after Schörkhuber & Klapuri), for one (sample rate, bins per octave).
+
+    Bin k is centred on `min_frequency * 2 ** (k / bins_per_octave)` and analyses the last
+    Q * sample_rate / f_k samples through a Hann window, so every bin is the same number of cents
+    wide, A0 included. At the bottom that is ~2 seconds of audio, so the bins are spread over
+    levels of two octaves: level l is the input decimated by 4 ** l, and each bin is computed on
+    the most decimated level whose usable band still holds it. Every kernel then spans between
+    Q / 0.4 and Q / 0.1 samples of its level, and one short FFT size serves all levels.
+
+    Each kernel is transformed once and only its significant FFT bins are kept, as flat index and
+    weight arrays into the stacked level spectra (one contiguous run per bin). Per frame the
+    transform is then one batched real FFT of the level histories plus a gather, a multiply and an
+    `add.reduceat` over those few thousand entries.
+    """
+
+    threshold = 0.005  # Kernel weights below this fraction of the kernel's peak are dropped
+    level_factor = 4  # Decimation from one level to the next
+
+    def __init__(self, sample_rate, bins_per_octave, min_frequency=27.5, max_frequency=4186.0):
+        self.sample_rate = sample_rate
+        self.bins_per_octave = bins_per_octave
+        self.min_frequency = min_frequency
+
+        max_frequency = min(max_frequency, 0.45 * sample_rate)
+        self.bin_count = int(np.floor(bins_per_octave * np.log2(max_frequency / min_frequency))) + 1
+        self.frequencies = min_frequency * 2 ** (np.arange(self.bin_count) / bins_per_octave)
+        self.q = 1 / (2 ** (1 / bins_per_octave) - 1)
+
+        # the most decimated level that still carries the bin, level 0 for the top bins above its usable band
+        octaves = np.log2(usable_bandwidth(sample_rate) / self.frequencies)
+        self.levels = np.maximum(np.floor(octaves / np.log2(self.level_factor)).astype(int), 0)
+        self.level_count = int(self.levels.max()) + 1
+        level_rates = sample_rate / self.level_factor ** self.levels
+        self.lengths = np.round(self.q * level_rates / self.frequencies).astype(int)
+
+        # the power of two nearest the longest kernel, the few longer ones are cut by a fraction of a percent
+        self.fft_size = 1 << int(np.round(np.log2(self.lengths.max())))
+        self.lengths = np.minimum(self.lengths, self.fft_size)
+        self.spectrum_size = self.fft_size // 2 + 1  # Bins per level in the stacked spectra
+
+        indices = []
+        weights = []
+        self.row_starts = np.zeros(self.bin_count, dtype=np.intp)
+        temporal = np.zeros(self.fft_size, dtype=np.complex128)
+        for k, (frequency, length, rate) in enumerate(zip(self.frequencies, self.lengths, level_rates)):
+            # windowed complex sinusoid at the end of the level, normalised so a sine of amplitude 1 reads 0.5
+            window = np.hanning(length + 2)[1:-1]
+            temporal[:] = 0
+            temporal[self.fft_size - length:] = window * np.exp(2j * np.pi * frequency / rate * np.arange(length))
+            temporal /= window.sum()
+
+            # <x, kernel> = sum X conj(K) / N; the kernel lives at positive frequencies, so the rfft half suffices
+            spectral = np.conj(np.fft.fft(temporal)[:self.spectrum_size]) / self.fft_size
+            significant = np.flatnonzero(np.abs(spectral) >= self.threshold * np.abs(spectral).max())
+            run = np.arange(significant[0], significant[-1] + 1)
+
+            self.row_starts[k] = sum(len(i) for i in indices)
+            indices.append(self.levels[k] * self.spectrum_size + run)
+            weights.append(spectral[run])
+
+        self.indices = np.concatenate(indices)
+        self.weights = np.concatenate(weights)
+
+    def apply(self, spectra, products, out):
+        """
+        Write the complex constant-Q coefficients to `out`, given the rffts of the raw (unwindowed)
+        level histories as a (level_count, spectrum_size) array. `products` is scratch of len(indices).
+        """
+        # the indices are valid by construction, "clip" skips the bounds check
+        spectra.reshape(-1).take(self.indices, out=products, mode="clip")
+        products *= self.weights
+        # summed as (real, imaginary) pairs, which reduceat handles faster than complex numbers
+        pairs = (len(products), 2)
+        np.add.reduceat(products.view(np.float64).reshape(pairs), self.row_starts, axis=0,
+                        out=out.view(np.float64).reshape(len(out), 2))
+        return out
+
+@lru_cache(maxsize=8)
+def get_constant_q_kernel(sample_rate, bins_per_octave):
+    """Return the cached constant-Q kernel for this configuration, building it on first use."""
+    return ConstantQKernel(sample_rate, bins_per_octave)
@@ -0,0 +1,76 @@
+import numpy as np
+
+DECIMATION_FACTORS = (1, 2, 4, 8)
+USABLE_BANDWIDTH = 0.8  # Fraction of the decimated Nyquist frequency that is free of aliasing and filter droop
+
+class PolyphaseDecimator:
+    """
+    Streaming anti-aliased decimation by an integer factor.
+
+    A Kaiser-windowed sinc lowpass removes everything above the new Nyquist frequency, and only
+    every `factor`-th output sample is ever computed (the polyphase form): each output is one dot
+    product of the filter with the input it spans, evaluated for all outputs of a block as a single
+    matrix-vector product over a strided view. The last `len(taps) - 1` input samples and the
+    phase of the next output carry over between blocks, so any block size gives the same output
+    as one long call.
+    """
+
+    def __init__(self, factor, taps_per_phase=24, beta=8.0):
+        self.factor = factor
+        length = factor * taps_per_phase
+
+        # transition band from 0.8 to 1.2 times the new Nyquist frequency: what is left above it is
+        # attenuated by ~90 dB, and what lies inside it aliases only onto the unusable top 20 %
+        cutoff = (1 + USABLE_BANDWIDTH) / 4 / factor
+        n = np.arange(length) - (length - 1) / 2
+        taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, beta)
+        self.taps = taps / taps.sum()
+        self.reversed_taps = self.taps[::-1].copy()
+
+        self.buffer = np.zeros(length - 1)
+        self.reset()
+
+    @property
+    def delay(self):
+        """Group delay of the filter, in input samples."""
+        return (len(self.taps) - 1) / 2
+
+    def reset(self):
+        self.history = len(self.taps) - 1  # Samples at the start of `buffer` carried over from the last block
+        self.buffer[:self.history] = 0
+        self.phase = 0  # Offset of the next output into the next block
+
+    def process(self, block):
+        """Filter and decimate one block of samples. Returns the (possibly empty) decimated block."""
+        count = len(block)
+        if len(self.buffer) < self.history + count:
+            grown = np.zeros(self.history + count)
+            grown[:self.history] = self.buffer[:self.history]
+            self.buffer = grown
+
+        buffer = self.buffer[:self.history + count]
+        buffer[self.history:] = block
+
+        # the input each output spans, as a strided view (sliding_window_view costs more than the product on short blocks)
+        outputs = 0 if self.phase >= count else (count - 1 - self.phase) // self.factor + 1
+        stride = buffer.strides[0]
+        windows = np.ndarray((outputs, len(self.taps)), buffer.dtype, buffer, self.phase * stride, (self.factor * stride, stride))
+        decimated = windows @ self.reversed_taps
+
+        self.phase += outputs * self.factor - count
+        buffer[:self.history] = buffer[count:]
+        return decimated
+
+def usable_bandwidth(sample_rate):
+    """Highest frequency that survives decimation to `sample_rate` undistorted."""
+    return USABLE_BANDWIDTH * sample_rate / 2
+
+def decimation_for(frequency, sample_rate, harmonics=12):
+    """
+    The largest decimation factor of `sample_rate` that keeps `harmonics` partials of `frequency`
+    in the usable band, i.e. the factor for a target note's register.
+    """
+    for factor in sorted(DECIMATION_FACTORS, reverse=True):
+        if usable_bandwidth(sample_rate / factor) >= frequency * harmonics:
+            return factor
+    return 1
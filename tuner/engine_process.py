@@ -0,0 +1,433 @@
+"""
+The capture and analysis pipeline in a process of their own, publishing into shared memory.
+
+In-process, the FFT and peak picking share the GIL with Qt's painting. With `AudioProcessor(engine_process=True)`
+a spawned process owns the input and the `AnalysisPipeline` and writes every frame into a
+`FrameRing`: a `multiprocessing.shared_memory` block of fixed-layout records, each guarded by a
+sequence counter. The UI process takes the latest frame on every frame clock tick as views into
+that block, nothing is copied or pickled per frame. The frequency axis is written once per
+configuration, records refer to it by number.
+
+Settings travel to the engine through a pipe and are applied between frames as usual; timings and
+capture counters come back through it about twice a second.
+"""
+
+import multiprocessing
+import time
+import traceback
+from multiprocessing import shared_memory
+import numpy as np
+
+from tuner.instrumentation import Instrumentation
+from tuner.pipeline import MAX_BUFFER_SIZE, MIN_BUFFER_SIZE
+from tuner.pitch_engines import AnalysisResult
+
+class FrameRing:
+    """
+    `slots` analysis results in shared memory, written by one process and read by another.
+
+    Every record has a sequence counter that is odd while the writer fills it (a seqlock): the
+    reader takes the newest record and checks the counter before and after reading it, and
+    skips the frame if it changed. The arrays it hands out are views into the block, valid until
+    the writer comes round to the same slot again, `slots` frames later.
+
+    The frequency axis lives in two slots of its own and only changes with the configuration. A
+    record names its axis by number, and the reader keeps one view per axis, so the frequencies of
+    consecutive frames are the same array.
+    """
+
+    def __init__(self, name=None, slots=8, max_bins=MAX_BUFFER_SIZE // 2 + 1, max_peaks=64, max_partials=32):
+        self.slots = slots
+        self.max_bins = max_bins
+        self.max_peaks = max_peaks
+        self.max_partials = max_partials
+
+        record = np.dtype([
+            ("sequence", np.int64),  # Odd while the record is being written
+            ("frame", np.int64),
+            ("axis", np.int64),  # Number of the frequency axis the magnitudes belong to
+            ("capture_time", np.float64),  # time.perf_counter() of the input, the clock is system-wide
+            ("fundamental", np.float64),
+            ("confidence", np.float64),
+            ("bin_count", np.int64),
+            ("peak_count", np.int64),
+            ("partial_count", np.int64),
+            ("spectrum_frame", np.int64),
+            ("magnitudes", np.float64, max_bins),
+            ("peaks_idx", np.int64, max_peaks),
+            ("peak_frequencies", np.float64, max_peaks),
+            ("peak_magnitudes", np.float64, max_peaks),
+            ("partials", np.float64, max_partials),
+            ("partial_magnitudes", np.float64, max_partials),
+        ])
+        axis = np.dtype([("number", np.int64), ("bin_count", np.int64), ("frequencies", np.float64, max_bins)])
+        layout = np.dtype([("latest", np.int64), ("axes", axis, 2), ("records", record, slots)])
+
+        self.owner = name is None
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=layout.itemsize)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+
+        block = np.ndarray((), dtype=layout, buffer=self.memory.buf)
+        self.latest = block["latest"][...]  # Frame number of the newest complete record, -1 before the first
+        self.axes = block["axes"]
+        self.records = block["records"]
+        if self.owner:
+            self.latest[...] = -1
+            self.axes["number"] = -1
+            self.records["sequence"] = 0
+
+        # writer state
+        self.frames_written = 0
+        self.axis_number = -1
+        self.axis_source = None  # The frequency array the current axis was copied from
+
+        # reader state
+        self.last_read = -1
+        self.axis_views = {}  # axis number -> view of its frequencies
+        self.skipped_frames = 0  # Frames overwritten or torn before they were read
+
+    def options(self):
+        """Constructor arguments to attach to this ring from another process."""
+        return {"name": self.name, "slots": self.slots, "max_bins": self.max_bins, "max_peaks": self.max_peaks,
+                "max_partials": self.max_partials}
+
+    def publish_axis(self, frequencies):
+        """Make `frequencies` the axis of the following records, if it is not already."""
+        if frequencies is self.axis_source:
+            return
+
+        self.axis_number += 1
+        slot = self.axis_number % 2
+        count = min(len(frequencies), self.max_bins)
+        self.axes["frequencies"][slot, :count] = frequencies[:count]
+        self.axes["bin_count"][slot] = count
+        self.axes["number"][slot] = self.axis_number
+        self.axis_source = frequencies
+
+    def write(self, result, capture_time):
+        """Copy one `AnalysisResult` into the next slot and make it the latest frame."""
+        self.publish_axis(result.frequencies)
+        frame = self.frames_written
+        slot = frame % self.slots
+        records = self.records
+
+        records["sequence"][slot] += 1
+        records["frame"][slot] = frame
+        records["axis"][slot] = self.axis_number
+        records["capture_time"][slot] = capture_time
+        records["fundamental"][slot] = result.fundamental
+        records["confidence"][slot] = result.confidence
+        records["spectrum_frame"][slot] = result.spectrum_frame
+
+        count = min(len(result.magnitudes), self.max_bins)
+        records["bin_count"][slot] = count
+        records["magnitudes"][slot, :count] = result.magnitudes[:count]
+
+        count = min(len(result.peaks_idx), self.max_peaks)
+        records["peak_count"][slot] = count
+        records["peaks_idx"][slot, :count] = result.peaks_idx[:count]
+        records["peak_frequencies"][slot, :count] = result.peak_frequencies[:count]
+        records["peak_magnitudes"][slot, :count] = result.peak_magnitudes[:count]
+
+        count = min(len(result.partials), self.max_partials)
+        records["partial_count"][slot] = count
+        records["partials"][slot, :count] = result.partials[:count]
+        records["partial_magnitudes"][slot, :count] = result.partial_magnitudes[:count]
+        records["sequence"][slot] += 1
+
+        self.latest[...] = frame
+        self.frames_written += 1
+
+    def read_latest(self):
+        """The newest frame as (result, capture_time), or None if there is no new one or it was being overwritten."""
+        latest = int(self.latest)
+        if latest < 0 or latest == self.last_read:
+            return None
+
+        slot = latest % self.slots
+        record = self.records[slot]
+        sequence = int(record["sequence"])
+        if sequence % 2 or record["frame"] != latest:
+            self.skipped_frames += 1
+            return None
+
+        axis_number = int(record["axis"])
+        frequencies = self.axis_views.get(axis_number)
+        if frequencies is None:
+            bin_count = int(self.axes["bin_count"][axis_number % 2])
+            frequencies = self.axes["frequencies"][axis_number % 2, :bin_count]
+            self.axis_views = {axis_number: frequencies}
+
+        bins = int(record["bin_count"])
+        peaks = int(record["peak_count"])
+        partials = int(record["partial_count"])
+        records = self.records
+        result = AnalysisResult(frequencies, records["magnitudes"][slot, :bins], records["peaks_idx"][slot, :peaks],
+                                records["peak_frequencies"][slot, :peaks], records["peak_magnitudes"][slot, :peaks],
+                                float(record["fundamental"]), float(record["confidence"]),
+                                records["partials"][slot, :partials], records["partial_magnitudes"][slot, :partials],
+                                int(record["spectrum_frame"]))
+        capture_time = float(record["capture_time"])
+
+        # the record changed while it was read, or its axis was replaced by two newer configurations since
+        if int(records["sequence"][slot]) != sequence or self.axes["number"][axis_number % 2] != axis_number:
+            self.skipped_frames += 1
+            return None
+
+        self.skipped_frames += max(latest - self.last_read - 1, 0) if self.last_read >= 0 else 0
+        self.last_read = latest
+        return result, capture_time
+
+    def close(self):
+        # the views have to go before the buffer they point into
+        self.latest = self.axes = self.records = None
+        self.axis_views = {}
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+def open_engine_capture(source, options):
+    """The capture of the engine process: the source played back at its natural speed, or the live input."""
+    from tuner.audio_capture import SourceCapture
+
+    if source is not None:
+        return SourceCapture(source, options["buffer_size"], paced=True), source.sample_rate, None
+
+    from tuner.audio_backend import AudioBackend
+    backend = AudioBackend()
+    capture, sample_rate = backend.open_input(options.pop("capture_mode"), options["sample_rate"], options.pop("channels"),
+                                              options["hop_size"], options["buffer_size"])
+    return capture, sample_rate, backend
+
+def run_engine(connection, ring_options, source, options, stats_interval=0.5, max_consecutive_errors=10):
+    """Process entry point: capture and analyse, writing every frame to the ring, until told to stop."""
+    from tuner.pipeline import AnalysisPipeline
+
+    ring = FrameRing(**ring_options)
+    instrumentation = Instrumentation(enabled=options.pop("instrumentation"))
+    capture, sample_rate, backend = open_engine_capture(source, options)
+    options["sample_rate"] = sample_rate
+    adaptive_window = options.pop("adaptive_window")
+    pipeline = AnalysisPipeline(capture, instrumentation=instrumentation, **options)
+    pipeline.set_adaptive_window(adaptive_window)
+    instrumentation.add_source("capture", capture.stats)
+    connection.send(("started", sample_rate))
+
+    running = False
+    consecutive_errors = 0
+    last_stats = time.perf_counter()
+    try:
+        while True:
+            # block on the pipe while paused, only look at it between frames while running
+            while connection.poll(None if not running else 0):
+                message = connection.recv()
+                if message is None:
+                    return
+                kind, payload = message
+                if kind == "call":
+                    name, args = payload
+                    getattr(pipeline, name)(*args)
+                elif kind == "start":
+                    pipeline.reset()  # frames before a pause are not contiguous with the new ones
+                    capture.start()
+                    running = True
+                elif kind == "stop":
+                    capture.stop()
+                    running = False
+
+            if not running or pipeline.finished:
+                running = False
+                continue
+
+            try:
+                frame = pipeline.step()
+                if frame is not None:
+                    result, capture_time = frame
+                    start = instrumentation.start()
+                    ring.write(result, capture_time)
+                    instrumentation.stop("publish", start)
+                consecutive_errors = 0
+            except Exception as e:
+                # like AudioWorker.run: a bad frame is counted and skipped, only a persistent failure stops
+                instrumentation.count("errors")
+                if consecutive_errors == 0:
+                    print(f"error while processing audio data: {e}")
+                    traceback.print_exc()
+                consecutive_errors += 1
+                if consecutive_errors >= max_consecutive_errors:
+                    print("warning: too many errors in a row, audio processing stopped.")
+                    running = False
+
+            now = time.perf_counter()
+            if now - last_stats >= stats_interval:
+                last_stats = now
+                connection.send(("stats", instrumentation.snapshot()))
+    finally:
+        capture.close()
+        pipeline.close()
+        if backend is not None:
+            backend.terminate()
+        ring.close()
+        connection.close()
+
+class EngineProcess:
+    """
+    Handle on the engine process, with the interface of `AudioWorker`: the same setters, and
+    start/pause/resume/close of the input.
+
+    `poll` runs on the UI thread once per frame clock tick and hands the latest frame, if there is
+    a new one, to `receiver`. The process is spawned, not forked, since the parent runs Qt and audio
+    threads that a fork would copy in an undefined state.
+    """
+
+    def __init__(self, receiver, source=None, sample_rate=12000, buffer_size=4096, hop_size=256, channels=1,
+                 window="hann", refinement="phase_vocoder", engine="fft", capture_mode="callback", decimation=1,
+                 adaptive_window=False, instrumentation=None, max_latency=0.1):
+        self.receiver = receiver
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation(enabled=False)
+        self.max_latency = max_latency  # Age in seconds above which a delivered frame counts as late
+        self.sample_rate = sample_rate  # Input rate, the live device may not support the requested one
+        self.requested_engine = engine
+        self.requested_buffer_size = buffer_size
+        self.engine_snapshot = {"stages": {}, "counters": {}}
+        self.delivered_frames = 0
+        self.late_frames = 0
+        self.last_latency = 0.0
+
+        self.ring = FrameRing()
+        options = {"sample_rate": sample_rate, "buffer_size": buffer_size, "hop_size": hop_size, "window": window,
+                   "refinement": refinement, "engine": engine, "decimation": decimation,
+                   "adaptive_window": adaptive_window, "instrumentation": self.instrumentation.enabled}
+        if source is None:
+            options.update(capture_mode=capture_mode, channels=channels)
+
+        context = multiprocessing.get_context("spawn")
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=run_engine, args=(child_connection, self.ring.options(), source, options),
+                                       name="stroby-engine", daemon=True)
+        self.process.start()
+        child_connection.close()
+
+    def call(self, name, *args):
+        """Call the pipeline method `name` in the engine process, before its next frame."""
+        try:
+            self.connection.send(("call", (name, args)))
+        except (BrokenPipeError, OSError):
+            print(f"warning: engine process is gone, {name} ignored.")
+
+    def set_refinement(self, refinement):
+        self.call("set_refinement", refinement)
+
+    def set_hop_size(self, hop_size):
+        self.call("set_hop_size", hop_size)
+
+    def set_engine(self, engine):
+        self.requested_engine = engine
+        self.call("set_engine", engine)
+
+    def set_adaptive_window(self, enabled):
+        self.call("set_adaptive_window", enabled)
+
+    def set_decimation(self, factor):
+        self.call("set_decimation", factor)
+
+    def set_target(self, frequency):
+        self.call("set_target", frequency)
+
+    def set_buffer_size(self, buffer_size):
+        self.requested_buffer_size = min(max(buffer_size, MIN_BUFFER_SIZE), MAX_BUFFER_SIZE)
+        self.call("set_buffer_size", buffer_size)
+
+    def start_recording(self, path):
+        # the engine process writes the recording, relative paths are the same in both processes
+        self.call("start_recording", path)
+
+    def stop_recording(self):
+        self.call("stop_recording")
+
+    def increase_buffer_size(self):
+        # choosing a size by hand ends the adaptive mode
+        self.set_adaptive_window(False)
+        self.set_buffer_size(self.requested_buffer_size * 2)
+
+    def decrease_buffer_size(self):
+        self.set_adaptive_window(False)
+        self.set_buffer_size(self.requested_buffer_size // 2)
+
+    def start(self):
+        self.connection.send(("start", None))
+
+    def pause_stream(self):
+        self.connection.send(("stop", None))
+
+    def unpause_stream(self):
+        self.start()
+
+    def poll(self):
+        """Take messages from the engine and deliver the latest frame. Runs on the UI thread."""
+        start = self.instrumentation.start()
+        try:
+            while self.connection.poll():
+                kind, payload = self.connection.recv()
+                if kind == "started":
+                    self.sample_rate = payload
+                elif kind == "stats":
+                    self.engine_snapshot = payload
+        except (EOFError, OSError):
+            pass  # the process ended, its last frames are still in the ring
+
+        frame = self.ring.read_latest()
+        if frame is None:
+            return
+        self.instrumentation.stop("map_frame", start)
+
+        result, capture_time = frame
+        self.last_latency = time.perf_counter() - capture_time
+        if self.last_latency > self.max_latency:
+            self.late_frames += 1
+        self.instrumentation.add_duration("latency", self.last_latency)
+        self.delivered_frames += 1
+        self.receiver(result)
+
+    def capture_stats(self):
+        """Overflow and underflow counts of the input, as last reported by the engine."""
+        counters = self.engine_snapshot["counters"]
+        prefix = "capture."
+        return {key[len(prefix):]: value for key, value in counters.items() if key.startswith(prefix)}
+
+    def engine_stats(self):
+        """Median stage timings and counters of the engine process, as last reported."""
+        stats = {f"{stage}_us": timing["median_us"] for stage, timing in self.engine_snapshot["stages"].items()}
+        stats.update((key, value) for key, value in self.engine_snapshot["counters"].items() if not key.startswith("capture."))
+        return stats
+
+    def stats(self):
+        """Delivery counters, like `ResultChannel.stats`."""
+        return {
+            "posted_frames": int(self.ring.latest) + 1,
+            "delivered_frames": self.delivered_frames,
+            "dropped_frames": self.ring.skipped_frames,
+            "late_frames": self.late_frames,
+            "last_latency": self.last_latency,
+            "queue_depth": int(int(self.ring.latest) > self.ring.last_read),
+        }
+
+    def close_stream(self):
+        if self.process is None:
+            return
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=2.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.connection.close()
+        self.ring.close()
+        self.process = None
+
+    def terminate_stream(self):
+        self.close_stream()
@@ -0,0 +1,73 @@
+import time
+from PyQt6.QtCore import QObject, QTimer, Qt
+
+class FrameClock(QObject):
+    """
+    The one display timer of a window. Widgets are never repainted when data arrives, only on a tick.
+
+    On every tick the animations advance by the wall time elapsed since the previous tick, then every
+    widget that moved or was marked dirty since is repainted once. Several results arriving between
+    two ticks therefore cost a single repaint, and animation speed does not depend on the display or
+    analysis rate.
+    """
+
+    max_step = 0.1  # Longest time step in seconds, so a stall does not make the strobes jump
+
+    def __init__(self, fps=60, parent=None):
+        super().__init__(parent)
+        self.fps = fps
+        self.animations = []  # Widgets with an `advance(dt)` method that returns True if they need a repaint
+        self.pollers = []  # Callables run at the start of every tick, e.g. to take the latest frame from another process
+        self.dirty = set()
+        self.last_tick = None
+        self.frames = 0
+
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.setInterval(round(1000 / fps))
+        self.timer.timeout.connect(self.tick)
+
+    def start(self):
+        self.last_tick = None
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def add_animation(self, widget):
+        if widget not in self.animations:
+            self.animations.append(widget)
+
+    def remove_animation(self, widget):
+        if widget in self.animations:
+            self.animations.remove(widget)
+        self.dirty.discard(widget)
+
+    def add_poller(self, poller):
+        if poller not in self.pollers:
+            self.pollers.append(poller)
+
+    def remove_poller(self, poller):
+        if poller in self.pollers:
+            self.pollers.remove(poller)
+
+    def mark_dirty(self, widget):
+        """Repaint `widget` on the next tick."""
+        self.dirty.add(widget)
+
+    def tick(self):
+        now = time.perf_counter()
+        dt = 0.0 if self.last_tick is None else min(now - self.last_tick, self.max_step)
+        self.last_tick = now
+
+        for poller in self.pollers:
+            poller()
+
+        for widget in self.animations:
+            if widget.advance(dt):
+                self.dirty.add(widget)
+
+        for widget in self.dirty:
+            widget.update()
+        self.dirty.clear()
+        self.frames += 1
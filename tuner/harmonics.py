@@ -0,0 +1,78 @@
+import numpy as np
+
+class HarmonicGrouper:
+    """
+    Groups spectral peaks into a harmonic series and picks its fundamental (harmonic sum).
+
+    Every peak divided by 1..`max_harmonics` is a fundamental candidate. A candidate scores the
+    summed magnitude of the peaks that sit on its harmonics, scaled by the fraction of its expected
+    harmonics that were found, so sub-octave candidates (which explain the same peaks, but miss
+    every odd harmonic) lose against the true fundamental. Everything is evaluated as one
+    candidates x peaks matrix, without Python loops.
+    """
+
+    def __init__(self, max_harmonics=12, tolerance=35.0, min_frequency=20.0, max_frequency=4000.0):
+        self.max_harmonics = max_harmonics
+        self.tolerance = tolerance  # Cents a peak may deviate from a harmonic and still belong to it, allows for inharmonicity
+        self.min_frequency = min_frequency
+        self.max_frequency = max_frequency
+        self.harmonic_numbers = np.arange(1, max_harmonics + 1)
+
+    def silent(self):
+        """Result when no harmonic series was found."""
+        return 0.0, np.zeros(self.max_harmonics), np.zeros(self.max_harmonics), 0.0
+
+    def group(self, peak_frequencies, peak_magnitudes):
+        """
+        Return (fundamental, partials, partial_magnitudes, confidence).
+
+        `partials[k - 1]` is the frequency of the k-th harmonic: the loudest peak on it, or
+        k * fundamental with magnitude 0 if no peak was found there.
+        """
+        valid = (peak_frequencies > 0) & (peak_magnitudes > 0)
+        frequencies = peak_frequencies[valid]
+        magnitudes = peak_magnitudes[valid]
+        if len(frequencies) == 0:
+            return self.silent()
+
+        candidates = (frequencies[:, None] / self.harmonic_numbers[None, :]).ravel()
+        candidates = candidates[(candidates >= self.min_frequency) & (candidates <= self.max_frequency)]
+        if len(candidates) == 0:
+            return self.silent()
+
+        # harmonic number and deviation in cents of every peak relative to every candidate
+        ratios = frequencies[None, :] / candidates[:, None]
+        harmonic = np.rint(ratios)
+        deviation = 1200 * np.abs(np.log2(ratios / np.maximum(harmonic, 1)))
+        matched = (harmonic >= 1) & (harmonic <= self.max_harmonics) & (deviation < self.tolerance)
+
+        energy = np.sum(matched * magnitudes[None, :], axis=1)
+        expected = np.clip(np.floor(frequencies.max() / candidates * 2 ** (self.tolerance / 1200)), 1, self.max_harmonics)
+        coverage = np.minimum(np.sum(matched, axis=1), expected) / expected
+        score = energy * coverage
+
+        best = int(np.argmax(score))
+        confidence = float(score[best] / np.sum(magnitudes))
+
+        # loudest peak per harmonic of the winning candidate
+        on_series = matched[best]
+        numbers = harmonic[best, on_series].astype(int)
+        order = np.lexsort((magnitudes[on_series], numbers))
+        numbers, series_frequencies, series_magnitudes = numbers[order], frequencies[on_series][order], magnitudes[on_series][order]
+        loudest = np.append(numbers[1:] != numbers[:-1], True)
+
+        found = np.zeros(self.max_harmonics, dtype=bool)
+        partial_magnitudes = np.zeros(self.max_harmonics)
+        partials = np.zeros(self.max_harmonics)
+        found[numbers[loudest] - 1] = True
+        partials[numbers[loudest] - 1] = series_frequencies[loudest]
+        partial_magnitudes[numbers[loudest] - 1] = series_magnitudes[loudest]
+
+        if found[0]:
+            # the fundamental's own peak is the most accurate estimate, higher partials of strings are stretched
+            fundamental = partials[0]
+        else:
+            fundamental = float(np.average(partials[found] / self.harmonic_numbers[found], weights=partial_magnitudes[found]))
+
+        partials[~found] = fundamental * self.harmonic_numbers[~found]
+        return float(fundamental), partials, partial_magnitudes, confidence
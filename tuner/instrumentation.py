@@ -0,0 +1,159 @@
+"""
+Always-on timing and counters for the hot path.
+
+Stages record durations into fixed log-spaced histograms, so recording is a few integer operations
+and memory stays constant. Counters that other objects already keep (overflows, dropped frames,
+queue depths) are not copied on every frame, they are pulled from registered sources when a
+snapshot is taken. With `enabled` False, `start` and `stop` return immediately.
+"""
+
+import json
+import math
+import platform
+import time
+
+BINS_PER_OCTAVE = 4
+MIN_EXPONENT = 6  # Lowest bin edge 2**6 ns = 64 ns
+MAX_EXPONENT = 33  # Highest bin edge 2**33 ns = 8.6 s
+BIN_COUNT = (MAX_EXPONENT - MIN_EXPONENT) * BINS_PER_OCTAVE
+
+class StageHistogram:
+    """Durations of one stage in log-spaced bins, 4 per octave (~19 % wide)."""
+
+    def __init__(self):
+        self.counts = [0] * BIN_COUNT
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def add(self, duration_ns):
+        self.count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+        index = int((math.log2(duration_ns) - MIN_EXPONENT) * BINS_PER_OCTAVE) if duration_ns > 0 else 0
+        self.counts[min(max(index, 0), BIN_COUNT - 1)] += 1
+
+    @staticmethod
+    def bin_edge_ns(index):
+        return 2 ** (MIN_EXPONENT + index / BINS_PER_OCTAVE)
+
+    def percentile(self, p):
+        """Upper edge of the bin holding the p-th percentile, in nanoseconds."""
+        if self.count == 0:
+            return 0.0
+
+        rank = p / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count > 0:
+                return min(self.bin_edge_ns(index + 1), self.max_ns)
+        return float(self.max_ns)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_us": self.total_ns / self.count / 1000 if self.count > 0 else 0.0,
+            "median_us": self.percentile(50) / 1000,
+            "p95_us": self.percentile(95) / 1000,
+            "p99_us": self.percentile(99) / 1000,
+            "max_us": self.max_ns / 1000,
+        }
+
+class Instrumentation:
+    """
+    Per-stage timing histograms and counters.
+
+    Time a stage with `start` and `stop`; `stop` returns a new start time, so consecutive stages
+    chain without extra calls:
+
+        start = instrumentation.start()
+        transform()
+        start = instrumentation.stop("fft", start)
+        estimate()
+        instrumentation.stop("peak_pick", start)
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.histograms = {}
+        self.counters = {}
+        self.sources = {}  # name -> callable returning a dict of counters
+        self.created = time.time()
+
+    def start(self):
+        return time.perf_counter_ns() if self.enabled else 0
+
+    def stop(self, stage, start):
+        if not self.enabled:
+            return 0
+
+        now = time.perf_counter_ns()
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = StageHistogram()
+        histogram.add(now - start)
+        return now
+
+    def timed(self, stage, function, *args):
+        """Call `function(*args)` and record its duration as `stage`."""
+        if not self.enabled:
+            return function(*args)
+
+        start = time.perf_counter_ns()
+        result = function(*args)
+        self.stop(stage, start)
+        return result
+
+    def add_duration(self, stage, seconds):
+        """Record a duration measured elsewhere, e.g. the age of a frame on delivery."""
+        if self.enabled:
+            self.stop(stage, time.perf_counter_ns() - int(seconds * 1e9))
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def add_source(self, name, stats):
+        """Register a callable returning a dict of counters, read on every snapshot."""
+        self.sources[name] = stats
+
+    def reset(self):
+        self.histograms = {}
+        self.counters = {}
+
+    def snapshot(self):
+        """
+        Current histograms and counters as a JSON-serialisable dict.
+
+        Runs on the UI thread while the worker may add stages and counters. The dicts are copied
+        into lists first (a single step under the GIL), iterating them directly could see them grow.
+        """
+        counters = dict(list(self.counters.items()))
+        for name, stats in list(self.sources.items()):
+            for key, value in stats().items():
+                counters[f"{name}.{key}"] = value
+
+        return {
+            "enabled": self.enabled,
+            "uptime_s": time.time() - self.created,
+            "stages": {stage: histogram.summary() for stage, histogram in list(self.histograms.items())},
+            "counters": counters,
+        }
+
+    def format_lines(self):
+        """Snapshot as short text lines, for the stats overlay."""
+        snapshot = self.snapshot()
+        lines = [f"{stage:<16} {timing['median_us']:8.1f} us  p95 {timing['p95_us']:8.1f} us"
+                 for stage, timing in sorted(snapshot["stages"].items())]
+        lines += [f"{name:<28} {round(value, 4) if isinstance(value, float) else value}"
+                  for name, value in sorted(snapshot["counters"].items())]
+        return lines
+
+    def dump(self, path):
+        snapshot = self.snapshot()
+        snapshot["created"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        snapshot["platform"] = platform.platform()
+        with open(path, "w") as file:
+            json.dump(snapshot, file, indent=2)
@@ -0,0 +1,27 @@
+import threading
+
+class LatestResultMailbox:
+    """Thread-safe single-slot mailbox. A new result replaces an unread one, which is counted as dropped."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.slot = None
+        self.posted_frames = 0
+        self.dropped_frames = 0
+
+    def put(self, item):
+        """Store the item. Returns True if the mailbox was empty, i.e. the reader needs to be notified."""
+        with self.lock:
+            was_empty = self.slot is None
+            if not was_empty:
+                self.dropped_frames += 1
+            self.slot = item
+            self.posted_frames += 1
+        return was_empty
+
+    def take(self):
+        """Remove and return the latest item, or None if there is nothing new."""
+        with self.lock:
+            item = self.slot
+            self.slot = None
+        return item
@@ -0,0 +1,184 @@
+"""
+Independent pitch analysis of every channel of a multi-channel input, spread over worker processes.
+
+The capture keeps the channels apart (`Capture(mixdown=False)`). On every hop the new frames are
+sent to a pool of processes, each of which owns the `AnalysisPipeline`s of a fixed subset of the
+channels, so phase history, adaptive windows and decimation stay per channel. The results come
+back as one list per hop, `results[channel]` being an `AnalysisResult` (or None while a channel's
+window is still filling).
+"""
+
+import multiprocessing
+import os
+import time
+
+from tuner.audio_capture import BlockCapture
+from tuner.instrumentation import Instrumentation
+from tuner.pipeline import MAX_BUFFER_SIZE, MIN_BUFFER_SIZE, AnalysisPipeline
+
+def run_channels(connection, channel_count, sample_rate, options):
+    """Process entry point: run one pipeline per channel on the frames received from `connection`."""
+    pipelines = [AnalysisPipeline(BlockCapture(options["buffer_size"]), sample_rate, **options) for _ in range(channel_count)]
+
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+
+        kind, payload = message
+        if kind == "frames":
+            results = []
+            for pipeline, column in zip(pipelines, payload.T):
+                pipeline.capture.push(column)
+                frame = pipeline.step()
+                results.append(None if frame is None else frame[0])
+            connection.send(results)
+        elif kind == "call":
+            # a setter of AnalysisPipeline, applied to every channel
+            name, args = payload
+            for pipeline in pipelines:
+                getattr(pipeline, name)(*args)
+
+    connection.close()
+
+class ChannelPool:
+    """
+    Worker processes running the pipelines of `channel_count` channels, channel i in process i % processes.
+
+    Processes are spawned rather than forked, the parent runs Qt and audio threads that a fork
+    would copy in an undefined state.
+    """
+
+    def __init__(self, channel_count, sample_rate, processes=None, **options):
+        self.channel_count = channel_count
+        processes = min(channel_count, processes or os.cpu_count() or 1)
+        context = multiprocessing.get_context("spawn")
+
+        self.workers = []  # (connection, process, channel indices)
+        for index in range(processes):
+            channels = list(range(index, channel_count, processes))
+            connection, child_connection = context.Pipe()
+            process = context.Process(target=run_channels, args=(child_connection, len(channels), sample_rate, options),
+                                      name=f"stroby-channels-{index}", daemon=True)
+            process.start()
+            child_connection.close()
+            self.workers.append((connection, process, channels))
+
+    def analyse(self, frames):
+        """Analyse a block of new (frames x channels) audio on all workers at once. Returns one result per channel."""
+        for connection, _, channels in self.workers:
+            connection.send(("frames", frames[:, channels]))
+
+        results = [None] * self.channel_count
+        for connection, _, channels in self.workers:
+            for channel, result in zip(channels, connection.recv()):
+                results[channel] = result
+        return results
+
+    def call(self, name, *args):
+        """Call the pipeline method `name` on every channel, before its next frame."""
+        for connection, _, _ in self.workers:
+            connection.send(("call", (name, args)))
+
+    def close(self):
+        for connection, process, _ in self.workers:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            process.join(timeout=1.0)
+            if process.is_alive():
+                process.terminate()
+            connection.close()
+        self.workers = []
+
+class MultiChannelPipeline:
+    """
+    Drop-in replacement for `AnalysisPipeline` on a capture that keeps its channels apart.
+
+    `step` returns (results, capture_time) with one `AnalysisResult` or None per channel. Settings
+    are forwarded to the per-channel pipelines, which apply them between frames as usual.
+    """
+
+    def __init__(self, capture, sample_rate, buffer_size=4096, hop_size=256, window="hann", refinement="phase_vocoder",
+                 max_peaks=16, engine="fft", instrumentation=None, decimation=1, processes=None):
+        self.capture = capture
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation(enabled=False)
+        self.channel_count = capture.channels
+        self.input_rate = sample_rate
+        self.sample_rate = sample_rate / decimation if decimation > 1 else sample_rate  # Rate of the analysed frames
+        self.decimation = decimation
+        self.hop_size = hop_size  # Frames per step after decimation, like the channel pipelines count them
+        self.requested_buffer_size = buffer_size
+        self.requested_engine = engine
+        self.position = 0  # `capture.position` when the last block was taken
+        self.overflows = 0
+
+        self.pool = ChannelPool(self.channel_count, sample_rate, processes, buffer_size=buffer_size, hop_size=hop_size,
+                                window=window, refinement=refinement, max_peaks=max_peaks, engine=engine,
+                                decimation=decimation)
+
+    @property
+    def finished(self):
+        return self.capture.finished
+
+    def set_refinement(self, refinement):
+        self.pool.call("set_refinement", refinement)
+
+    def set_engine(self, engine):
+        self.requested_engine = engine
+        self.pool.call("set_engine", engine)
+
+    def set_hop_size(self, hop_size):
+        self.hop_size = hop_size
+        self.pool.call("set_hop_size", hop_size)
+
+    def set_buffer_size(self, buffer_size):
+        self.requested_buffer_size = min(max(buffer_size, MIN_BUFFER_SIZE), MAX_BUFFER_SIZE)
+        self.pool.call("set_buffer_size", buffer_size)
+
+    def set_adaptive_window(self, enabled, **options):
+        self.pool.call("set_adaptive_window", enabled)
+
+    def set_decimation(self, factor):
+        # the channel pipelines keep the hop duration, see AnalysisPipeline.apply_decimation
+        self.hop_size = max(round(self.hop_size * self.decimation / factor), 1)
+        self.decimation = factor
+        self.sample_rate = self.input_rate / factor if factor > 1 else self.input_rate
+        self.pool.call("set_decimation", factor)
+
+    def set_target(self, frequency):
+        self.pool.call("set_target", frequency)
+
+    def reset(self):
+        self.pool.call("reset")
+        self.capture.clear()
+        self.position = self.capture.position
+
+    def close(self):
+        self.pool.close()
+
+    def step(self):
+        """Analyse the next hop on every channel. Returns (results, capture_time), or None if no new frame is available yet."""
+        # the channel pipelines cut the hop to their buffer size
+        if not self.capture.wait_for_frames(min(self.hop_size, self.requested_buffer_size) * self.decimation):
+            return None
+        start = self.instrumentation.start()
+
+        # every frame since the last step goes to the channel pipelines, so their windows stay contiguous
+        count = self.capture.position - self.position
+        self.position = self.capture.position
+        if count > self.capture.ring.capacity or self.capture.overflows != self.overflows:
+            self.overflows = self.capture.overflows
+            self.pool.call("reset")
+            count = min(count, self.capture.ring.capacity)
+
+        frames = self.capture.read_latest(count)
+        capture_time = time.perf_counter()
+        start = self.instrumentation.stop("read", start)
+
+        results = self.pool.analyse(frames)
+        self.instrumentation.stop("channels", start)
+        if all(result is None for result in results):
+            return None
+        return results, capture_time
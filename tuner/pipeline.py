@@ -0,0 +1,407 @@
+import threading
+import time
+import numpy as np
+
+from tuner.analysis_plan import get_analysis_plan
+from tuner.instrumentation import Instrumentation
+from tuner.pitch_engines import create_engine
+from tuner.target_tracking import TargetTracker
+from tuner.tuning import get_tuning_system
+
+MIN_BUFFER_SIZE = 256
+MAX_BUFFER_SIZE = 32768
+
+class AdaptiveWindow:
+    """
+    Picks the analysis window from the detected fundamental: long windows for low notes, short
+    ones for high notes.
+
+    The window should span `periods` periods of the fundamental, rounded up to a power of two. It
+    grows as soon as a note needs more, and shrinks only once half the window would still be
+    `margin` longer than needed. Either change must be asked for by `hold` frames in a row, so
+    vibrato and single misdetections around a boundary do not make it flip back and forth.
+    """
+
+    def __init__(self, sample_rate, min_size=1024, max_size=16384, periods=8, margin=0.2, hold=6):
+        self.sample_rate = sample_rate
+        self.min_size = min_size
+        self.max_size = max_size
+        self.periods = periods
+        self.margin = margin
+        self.hold = hold
+        self.pending_size = None
+        self.pending_frames = 0
+
+    def target_size(self, fundamental):
+        """Power of two window holding `periods` periods of `fundamental`, within the size limits."""
+        required = self.periods * self.sample_rate / fundamental
+        return min(max(1 << (int(required) - 1).bit_length(), self.min_size), self.max_size)
+
+    def update(self, fundamental, buffer_size):
+        """Return the window size for the next frames, given the fundamental (0 if none) detected at `buffer_size`."""
+        if fundamental <= 0:
+            self.pending_frames = 0
+            return buffer_size  # keep the window through silence and note changes
+
+        size = self.target_size(fundamental)
+        required = self.periods * self.sample_rate / fundamental
+        if size < buffer_size and required * (1 + self.margin) > buffer_size / 2:
+            size = buffer_size  # inside the hysteresis band
+
+        if size == buffer_size or size != self.pending_size:
+            self.pending_size = size
+            self.pending_frames = 1 if size != buffer_size else 0
+            return buffer_size
+
+        self.pending_frames += 1
+        if self.pending_frames < self.hold:
+            return buffer_size
+
+        self.pending_frames = 0
+        return size
+
+class AnalysisPipeline:
+    """
+    The pitch analysis path from a capture to peak frequencies, independent of Qt.
+
+    Every call to `step` waits for one hop of new audio, analyses the most recent `buffer_size`
+    frames and returns the result, so it can be driven from a `QThread`, a command line loop or a
+    benchmark alike.
+
+    `sample_rate` is the rate of the capture's input. With a decimation factor the analysis runs
+    at `sample_rate / decimation`, and the buffer and hop sizes count frames at that rate.
+
+    With a target set, a `TargetTracker` runs on every frame. Once a full search has found a note
+    near the target, the tracker's pitch is used and the engine only runs again once the tracker
+    loses it. Meanwhile the spectrum view is refreshed from a transform alone, at most `spectrum_rate`
+    times a second.
+    """
+
+    spectrum_rate = 10  # Spectrum refreshes per second while the tracker holds the note
+
+    def __init__(self, capture, sample_rate, buffer_size=4096, hop_size=256, window="hann", refinement="phase_vocoder",
+                 max_peaks=16, engine="fft", instrumentation=None, decimation=1):
+        self.capture = capture
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation(enabled=False)
+        self.input_rate = sample_rate
+        self.decimation = decimation
+        self.requested_decimation = decimation  # Applied by `step` between frames
+        self.sample_rate = sample_rate / decimation if decimation > 1 else sample_rate  # Rate of the analysed frames
+        capture.set_decimation(decimation)
+        self.buffer_size = buffer_size  # Analysis window length
+        self.requested_buffer_size = buffer_size  # Applied by `step` between frames
+        self.resized_by_hand = False  # A size from set_buffer_size is pending, the adaptive window waits for it
+        self.request_lock = threading.Lock()  # The window size is requested by hand and by the adaptive window
+        self.hop_size = min(hop_size, buffer_size)  # Frames read per analysis frame, at most the buffer size
+        self.requested_hop_size = hop_size  # Applied by `step` between frames
+        self.max_fft_peaks = max_peaks
+        self.window_name = window
+        self.refinement = refinement
+        self.overflows = 0
+        self.plan = get_analysis_plan(self.sample_rate, self.buffer_size, self.window_name, self.max_fft_peaks)
+        self.engine = create_engine(engine, self.sample_rate, self.buffer_size, self.hop_size, self.refinement)
+        self.requested_engine = engine  # Applied by `step` between frames
+        self.engine_position = None  # `capture.position` when the engine was last fed, None to restart its history
+        capture.reserve(self.engine.history_size)
+        self.adaptive_window = None  # An AdaptiveWindow while the window follows the detected pitch
+        self.adaptive_options = None  # Its options, None while the window size is fixed
+        self.requested_adaptive_options = None  # Applied by `step` between frames
+        self.target_frequency = None
+        self.requested_target_frequency = None  # Applied by `step` between frames
+        self.tracker = None  # A TargetTracker while a target is set
+        self.tracked_frames = 0  # Frames taken from the tracker since the engine last ran
+        self.spectrum_interval = 1  # Tracked frames per spectrum refresh, see configure_tracker
+        self.last_search = None  # Result of the last frame the engine ran on, with the latest spectrum
+        self.frame_number = 0  # Frames read so far, see AnalysisResult.spectrum_frame
+        self.recorder = None  # A SessionRecorder while the session is recorded, see start_recording
+
+    @property
+    def finished(self):
+        """True once a finite input has been read to the end."""
+        return self.capture.finished
+
+    def set_refinement(self, refinement):
+        """Switch the sub-bin peak refinement stage (see `tuner.pitch_estimation.REFINERS`)."""
+        self.refinement = refinement
+        self.engine.set_refinement(refinement)
+
+    def set_engine(self, engine):
+        """Request another pitch engine (see `tuner.pitch_engines.ENGINES`), applied before the next frame."""
+        self.requested_engine = engine
+
+    def set_hop_size(self, hop_size):
+        """Request the number of frames read per update, applied before the next frame. It never exceeds the buffer size."""
+        with self.request_lock:
+            self.requested_hop_size = max(hop_size, 1)
+
+    def set_target(self, frequency):
+        """Track the note near `frequency` with a `TargetTracker` (None for full search only), applied before the next frame."""
+        self.requested_target_frequency = frequency
+
+    def configure_tracker(self):
+        """Rebuild the tracker for the current target, sample rate, hop and buffer size."""
+        self.target_frequency = self.requested_target_frequency
+        self.tracked_frames = 0
+        # a long window hardly changes from one hop to the next, refresh once a quarter of it is new
+        self.spectrum_interval = max(round(self.sample_rate / self.hop_size / self.spectrum_rate),
+                                     self.buffer_size // (4 * self.hop_size), 1)
+        if self.target_frequency is None:
+            self.tracker = None
+        else:
+            self.tracker = TargetTracker(self.sample_rate, self.hop_size, self.target_frequency, max_length=self.buffer_size)
+
+    def set_buffer_size(self, buffer_size):
+        """
+        Request a new analysis window length, applied before the next frame. The input keeps running.
+
+        An adaptive window leaves a size set this way alone until it has been analysed for one hop.
+        """
+        with self.request_lock:
+            self.requested_buffer_size = min(max(buffer_size, MIN_BUFFER_SIZE), MAX_BUFFER_SIZE)
+            self.resized_by_hand = True
+
+    def set_adaptive_window(self, enabled, **options):
+        """
+        Let the window size follow the detected fundamental (see `AdaptiveWindow`), or fix it at its
+        current size. Applied before the next frame.
+        """
+        self.requested_adaptive_options = options if enabled else None
+
+    def apply_adaptive_window(self):
+        """Switch the adaptive window on or off as requested, its sizes count frames at the current sample rate."""
+        self.adaptive_options = self.requested_adaptive_options
+        if self.adaptive_options is None:
+            self.adaptive_window = None
+            return
+
+        self.adaptive_window = AdaptiveWindow(self.sample_rate, **self.adaptive_options)
+        # keep enough audio for the longest window, so growing never waits for the ring to fill
+        self.capture.reserve(self.adaptive_window.max_size)
+
+    def apply_hop_size(self):
+        """Switch to the requested hop, cut to the buffer size: a longer hop would skip audio and confuse the phase unwrap."""
+        self.hop_size = min(self.requested_hop_size, self.buffer_size)
+        self.engine.configure(self.sample_rate, self.buffer_size, self.hop_size)
+        self.engine_position = None
+        self.configure_tracker()
+
+    def set_decimation(self, factor):
+        """Request a new decimation factor of the input (see `tuner.decimation`), applied before the next frame."""
+        self.requested_decimation = factor
+
+    def apply_decimation(self):
+        """Switch to the requested decimation, keeping the duration of the window and the hop."""
+        scale = self.decimation / self.requested_decimation
+        self.decimation = self.requested_decimation
+        self.sample_rate = self.input_rate / self.decimation if self.decimation > 1 else self.input_rate
+        self.capture.set_decimation(self.decimation)
+
+        with self.request_lock:
+            self.buffer_size = self.requested_buffer_size = min(max(round(self.buffer_size * scale), MIN_BUFFER_SIZE),
+                                                                MAX_BUFFER_SIZE)
+            self.requested_hop_size = max(round(self.requested_hop_size * scale), 1)
+        self.hop_size = min(self.requested_hop_size, self.buffer_size)
+        self.capture.reserve(self.buffer_size)
+        self.plan = get_analysis_plan(self.sample_rate, self.buffer_size, self.window_name, self.max_fft_peaks)
+        self.engine.configure(self.sample_rate, self.buffer_size, self.hop_size)
+        self.engine_position = None
+        self.apply_adaptive_window()
+        self.configure_tracker()
+
+    def apply_settings(self):
+        """Apply a requested engine, decimation, adaptive window, buffer or hop size. Only called between frames."""
+        if self.requested_decimation != self.decimation:
+            self.apply_decimation()
+
+        if self.requested_adaptive_options != self.adaptive_options:
+            self.apply_adaptive_window()
+
+        if self.requested_engine != self.engine.name:
+            self.engine = create_engine(self.requested_engine, self.sample_rate, self.buffer_size, self.hop_size, self.refinement)
+            self.engine_position = None
+            self.capture.reserve(self.engine.history_size)
+            if self.tracker is not None:
+                self.tracker.reset()  # let the new engine find the note, its spectrum has other bins
+
+        with self.request_lock:
+            buffer_size = self.requested_buffer_size
+            self.resized_by_hand = False  # the size is analysed from this frame on, the adaptive window may change it after
+        if buffer_size != self.buffer_size:
+            self.buffer_size = buffer_size
+            self.capture.reserve(self.buffer_size)
+            self.plan = get_analysis_plan(self.sample_rate, self.buffer_size, self.window_name, self.max_fft_peaks)
+            self.apply_hop_size()
+
+        if min(self.requested_hop_size, self.buffer_size) != self.hop_size:
+            self.apply_hop_size()
+
+        if self.requested_target_frequency != self.target_frequency:
+            self.configure_tracker()
+
+    def settings(self):
+        """The requested settings, as recorded by a `SessionRecorder` and requested again on replay."""
+        return {"engine": self.requested_engine, "refinement": self.refinement, "buffer_size": self.requested_buffer_size,
+                "hop_size": self.requested_hop_size, "decimation": self.requested_decimation,
+                "target": self.requested_target_frequency, "adaptive_window": self.requested_adaptive_options is not None}
+
+    def start_recording(self, path):
+        """Record the raw input and every result from now on to `path` (see `tuner.recording`)."""
+        from tuner.recording import SessionRecorder  # the recording module imports this one
+
+        self.stop_recording()
+        SessionRecorder(path, self)
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def reset(self):
+        """Drop buffered audio and frame history, e.g. when resuming after a pause."""
+        if self.recorder is not None:
+            self.recorder.write_reset()
+        self.engine.reset()
+        self.engine_position = None
+        if self.tracker is not None:
+            self.tracker.reset()
+        self.capture.clear()
+
+    def close(self):
+        """Release what the pipeline holds besides the capture, i.e. finish a recording. See also `MultiChannelPipeline.close`."""
+        self.stop_recording()
+
+    def read_frame(self):
+        """Wait for one hop of new audio and copy the latest window into the plan. Returns False if there is none yet."""
+        # Wait for one hop of new audio data in the capture ring
+        if not self.capture.wait_for_frames(self.hop_size):
+            return False
+        start = self.instrumentation.start()
+
+        if self.capture.overflows != self.overflows:
+            # frames were lost, so the phase of the previous frame no longer lines up
+            self.overflows = self.capture.overflows
+            if self.recorder is not None:
+                self.recorder.write_overflow()
+            self.engine.reset()
+            if self.tracker is not None:
+                self.tracker.reset()
+
+        # Copy the most recent window, overlapping the previous one by buffer_size - hop_size frames
+        complete = self.capture.read_latest(self.buffer_size, out=self.plan.frame) is not None
+        self.instrumentation.stop("read", start)
+        return complete
+
+    def step(self):
+        """
+        Analyse the next hop.
+
+        Returns (result, capture_time) with an `AnalysisResult`, or None if no new frame is available yet.
+        """
+        # Change settings between frames, never while one is being analysed
+        if self.recorder is not None:
+            self.recorder.write_settings(self.settings())
+        self.apply_settings()
+
+        if not self.read_frame():
+            return None
+        capture_time = time.perf_counter()
+        self.frame_number += 1
+
+        tracked = None
+        if self.tracker is not None:
+            start = self.instrumentation.start()
+            tracked = self.tracker.track(self.plan.frame)
+            self.instrumentation.stop("track", start)
+
+        if tracked is not None:
+            result = self.tracked_result(*tracked)
+        else:
+            result = self.search()
+            if self.tracker is not None and result.fundamental > 0:
+                self.tracker.lock(result.fundamental, result.confidence)
+
+        if self.adaptive_window is not None:
+            buffer_size = self.adaptive_window.update(result.fundamental, self.buffer_size)
+            with self.request_lock:
+                if not self.resized_by_hand:
+                    self.requested_buffer_size = min(max(buffer_size, MIN_BUFFER_SIZE), MAX_BUFFER_SIZE)
+
+        if self.recorder is not None:
+            self.recorder.write_result(result)
+        return result, capture_time
+
+    def search(self):
+        """Run the pitch engine on the current frame."""
+        if self.tracked_frames > 0:
+            # the engine skipped frames, its phase history no longer lines up with this one
+            self.engine.reset()
+            self.tracked_frames = 0
+
+        start = self.instrumentation.start()
+        self.feed_engine()
+        self.engine.transform(self.plan)
+        start = self.instrumentation.stop("fft", start)
+        self.last_search = self.engine.estimate(self.plan)._replace(spectrum_frame=self.frame_number)
+        self.instrumentation.stop("peak_pick", start)
+        return self.last_search
+
+    def feed_engine(self):
+        """Hand the input since the engine last ran to engines that keep a longer history than the window."""
+        history_size = self.engine.history_size
+        if history_size == 0:
+            return
+
+        position = self.capture.position
+        restart = self.engine_position is None or position - self.engine_position > history_size
+        count = history_size if restart else position - self.engine_position
+        self.engine_position = position
+        if count <= self.buffer_size:
+            self.engine.feed(self.plan.frame[self.buffer_size - count:], restart)
+            return
+
+        # more than a window, after tracked frames or to start over: from the capture, which keeps `history_size`
+        frames = self.capture.read_latest(min(count, self.capture.available()))
+        if frames is None:
+            frames, restart = self.plan.frame, True  # the capture was cleared meanwhile
+        self.engine.feed(frames, restart)
+
+    def tracked_result(self, fundamental, partials, partial_magnitudes, confidence):
+        """The tracker's pitch with the spectrum of the last search or refresh, partials padded to the engine's count."""
+        search = self.last_search
+        all_partials = fundamental * np.arange(1, len(search.partials) + 1)
+        all_magnitudes = np.zeros(len(search.partials))
+        count = min(len(partials), len(all_partials))
+        all_partials[:count] = partials[:count]
+        all_magnitudes[:count] = partial_magnitudes[:count]
+
+        self.tracked_frames += 1
+        if self.tracked_frames % self.spectrum_interval == 0:
+            search = self.refresh_spectrum(all_partials, all_magnitudes)
+        return search._replace(fundamental=fundamental, confidence=confidence, partials=all_partials,
+                               partial_magnitudes=all_magnitudes)
+
+    def refresh_spectrum(self, partials, partial_magnitudes):
+        """Transform the current frame for the spectrum view only, with the tracked partials as its peaks."""
+        start = self.instrumentation.start()
+        self.feed_engine()
+        frequencies, magnitudes = self.engine.display_spectrum(self.plan)
+        self.instrumentation.stop("fft", start)
+
+        present = np.flatnonzero(partial_magnitudes > 0)
+        present = present[np.argsort(partial_magnitudes[present], kind="stable")]
+        # nearest bin of each partial, on linear and log frequency axes alike
+        peaks_idx = np.clip(np.searchsorted(frequencies, partials[present]), 1, len(frequencies) - 1)
+        peaks_idx -= partials[present] - frequencies[peaks_idx - 1] < frequencies[peaks_idx] - partials[present]
+        self.last_search = self.last_search._replace(frequencies=frequencies, magnitudes=magnitudes, peaks_idx=peaks_idx,
+                                                     peak_frequencies=partials[present],
+                                                     peak_magnitudes=partial_magnitudes[present],
+                                                     spectrum_frame=self.frame_number)
+        return self.last_search
+
+def frame_summary(result, tuning=None):
+    """Reduce an analysis result to (fundamental, midi_note, cents, confidence), cents off the note in `tuning`."""
+    tuning = tuning if tuning is not None else get_tuning_system()
+    note, cents = tuning.nearest(result.fundamental)
+    if note == -128:
+        return result.fundamental, -128, 0.0, 0.0
+
+    return result.fundamental, int(note), float(cents), result.confidence
@@ -0,0 +1,373 @@
+from abc import ABC, abstractmethod
+from collections import namedtuple
+import numpy as np
+
+from tuner.constant_q import get_constant_q_kernel
+from tuner.decimation import PolyphaseDecimator
+from tuner.harmonics import HarmonicGrouper
+from tuner.pitch_estimation import PeakRefiner, create_refiner
+
+# Bumped whenever a change to the engines changes their results, stored in session recordings (see tuner.recording)
+ENGINE_VERSION = 2
+
+# Result of analysing one frame. `peak_frequencies`/`peak_magnitudes` are ordered by ascending
+# magnitude; `fundamental` is the detected pitch in Hz (0 if none), `confidence` lies in [0, 1].
+# `partials[k - 1]` is the frequency of the k-th harmonic of the fundamental. `spectrum_frame` numbers
+# the frame the spectrum was computed on, tracked frames repeat it until the next refresh (see AnalysisPipeline).
+AnalysisResult = namedtuple("AnalysisResult", ["frequencies", "magnitudes", "peaks_idx", "peak_frequencies",
+                                               "peak_magnitudes", "fundamental", "confidence", "partials",
+                                               "partial_magnitudes", "spectrum_frame"], defaults=(0,))
+
+class PitchEngine(ABC):
+    """
+    Base class for pitch engines. An engine turns the frame held by an `AnalysisPlan` into an `AnalysisResult`.
+
+    Analysis is split into `transform` and `estimate`, so the two halves can be timed separately.
+    """
+
+    name = None
+    history_size = 0  # Frames of input the engine keeps itself, beyond the plan's frame (see `feed`)
+
+    def __init__(self, sample_rate, buffer_size, hop_size, refinement="phase_vocoder"):
+        self.refinement = refinement
+        self.configure(sample_rate, buffer_size, hop_size)
+
+    def configure(self, sample_rate, buffer_size, hop_size):
+        """Adapt to a new sample rate, buffer size or hop size. Drops any frame history."""
+        self.sample_rate = sample_rate
+        self.buffer_size = buffer_size
+        self.hop_size = hop_size
+
+    def reset(self):
+        """Forget state carried over from previous frames."""
+        pass
+
+    def set_refinement(self, refinement):
+        self.refinement = refinement
+
+    def feed(self, frames, restart=False):
+        """
+        Take the input that arrived since the last call, oldest first, for engines with a `history_size`.
+        With `restart` the frames replace the history instead of continuing it.
+        """
+        pass
+
+    def transform(self, plan):
+        plan.transform()
+
+    @abstractmethod
+    def estimate(self, plan):
+        pass
+
+    def analyse(self, plan):
+        self.transform(plan)
+        return self.estimate(plan)
+
+    def display_spectrum(self, plan):
+        """Transform the frame for the spectrum view only, without estimating a pitch. Returns (frequencies, magnitudes)."""
+        plan.transform()
+        return plan.frequencies, plan.publish_magnitudes()
+
+class FftEngine(PitchEngine):
+    """Picks the spectral peaks, refines them beyond the bin resolution and groups them into a harmonic series."""
+
+    name = "fft"
+
+    def configure(self, sample_rate, buffer_size, hop_size):
+        super().configure(sample_rate, buffer_size, hop_size)
+        self.refiner = create_refiner(self.refinement, sample_rate, buffer_size, hop_size)
+        self.grouper = HarmonicGrouper()
+
+    def reset(self):
+        self.refiner.reset()
+
+    def set_refinement(self, refinement):
+        super().set_refinement(refinement)
+        self.refiner = create_refiner(refinement, self.sample_rate, self.buffer_size, self.hop_size)
+
+    def estimate(self, plan):
+        peaks_idx = plan.local_maxima(plan.magnitudes, self.grouper.min_frequency)
+        peak_frequencies, peak_magnitudes = self.refiner.refine(plan.spectrum, plan.magnitudes, peaks_idx)
+        fundamental, partials, partial_magnitudes, confidence = self.grouper.group(peak_frequencies, peak_magnitudes)
+
+        return AnalysisResult(plan.frequencies, plan.publish_magnitudes(), peaks_idx, peak_frequencies, peak_magnitudes,
+                              fundamental, confidence, partials, partial_magnitudes)
+
+class ConstantQEngine(PitchEngine):
+    """
+    Picks peaks on a constant-Q spectrum (see `ConstantQKernel`), so bins are equally many cents wide
+    from A0 up, instead of a linear FFT's few bins below 200 Hz and thousands above 2 kHz.
+
+    The kernels of the low octaves reach back further than any analysis window, so the engine keeps
+    its own history: the input it is fed runs through a chain of `PolyphaseDecimator`s, and every
+    level keeps the last `fft_size` samples of its rate. The window and its size are not used.
+    The lower levels lag by the delay of their filters, a small fraction of their kernels' length.
+
+    The constant-Q magnitudes replace the FFT magnitudes in the result, so the spectrum view and the
+    waterfall show them as well. Peaks are interpolated on the log magnitudes across bins; with the
+    phase vocoder refinement the phase advance of a peak's bin since the last frame then pins the
+    frequency down, unwrapped around the interpolated estimate, since a constant-Q bin spans more
+    than one phase turn per hop at the top of the range.
+    """
+
+    name = "cqt"
+    bins_per_octave = 36  # 33 cents per bin, keeps neighbouring harmonics up to the 12th apart
+    relative_threshold = 0.01
+    output_slots = 3
+
+    def configure(self, sample_rate, buffer_size, hop_size):
+        super().configure(sample_rate, buffer_size, hop_size)
+        self.kernel = kernel = get_constant_q_kernel(sample_rate, self.bins_per_octave)
+        self.grouper = HarmonicGrouper()
+
+        factor = kernel.level_factor
+        self.decimators = [PolyphaseDecimator(factor) for _ in range(kernel.level_count - 1)]
+        # input frames behind the oldest sample of the longest kernel, including the filters before its level
+        filter_span = (len(self.decimators[0].taps) - 1) * (factor ** kernel.levels - 1) // (factor - 1) if self.decimators else 0
+        self.history_size = int(np.max(kernel.lengths * factor ** kernel.levels + filter_span))
+        self.levels = np.zeros((kernel.level_count, kernel.fft_size))  # Newest sample last
+        self.level_advance = np.zeros(kernel.level_count)  # Input frames each level moved on by the last feed
+
+        bin_count = kernel.bin_count
+        self.spectra = np.zeros((kernel.level_count, kernel.spectrum_size), dtype=np.complex128)
+        self.products = np.zeros(len(kernel.indices), dtype=np.complex128)
+        self.coefficients = np.zeros(bin_count, dtype=np.complex128)
+        self.previous = np.zeros(bin_count, dtype=np.complex128)
+        self.magnitudes = np.zeros(bin_count)
+        self.output_magnitudes = np.zeros((self.output_slots, bin_count))
+        self.output_index = 0
+        self.has_previous = False
+
+    def reset(self):
+        self.has_previous = False
+
+    def feed(self, frames, restart=False):
+        if restart:
+            self.levels[:] = 0
+            for decimator in self.decimators:
+                decimator.reset()
+            self.has_previous = False
+
+        block = frames
+        for level, history in enumerate(self.levels):
+            if level > 0:
+                block = self.decimators[level - 1].process(block)
+            count = min(len(block), len(history))
+            if count > 0:
+                history[:-count] = history[count:]
+                history[-count:] = block[len(block) - count:]
+            self.level_advance[level] = len(block) * self.kernel.level_factor ** level
+
+    def transform(self, plan):
+        # the kernels carry their own windows, so the raw level histories are transformed
+        np.fft.rfft(self.levels, axis=1, out=self.spectra)
+        self.kernel.apply(self.spectra, self.products, self.coefficients)
+        np.abs(self.coefficients, out=self.magnitudes)
+
+    def local_maxima(self, max_peaks):
+        """Constant-Q bins above the threshold that are local maxima, up to `max_peaks`, in ascending order of magnitude."""
+        magnitudes = self.magnitudes
+        inner = magnitudes[1:-1]
+        mask = (inner > magnitudes[:-2]) & (inner >= magnitudes[2:]) & (inner >= self.relative_threshold * magnitudes.max())
+        mask &= self.kernel.frequencies[1:-1] >= self.grouper.min_frequency
+
+        peaks_idx = np.flatnonzero(mask) + 1
+        if len(peaks_idx) > max_peaks:
+            peaks_idx = peaks_idx[np.argpartition(magnitudes[peaks_idx], -max_peaks)[-max_peaks:]]
+        return peaks_idx[np.argsort(magnitudes[peaks_idx], kind="stable")]
+
+    def refine(self, peaks_idx):
+        """Return (peak_frequencies, peak_magnitudes) for the given constant-Q bins."""
+        kernel = self.kernel
+        magnitudes = self.magnitudes
+        if self.refinement == "none" or len(peaks_idx) == 0:
+            return kernel.frequencies[peaks_idx], magnitudes[peaks_idx]
+
+        # parabola through the log magnitudes, the bins being equally spaced in log frequency
+        tiny = np.finfo(np.float64).tiny
+        left, center, right = (np.log(magnitudes[peaks_idx + shift] + tiny) for shift in (-1, 0, 1))
+        offset, height = PeakRefiner.fit_parabola(left, center, right)
+        peak_frequencies = kernel.min_frequency * 2 ** ((peaks_idx + offset) / kernel.bins_per_octave)
+        peak_magnitudes = np.exp(height)
+
+        if self.refinement == "phase_vocoder" and self.has_previous:
+            # deviation of the measured phase advance from the one expected at the interpolated frequency,
+            # over the input its level moved on (a level moves in steps of level_factor ** level frames, maybe not at all)
+            hop_phase = 2 * np.pi * self.level_advance[kernel.levels[peaks_idx]] / self.sample_rate
+            advance = np.angle(self.coefficients[peaks_idx]) - np.angle(self.previous[peaks_idx])
+            deviation = np.mod(advance - peak_frequencies * hop_phase + np.pi, 2 * np.pi) - np.pi
+            moved = hop_phase > 0
+            peak_frequencies[moved] += deviation[moved] / hop_phase[moved]
+
+        return peak_frequencies, peak_magnitudes
+
+    def estimate(self, plan):
+        peaks_idx = self.local_maxima(plan.max_peaks)
+        peak_frequencies, peak_magnitudes = self.refine(peaks_idx)
+        np.copyto(self.previous, self.coefficients)
+        self.has_previous = True
+        fundamental, partials, partial_magnitudes, confidence = self.grouper.group(peak_frequencies, peak_magnitudes)
+
+        return AnalysisResult(self.kernel.frequencies, self.publish_magnitudes(), peaks_idx, peak_frequencies,
+                              peak_magnitudes, fundamental, confidence, partials, partial_magnitudes)
+
+    def display_spectrum(self, plan):
+        # keeps the log frequency axis of the constant-Q view
+        self.transform(plan)
+        return self.kernel.frequencies, self.publish_magnitudes()
+
+    def publish_magnitudes(self):
+        """Copy the magnitudes into the next output slot, like `AnalysisPlan.publish_magnitudes`."""
+        self.output_index = (self.output_index + 1) % self.output_slots
+        output = self.output_magnitudes[self.output_index]
+        np.copyto(output, self.magnitudes)
+        return output
+
+class TimeDomainEngine(PitchEngine):
+    """
+    Base class for autocorrelation-type estimators, which need only a few periods of signal.
+
+    For lags up to half the buffer it computes the autocorrelation r(tau) = sum x[j] x[j + tau] with one
+    zero-padded FFT, and the energy term m(tau) = sum x[j]^2 + x[j + tau]^2 from cumulative sums.
+    """
+
+    min_frequency = 20.0  # Lowest detectable pitch, below F#0 on a 7-string bass
+    max_frequency = 2000.0
+    harmonic_count = 12  # Partials reported along with the fundamental
+
+    def configure(self, sample_rate, buffer_size, hop_size):
+        super().configure(sample_rate, buffer_size, hop_size)
+        self.fft_size = 1 << (2 * buffer_size - 1).bit_length()
+        self.max_lag = max(min(buffer_size // 2, int(sample_rate / self.min_frequency)), 4)
+        self.min_lag = max(2, int(sample_rate / self.max_frequency))
+
+        self.padded = np.zeros(self.fft_size)
+        self.spectrum = np.zeros(self.fft_size // 2 + 1, dtype=np.complex128)
+        self.power = np.zeros(self.fft_size // 2 + 1)
+        self.squares = np.zeros(buffer_size)
+        self.energy = np.zeros(self.max_lag + 1)  # m(tau)
+        self.lags = np.arange(self.max_lag + 1)
+        self.autocorrelation = None  # r(tau)
+
+    def transform(self, plan):
+        plan.transform()  # The spectrum is still needed for the display
+
+        # remove any DC offset, it would add a constant to the whole autocorrelation
+        frame = self.padded[:self.buffer_size]
+        np.subtract(plan.frame, np.mean(plan.frame), out=frame)
+
+        np.fft.rfft(self.padded, out=self.spectrum)
+        np.multiply(self.spectrum.real, self.spectrum.real, out=self.power)
+        self.power += self.spectrum.imag * self.spectrum.imag
+        self.autocorrelation = np.fft.irfft(self.power, n=self.fft_size)[:self.max_lag + 1]
+
+        np.multiply(frame, frame, out=self.squares)
+        prefix = np.cumsum(self.squares)
+        suffix = np.cumsum(self.squares[::-1])
+        self.energy[0] = 2 * prefix[-1]
+        self.energy[1:] = 2 * prefix[-1] - prefix[:self.max_lag] - suffix[:self.max_lag]
+
+    @abstractmethod
+    def find_period(self):
+        """Return (lag, confidence) of the detected period, lag in fractional samples, or (0, 0) for none."""
+
+    def estimate(self, plan):
+        lag, confidence = self.find_period()
+        fundamental = self.sample_rate / lag if lag > 0 else 0.0
+
+        # the partials are exact multiples of the period, their spectrum bins are reported as peaks
+        partials = fundamental * np.arange(1, self.harmonic_count + 1)
+        bin_width = self.sample_rate / self.buffer_size
+        partials_idx = np.minimum(np.round(partials / bin_width).astype(int), plan.bin_count - 1)
+        partial_magnitudes = plan.magnitudes[partials_idx]
+        order = np.argsort(partial_magnitudes, kind="stable")
+
+        return AnalysisResult(plan.frequencies, plan.publish_magnitudes(), partials_idx[order], partials[order],
+                              partial_magnitudes[order], fundamental, confidence, partials, partial_magnitudes)
+
+    def interpolate(self, values, lag):
+        """Fractional lag of the extremum around `lag`, by a parabola through its neighbours."""
+        if lag <= 0 or lag >= len(values) - 1:
+            return float(lag)
+
+        left, center, right = values[lag - 1], values[lag], values[lag + 1]
+        denominator = left - 2 * center + right
+        if denominator == 0:
+            return float(lag)
+        return lag + float(np.clip(0.5 * (left - right) / denominator, -0.5, 0.5))
+
+class McLeodEngine(TimeDomainEngine):
+    """McLeod pitch method: picks the first key maximum of the normalised square difference function (NSDF)."""
+
+    name = "mpm"
+    cutoff = 0.9  # Key maxima within this fraction of the highest one are candidates, the first one wins
+    min_clarity = 0.3
+
+    def find_period(self):
+        energy = self.energy
+        nsdf = np.divide(2 * self.autocorrelation, energy, out=np.zeros_like(energy), where=energy > 0)
+        self.nsdf = nsdf
+
+        # positive lobes after the first negative-going zero crossing
+        negative = np.flatnonzero(nsdf < 0)
+        if len(negative) == 0:
+            return 0.0, 0.0
+
+        positive = nsdf > 0
+        maxima = np.flatnonzero(positive[1:-1] & (nsdf[1:-1] > nsdf[:-2]) & (nsdf[1:-1] >= nsdf[2:])) + 1
+        maxima = maxima[(maxima > negative[0]) & (maxima >= self.min_lag)]
+        if len(maxima) == 0:
+            return 0.0, 0.0
+
+        # one key maximum per positive lobe: the highest local maximum between two zero crossings
+        lobe = np.cumsum(np.diff(positive.astype(np.int8)) == 1)[maxima - 1]
+        lobe_max = np.zeros(lobe[-1] + 1)
+        np.maximum.at(lobe_max, lobe, nsdf[maxima])
+        key_maxima = maxima[nsdf[maxima] == lobe_max[lobe]]
+
+        values = nsdf[key_maxima]
+        chosen = key_maxima[np.argmax(values >= self.cutoff * np.max(values))]
+        clarity = float(nsdf[chosen])
+        if clarity < self.min_clarity:
+            return 0.0, clarity
+
+        return self.interpolate(nsdf, chosen), clarity
+
+class YinEngine(TimeDomainEngine):
+    """YIN: picks the first dip of the cumulative mean normalised difference function below a threshold."""
+
+    name = "yin"
+    threshold = 0.15
+
+    def find_period(self):
+        difference = np.maximum(self.energy - 2 * self.autocorrelation, 0)
+
+        cumulative = np.cumsum(difference[1:])
+        cmnd = np.ones_like(difference)
+        np.divide(difference[1:] * self.lags[1:], cumulative, out=cmnd[1:], where=cumulative > 0)
+        self.cmnd = cmnd
+
+        search = cmnd[self.min_lag:]
+        below = np.flatnonzero(search < self.threshold)
+        if len(below) > 0:
+            # walk down to the bottom of the first dip
+            start = below[0]
+            rising = np.flatnonzero(np.diff(search[start:]) >= 0)
+            lag = self.min_lag + start + (rising[0] if len(rising) > 0 else len(search) - start - 1)
+        else:
+            lag = self.min_lag + int(np.argmin(search))
+
+        confidence = float(np.clip(1 - cmnd[lag], 0, 1))
+        if lag >= self.max_lag or confidence < 1 - 2 * self.threshold:
+            return 0.0, confidence
+
+        return self.interpolate(difference, lag), confidence
+
+ENGINES = {engine.name: engine for engine in (FftEngine, ConstantQEngine, McLeodEngine, YinEngine)}
+
+def create_engine(name, sample_rate, buffer_size, hop_size, refinement="phase_vocoder"):
+    """Create a pitch engine by name (see `ENGINES`)."""
+    if name not in ENGINES:
+        raise ValueError(f"unknown pitch engine '{name}'")
+
+    return ENGINES[name](sample_rate, buffer_size, hop_size, refinement)
@@ -0,0 +1,121 @@
+import numpy as np
+
+# Window functions applied to each frame before the FFT
+WINDOW_FUNCTIONS = {
+    "rectangular": np.ones,
+    "hann": np.hanning,
+    "hamming": np.hamming,
+    "blackman": np.blackman,
+}
+
+def create_window(name, size):
+    """Create an analysis window of the given size."""
+    if name not in WINDOW_FUNCTIONS:
+        raise ValueError(f"unknown window function '{name}'")
+
+    return WINDOW_FUNCTIONS[name](size)
+
+class PeakRefiner:
+    """Reports peak frequencies at the raw FFT bin centres, without refinement."""
+
+    name = "none"
+
+    def __init__(self, sample_rate, buffer_size, hop_size=None):
+        self.configure(sample_rate, buffer_size, hop_size)
+
+    def configure(self, sample_rate, buffer_size, hop_size=None):
+        """Adapt to a new sample rate, buffer size or hop size. Drops any frame history."""
+        self.sample_rate = sample_rate
+        self.buffer_size = buffer_size
+        self.hop_size = buffer_size if hop_size is None else hop_size
+        self.bin_width = sample_rate / buffer_size
+        self.reset()
+
+    def reset(self):
+        """Forget state carried over from previous frames, e.g. after the input was paused."""
+        pass
+
+    def refine(self, spectrum, magnitudes, peaks_idx):
+        """Return (peak_frequencies, peak_magnitudes) for the given peak bins."""
+        return peaks_idx * self.bin_width, magnitudes[peaks_idx]
+
+    def neighbours(self, values, peaks_idx):
+        """Values at the peak bins and their left and right neighbours, clamped at the edges."""
+        left = values[np.maximum(peaks_idx - 1, 0)]
+        center = values[peaks_idx]
+        right = values[np.minimum(peaks_idx + 1, len(values) - 1)]
+        return left, center, right
+
+    @staticmethod
+    def fit_parabola(left, center, right):
+        """Vertex offset (in bins) and height of the parabola through three equally spaced points."""
+        denominator = left - 2 * center + right
+        safe = np.where(denominator == 0, 1, denominator)
+        offset = np.where(denominator == 0, 0.0, 0.5 * (left - right) / safe)
+        offset = np.clip(offset, -0.5, 0.5)
+        height = center - 0.25 * (left - right) * offset
+        return offset, height
+
+class ParabolicRefiner(PeakRefiner):
+    """Fits a parabola through the linear magnitudes around each peak bin."""
+
+    name = "parabolic"
+
+    def refine(self, spectrum, magnitudes, peaks_idx):
+        offset, height = self.fit_parabola(*self.neighbours(magnitudes, peaks_idx))
+        return (peaks_idx + offset) * self.bin_width, height
+
+class GaussianRefiner(PeakRefiner):
+    """Fits a parabola through the log magnitudes around each peak bin (Gaussian peak shape)."""
+
+    name = "gaussian"
+
+    def refine(self, spectrum, magnitudes, peaks_idx):
+        left, center, right = self.neighbours(magnitudes, peaks_idx)
+        tiny = np.finfo(np.float64).tiny
+        offset, height = self.fit_parabola(np.log(left + tiny), np.log(center + tiny), np.log(right + tiny))
+        return (peaks_idx + offset) * self.bin_width, np.exp(height)
+
+class PhaseVocoderRefiner(PeakRefiner):
+    """
+    Estimates the instantaneous frequency of each peak from the phase advance between two consecutive frames.
+
+    Frames must be `hop_size` samples apart. Falls back to Gaussian interpolation whenever no
+    previous frame is available, e.g. on the first frame or after `reset`.
+    """
+
+    name = "phase_vocoder"
+
+    def reset(self):
+        self.previous_spectrum = None
+        self.has_previous = False
+        self.fallback = GaussianRefiner(self.sample_rate, self.buffer_size, self.hop_size)
+
+    def refine(self, spectrum, magnitudes, peaks_idx):
+        if self.previous_spectrum is None or len(self.previous_spectrum) != len(spectrum):
+            self.previous_spectrum = np.zeros_like(spectrum)
+            self.has_previous = False
+
+        if not self.has_previous:
+            np.copyto(self.previous_spectrum, spectrum)
+            self.has_previous = True
+            return self.fallback.refine(spectrum, magnitudes, peaks_idx)
+
+        # phase advance expected for a sinusoid sitting exactly on the bin centre
+        expected_advance = 2 * np.pi * peaks_idx * self.hop_size / self.buffer_size
+        deviation = np.angle(spectrum[peaks_idx]) - np.angle(self.previous_spectrum[peaks_idx]) - expected_advance
+        np.copyto(self.previous_spectrum, spectrum)
+        deviation = np.mod(deviation + np.pi, 2 * np.pi) - np.pi
+
+        offset = deviation * self.buffer_size / (2 * np.pi * self.hop_size)
+        _, peak_magnitudes = self.fallback.refine(spectrum, magnitudes, peaks_idx)
+        return (peaks_idx + offset) * self.bin_width, peak_magnitudes
+
+REFINERS = {refiner.name: refiner for refiner in (PeakRefiner, ParabolicRefiner, GaussianRefiner, PhaseVocoderRefiner)}
+
+def create_refiner(name, sample_rate, buffer_size, hop_size=None):
+    """Create a peak refinement stage by name (see `REFINERS`)."""
+    if name not in REFINERS:
+        raise ValueError(f"unknown peak refinement '{name}'")
+
+    return REFINERS[name](sample_rate, buffer_size, hop_size)
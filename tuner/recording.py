@@ -0,0 +1,356 @@
+"""
+Session recordings: the raw input of a tuning session and the results analysed from it, in one
+append-only binary file that can be memory-mapped, and their replay through the pipeline.
+
+Layout, all little-endian:
+
+- a 128-byte header (`HEADER`): magic, format version, input sample rate and channels, the
+  starting buffer size, hop size, decimation, engine, refinement and window, `ENGINE_VERSION`
+- chunks, in the order they happened, each a 24-byte `CHUNK` head (tag, payload length, input
+  position in frames, seconds since the start) and a payload padded to 8 bytes:
+  - `AUDI` a block of raw interleaved int16 input as the capture received it
+  - `CONF` the pipeline settings as JSON, whenever they changed before a frame
+  - `RSLT` one result: fundamental, confidence and partials, analysed at the input position
+  - `RSET` the pipeline was reset (e.g. resumed after a pause), `OVFL` input was lost
+- on close an `INDX` chunk listing every chunk, then a 16-byte `FOOTER` pointing at it. A file
+  that was not closed (a crash, a pulled plug) has no footer and is indexed by scanning its chunks.
+
+Positions count raw input frames since the recording started. A result's position is the
+input consumed when its frame was read, so replay can rebuild exactly the window it was analysed on.
+"""
+
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import numpy as np
+
+from tuner.audio_capture import BlockCapture
+from tuner.audio_source import AudioSource
+from tuner.pipeline import AnalysisPipeline
+from tuner.pitch_engines import ENGINE_VERSION
+
+RECORDING_SUFFIX = ".stroby"
+FORMAT_VERSION = 1
+
+MAGIC = b"STROBYRC"
+HEADER = struct.Struct("<8sHHdIIH16s16s16sId")
+HEADER_SIZE = 128
+CHUNK = struct.Struct("<4sIQd")
+FOOTER = struct.Struct("<8sQ")
+FOOTER_MAGIC = b"STROBYIX"
+RESULT = struct.Struct("<ddI4x")  # fundamental, confidence, partial count; then the partials and their magnitudes
+
+AUDIO, SETTINGS, RESULT_TAG, RESET, OVERFLOW, INDEX = b"AUDI", b"CONF", b"RSLT", b"RSET", b"OVFL", b"INDX"
+
+# one entry per chunk: tag, offset of its payload, payload length, position, time
+INDEX_DTYPE = np.dtype([("tag", "S4"), ("offset", "<u8"), ("length", "<u4"), ("position", "<u8"), ("time", "<f8")])
+
+class SessionRecorder:
+    """
+    Appends the input of `pipeline`'s capture and the pipeline's results to a recording.
+
+    Attaching sets `pipeline.recorder` and `capture.recorder`, which call back from the capture
+    and analysis threads. Those only put the chunks on a queue: the file is written by a thread of
+    its own, so a slow disk never blocks PortAudio's callback. `close` detaches, waits for the
+    queue to drain and writes the index. Anything already buffered in the ring when recording
+    starts is not part of the recording, so the first results of a recording started mid-session
+    are not reproduced on replay.
+    """
+
+    def __init__(self, path, pipeline):
+        self.path = path
+        self.pipeline = pipeline
+        self.capture = pipeline.capture
+        self.file = open(path, "wb")
+        self.index = []
+        self.queue = queue.SimpleQueue()  # (tag, payload, position, seconds) of the chunks to write, None to stop
+        self.started_at = time.perf_counter()
+        self.origin = 0  # Input frames the capture had before the recording
+        self.frames_written = 0
+        self.last_settings = None
+
+        self.file.write(HEADER.pack(MAGIC, FORMAT_VERSION, self.capture.channels, pipeline.input_rate,
+                                    pipeline.requested_buffer_size, pipeline.hop_size, pipeline.requested_decimation,
+                                    pipeline.requested_engine.encode(), pipeline.refinement.encode(),
+                                    pipeline.window_name.encode(), ENGINE_VERSION, time.time()).ljust(HEADER_SIZE, b"\0"))
+        self.file.flush()  # a session killed before its first chunks still leaves a readable file
+        self.writer = threading.Thread(target=self.write_chunks, name="stroby-recorder", daemon=True)
+        self.writer.start()
+        with self.capture.condition:  # the first recorded block is the first after origin
+            self.origin = self.capture.input_frames
+            self.capture.recorder = self
+        pipeline.recorder = self
+
+    def put_chunk(self, tag, payload, position):
+        self.queue.put((tag, payload, position, time.perf_counter() - self.started_at))
+
+    def write_chunks(self):
+        """Writer thread: append the queued chunks to the file, in the order they were put."""
+        failed = False
+        while (chunk := self.queue.get()) is not None:
+            if failed:
+                continue  # keep draining, the capture must never wait for the recorder
+            tag, payload, position, seconds = chunk
+            try:
+                offset = self.file.tell() + CHUNK.size
+                self.file.write(CHUNK.pack(tag, len(payload), position, seconds))
+                self.file.write(payload)
+                self.file.write(b"\0" * (-len(payload) % 8))
+            except OSError as e:
+                print(f"warning: recording to {self.path} failed: {e}")
+                failed = True
+                continue
+            self.index.append((tag, offset, len(payload), position, seconds))
+
+    def write_audio(self, data):
+        """Queue a block of raw interleaved int16 input. Called by the capture, with its condition held."""
+        self.put_chunk(AUDIO, data.astype("<i2", copy=False).tobytes(), self.frames_written)
+        self.frames_written += len(data) // self.capture.channels
+
+    def write_settings(self, settings):
+        """Record the pipeline settings if they changed since the last frame. Called right before they are applied."""
+        if settings != self.last_settings:
+            self.last_settings = settings
+            self.put_chunk(SETTINGS, json.dumps(settings).encode(), self.received())
+
+    def write_result(self, result):
+        partials = np.asarray(result.partials, dtype="<f8")
+        magnitudes = np.asarray(result.partial_magnitudes, dtype="<f8")
+        payload = RESULT.pack(result.fundamental, result.confidence, len(partials)) + partials.tobytes() + magnitudes.tobytes()
+        self.put_chunk(RESULT_TAG, payload, self.consumed())
+
+    def write_reset(self):
+        self.put_chunk(RESET, b"", self.received())
+
+    def write_overflow(self):
+        """Record that input was lost, as noticed by the frame read at the input consumed so far."""
+        self.put_chunk(OVERFLOW, b"", self.consumed())
+
+    def received(self):
+        return self.capture.input_frames - self.origin
+
+    def consumed(self):
+        # negative while the frames buffered before the recording started are read
+        return max(self.capture.input_position - self.origin, 0)
+
+    def close(self):
+        """Detach from the pipeline and finish the file with its index."""
+        if self.pipeline.recorder is self:
+            self.pipeline.recorder = None
+        if self.capture.recorder is self:
+            with self.capture.condition:  # no block is half recorded after this
+                self.capture.recorder = None
+        if self.file is None:
+            return
+
+        self.queue.put(None)
+        self.writer.join()
+        index = np.array(self.index, dtype=INDEX_DTYPE)
+        offset = self.file.tell()
+        payload = index.tobytes()
+        self.file.write(CHUNK.pack(INDEX, len(payload), self.frames_written, time.perf_counter() - self.started_at))
+        self.file.write(payload)
+        self.file.write(b"\0" * (-len(payload) % 8))
+        self.file.write(FOOTER.pack(FOOTER_MAGIC, offset))
+        self.file.close()
+        self.file = None
+
+class Recording:
+    """
+    A recording opened for reading. The file is memory-mapped, audio blocks and the index are
+    views into it rather than copies.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.getsize(path) < HEADER_SIZE:
+            raise ValueError(f"{path} is not a stroby recording")
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        fields = HEADER.unpack_from(self.map, 0)
+        if fields[0] != MAGIC:
+            raise ValueError(f"{path} is not a stroby recording")
+        if fields[1] > FORMAT_VERSION:
+            raise ValueError(f"{path} has format version {fields[1]}, this stroby reads up to {FORMAT_VERSION}")
+
+        (_, self.format_version, self.channels, self.sample_rate, self.buffer_size, self.hop_size, self.decimation,
+         engine, refinement, window, self.engine_version, self.created) = fields
+        self.engine = engine.rstrip(b"\0").decode()
+        self.refinement = refinement.rstrip(b"\0").decode()
+        self.window = window.rstrip(b"\0").decode()
+        self.index = self.read_index()
+
+    def read_index(self):
+        size = len(self.map)
+        if size >= HEADER_SIZE + FOOTER.size:
+            magic, offset = FOOTER.unpack_from(self.map, size - FOOTER.size)
+            if magic == FOOTER_MAGIC:
+                tag, length, _, _ = CHUNK.unpack_from(self.map, offset)
+                return np.frombuffer(self.map, dtype=INDEX_DTYPE, count=length // INDEX_DTYPE.itemsize,
+                                     offset=offset + CHUNK.size)
+
+        # not closed: walk the chunks, up to the last complete one
+        entries = []
+        offset = HEADER_SIZE
+        while offset + CHUNK.size <= size:
+            tag, length, position, seconds = CHUNK.unpack_from(self.map, offset)
+            if tag not in (AUDIO, SETTINGS, RESULT_TAG, RESET, OVERFLOW) or offset + CHUNK.size + length > size:
+                break
+            entries.append((tag, offset + CHUNK.size, length, position, seconds))
+            offset += CHUNK.size + length + (-length % 8)
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    def chunks(self, tag):
+        return self.index[self.index["tag"] == tag]
+
+    @property
+    def frame_count(self):
+        """Input frames recorded."""
+        audio = self.chunks(AUDIO)
+        if len(audio) == 0:
+            return 0
+        return int(audio["position"][-1] + audio["length"][-1] // (2 * self.channels))
+
+    @property
+    def duration(self):
+        return self.frame_count / self.sample_rate
+
+    def audio(self, entry):
+        """The int16 samples of an `AUDI` index entry."""
+        return np.frombuffer(self.map, dtype="<i2", count=int(entry["length"]) // 2, offset=int(entry["offset"]))
+
+    def settings(self, entry):
+        return json.loads(self.map[int(entry["offset"]):int(entry["offset"] + entry["length"])])
+
+    def result(self, entry):
+        """(fundamental, confidence, partials, partial_magnitudes) of an `RSLT` index entry."""
+        offset = int(entry["offset"])
+        fundamental, confidence, count = RESULT.unpack_from(self.map, offset)
+        partials = np.frombuffer(self.map, dtype="<f8", count=count, offset=offset + RESULT.size)
+        magnitudes = np.frombuffer(self.map, dtype="<f8", count=count, offset=offset + RESULT.size + 8 * count)
+        return fundamental, confidence, partials, magnitudes
+
+    def close(self):
+        self.index = None
+        try:
+            self.map.close()
+        except BufferError:
+            pass  # arrays handed out still look into the map, it is closed once they are gone
+
+class RecordingSource(AudioSource):
+    """The input of a recording as an `AudioSource`, e.g. to watch a session again in the UI at its natural speed."""
+
+    def __init__(self, path):
+        self.recording = Recording(path)
+        super().__init__(self.recording.sample_rate, self.recording.channels)
+        self.blocks = [self.recording.audio(entry) for entry in self.recording.chunks(AUDIO)]
+        self.block = 0
+        self.offset = 0  # Samples of the current block already read
+
+    def __reduce__(self):
+        # pickled by path and reopened, like WaveFileSource
+        return type(self), (self.recording.path,)
+
+    def read(self, frames):
+        wanted = frames * self.channels
+        parts = []
+        while wanted > 0 and self.block < len(self.blocks):
+            part = self.blocks[self.block][self.offset:self.offset + wanted]
+            parts.append(part)
+            wanted -= len(part)
+            self.offset += len(part)
+            if self.offset == len(self.blocks[self.block]):
+                self.block += 1
+                self.offset = 0
+        return np.concatenate(parts).astype(np.int16) if parts else np.zeros(0, dtype=np.int16)
+
+    def close(self):
+        self.blocks = []
+        self.recording.close()
+
+class ReplayCapture(BlockCapture):
+    """
+    The capture of a replay. It is pushed up to where the live capture had a hop of new frames
+    before every step, so a frame is always due, however settings changes moved the hop accounting.
+    """
+
+    def wait_for_frames(self, count, timeout=0.5):
+        with self.condition:
+            self.consume()
+        return True
+
+def request_settings(pipeline, settings, engine=None):
+    """Request the recorded `settings` of `pipeline`, with `engine` instead of the recorded one if given."""
+    pipeline.set_engine(engine or settings["engine"])
+    if settings["buffer_size"] != pipeline.requested_buffer_size:
+        # only sizes set by hand, the ones an adaptive window picked are picked again on replay
+        pipeline.set_buffer_size(settings["buffer_size"])
+    pipeline.set_decimation(settings["decimation"])
+    pipeline.set_target(settings["target"])
+    if settings["hop_size"] != pipeline.requested_hop_size:
+        pipeline.set_hop_size(settings["hop_size"])
+    if settings["refinement"] != pipeline.refinement:
+        pipeline.set_refinement(settings["refinement"])
+    if settings["adaptive_window"] != (pipeline.requested_adaptive_options is not None):
+        pipeline.set_adaptive_window(settings["adaptive_window"])
+
+def replay(recording, engine=None, speed=0.0, instrumentation=None):
+    """
+    Feed a recording through a fresh `AnalysisPipeline`, optionally with another `engine`.
+
+    Yields (position, result, recorded) for every recorded result. The input is pushed up to the
+    recorded position before each step, and settings changes, resets and overflows are repeated
+    where they happened, so with the same engine every frame is analysed on the window it was live.
+    `recorded` is (fundamental, confidence, partials, partial_magnitudes). `result` is None where
+    the window is incomplete, e.g. at the start of a recording begun mid-session.
+
+    `speed` paces the input relative to real time (2.0 is twice as fast), 0 runs as fast as possible.
+    """
+    capture = ReplayCapture(recording.buffer_size, recording.channels)
+    pipeline = AnalysisPipeline(capture, recording.sample_rate, recording.buffer_size, recording.hop_size,
+                                window=recording.window, refinement=recording.refinement, engine=engine or recording.engine,
+                                instrumentation=instrumentation, decimation=recording.decimation)
+    blocks = []  # (position, samples) of the audio not yet pushed
+    pushed = 0  # Input frames pushed into the capture
+    started_at = time.perf_counter()
+
+    def push_until(position):
+        nonlocal pushed
+        while blocks and pushed < position:
+            start, samples = blocks[0]
+            end = start + len(samples) // recording.channels
+            take = min(position, end) - pushed
+            first = (pushed - start) * recording.channels
+            capture.push(samples[first:first + take * recording.channels])
+            pushed += take
+            if pushed == end:
+                blocks.pop(0)
+
+    for entry in recording.index:
+        tag = entry["tag"]
+        position = int(entry["position"])
+        if tag == AUDIO:
+            blocks.append((position, recording.audio(entry)))
+            continue
+
+        if speed > 0:
+            delay = started_at + position / (recording.sample_rate * speed) - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        push_until(position)
+        if tag == SETTINGS:
+            request_settings(pipeline, recording.settings(entry), engine)
+            pipeline.apply_settings()
+        elif tag == RESET:
+            pipeline.reset()
+        elif tag == OVERFLOW:
+            capture.overflows += 1
+        elif tag == RESULT_TAG:
+            frame = pipeline.step()
+            yield position, None if frame is None else frame[0], recording.result(entry)
@@ -0,0 +1,62 @@
+import time
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from tuner.mailbox import LatestResultMailbox
+
+class ResultChannel(QObject):
+    """
+    Delivers analysis results from the worker thread to a callback on the UI thread.
+
+    Only the latest result is kept, so a slow reader sees fewer frames instead of older ones and the
+    displayed latency stays bounded. The worker wakes the UI thread with a queued Qt signal, and
+    at most one wake-up is pending at any time.
+    """
+
+    result_ready = pyqtSignal()
+
+    def __init__(self, receiver, max_latency=0.1, parent=None, instrumentation=None):
+        super().__init__(parent)
+        self.receiver = receiver
+        self.instrumentation = instrumentation  # Records the capture-to-delivery latency if given
+        self.max_latency = max_latency  # Age in seconds above which a delivered frame counts as late
+        self.mailbox = LatestResultMailbox()
+        self.delivered_frames = 0
+        self.late_frames = 0
+        self.last_latency = 0.0
+
+        self.result_ready.connect(self.deliver)
+
+    def publish(self, result, timestamp=None):
+        """Post a result from any thread. `timestamp` is the `time.perf_counter()` time its input was captured."""
+        if timestamp is None:
+            timestamp = time.perf_counter()
+
+        if self.mailbox.put((timestamp, result)):
+            self.result_ready.emit()
+
+    def deliver(self):
+        """Hand the latest result to the receiver. Runs on the thread the channel lives in."""
+        item = self.mailbox.take()
+        if item is None:
+            return
+
+        timestamp, result = item
+        self.last_latency = time.perf_counter() - timestamp
+        if self.last_latency > self.max_latency:
+            self.late_frames += 1
+        if self.instrumentation is not None:
+            self.instrumentation.add_duration("latency", self.last_latency)
+
+        self.delivered_frames += 1
+        self.receiver(result)
+
+    def stats(self):
+        """Delivery counters since the channel was created."""
+        return {
+            "posted_frames": self.mailbox.posted_frames,
+            "delivered_frames": self.delivered_frames,
+            "dropped_frames": self.mailbox.dropped_frames,
+            "late_frames": self.late_frames,
+            "last_latency": self.last_latency,
+            "queue_depth": 0 if self.mailbox.slot is None else 1,
+        }
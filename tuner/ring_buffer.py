@@ -0,0 +1,69 @@
+import numpy as np
+
+class RingBuffer:
+    """
+    Fixed-capacity buffer holding the most recent samples of a stream.
+
+    A sample is a scalar by default, or an array of `shape`, e.g. one spectrum row per sample.
+    """
+
+    def __init__(self, capacity, dtype=np.float64, shape=()):
+        self.capacity = capacity
+        self.shape = tuple(shape)
+        self.buffer = np.zeros((capacity,) + self.shape, dtype=dtype)
+        self.write_index = 0
+        self.total_written = 0  # Number of samples written since the last clear
+
+    def __len__(self):
+        return min(self.total_written, self.capacity)
+
+    def clear(self):
+        self.write_index = 0
+        self.total_written = 0
+
+    def resize(self, capacity):
+        """Change the capacity, keeping as many of the most recent samples as fit."""
+        kept = min(len(self), capacity)
+        latest = self.read_latest(kept)
+
+        self.capacity = capacity
+        self.buffer = np.zeros((capacity,) + self.shape, dtype=self.buffer.dtype)
+        self.clear()
+        self.write(latest)
+
+    def write(self, samples):
+        """Append samples, overwriting the oldest ones once the buffer is full."""
+        count = len(samples)
+        if count >= self.capacity:
+            self.buffer[:] = samples[-self.capacity:]
+            self.write_index = 0
+            self.total_written += count
+            return
+
+        end = self.write_index + count
+        if end <= self.capacity:
+            self.buffer[self.write_index:end] = samples
+        else:
+            split = self.capacity - self.write_index
+            self.buffer[self.write_index:] = samples[:split]
+            self.buffer[:end - self.capacity] = samples[split:]
+
+        self.write_index = end % self.capacity
+        self.total_written += count
+
+    def read_latest(self, count, out=None):
+        """Copy the `count` most recent samples, oldest first, into `out` (allocated if not given)."""
+        if count > len(self):
+            raise ValueError(f"requested {count} samples, but only {len(self)} are buffered")
+
+        if out is None:
+            out = np.empty((count,) + self.shape, dtype=self.buffer.dtype)
+
+        start = self.write_index - count
+        if start >= 0:
+            out[:] = self.buffer[start:self.write_index]
+        else:
+            out[:-start] = self.buffer[start:]
+            out[-start:] = self.buffer[:self.write_index]
+
+        return out
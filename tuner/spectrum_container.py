@@ -1,81 +1,115 @@
 from PyQt6.QtWidgets import QWidget
-from PyQt6.QtCore import Qt, QRect, QPoint
-from PyQt6.QtGui import QPainter, QColor, QBrush, QPainterPath
+from PyQt6.QtCore import QPoint, QPointF
+from PyQt6.QtGui import QPainter, QPolygonF
 import numpy as np
 
+from tuner.instrumentation import Instrumentation
+
+class SpectrumTrace:
+    """
+    Reduces a magnitude spectrum to one polyline with two points (max and min) per pixel column.
+
+    The log-frequency-to-column mapping is computed once per (width, frequency axis), every frame
+    then costs two NumPy reductions and writes straight into the polygon's memory, so the drawing
+    cost depends on the widget width instead of the FFT size.
+    """
+
+    log_range = (0, 3.8)  # log10 of the frequencies at the left and right edge
+
+    def __init__(self, width, frequencies):
+        self.key = SpectrumTrace.key_for(width, frequencies)
+
+        x = np.interp(np.log10(np.maximum(frequencies, 1e-12)), self.log_range, [0, width])
+        columns = np.minimum(x.astype(int), width - 1)
+        columns[frequencies <= 0] = -1  # DC is not drawn
+
+        # bins are sorted by frequency, so every column covers a contiguous run of bins
+        visible = np.flatnonzero(columns >= 0)
+        self.first = visible[0] if len(visible) > 0 else len(frequencies)
+        columns = columns[self.first:]
+        self.starts = np.flatnonzero(np.diff(columns, prepend=-1) != 0)
+
+        count = len(self.starts)
+        self.column_max = np.zeros(count)
+        self.column_min = np.zeros(count)
+
+        self.polygon = QPolygonF([QPointF()] * (2 * count))
+        if count > 0:
+            # view of the polygon's points as a (2 * count, 2) array of x, y
+            pointer = self.polygon.data()
+            pointer.setsize(2 * count * 2 * 8)
+            self.points = np.frombuffer(pointer, dtype=np.float64).reshape(2 * count, 2)
+        else:
+            self.points = np.zeros((0, 2))
+        self.points[:, 0] = np.repeat(columns[self.starts] + 0.5, 2)
+
+    @staticmethod
+    def key_for(width, frequencies):
+        return width, len(frequencies), float(frequencies[-1])
+
+    def update(self, magnitudes, height, max_magnitude):
+        """Recompute the y coordinates for a new magnitude spectrum."""
+        if len(self.starts) == 0:
+            return
+
+        visible = magnitudes[self.first:]
+        np.maximum.reduceat(visible, self.starts, out=self.column_max)
+        np.minimum.reduceat(visible, self.starts, out=self.column_min)
+
+        # y = height * (1 - magnitude / max_magnitude), max first so the trace zigzags within each column
+        scale = -height / max_magnitude
+        np.multiply(self.column_max, scale, out=self.points[0::2, 1])
+        np.multiply(self.column_min, scale, out=self.points[1::2, 1])
+        self.points[:, 1] += height
+
 class SpectrumContainer(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setAutoFillBackground(False)
+        self.instrumentation = parent.tuner.instrumentation if parent is not None else Instrumentation(enabled=False)
         self.bar_count = 3  # Example: Number of strobes
         self.strobe_height = 0  # Will be updated in paintEvent
-        self.spectrum_data = None  # Holds strobe data (frequencies, magnitudes)
-        self.spectrum_size = 0
+        self.frequencies = None
+        self.magnitudes = None
+        self.trace = None  # Rebuilt when the width or the frequency axis change
         self.zoom_range = QPoint(36, 4000)
         self.peaks_idx = None
 
         self.max = 0
 
     def set_spectrum_data(self, frequencies, magnitudes, peaks_idx):
-        """Set the data for the strobes and trigger a repaint."""
+        """Set the data for the spectrum. The repaint is left to the frame clock."""
 
-        self.spectrum_data = list(zip(frequencies, magnitudes))  # Combine frequencies and magnitudes
-        self.highest_frequency = frequencies[len(frequencies) - 1]
+        self.frequencies = frequencies
+        self.magnitudes = magnitudes
+        self.highest_frequency = frequencies[-1]
         self.peaks_idx = peaks_idx
-        self.max = max(magnitudes)
-        self.update()  # Trigger a repaint
+        self.max = float(np.max(magnitudes))
 
     def paintEvent(self, event):
-        if self.spectrum_data == None:
+        if self.magnitudes is None:
             return  # No data to render
 
-        if len(self.spectrum_data) == 0:
+        if len(self.magnitudes) == 0:
             print("warning: spectrum: FFT data empty.")
             return  # No data to render
 
-        # Calculate strobe height based on the widget height
-        self.strobe_width = 1
-
-        self.visualize_spectrum()
+        self.instrumentation.timed("paint_spectrum", self.visualize_spectrum)
 
     def visualize_spectrum(self):
-        """Paint the strobe effects on the widget."""
+        """Paint the spectrum as a single polyline."""
         painter = QPainter(self)
         painter.setRenderHint(QPainter.RenderHint.Antialiasing)
 
         # Clear the background
         painter.eraseRect(self.rect())
 
-        self.spectrum_point_pairs = []
-        last_point = None
-        max_flag = False
-        for i, (frequency, magnitude) in enumerate(self.spectrum_data):                
-            point = self.calculate_spectrum_point(painter, i, frequency, magnitude)
-
-            if last_point == None:
-                last_point = point
-            
-            pair = (last_point, point)
-
-            self.spectrum_point_pairs.append(pair)
-            
-            # Draw each strobe
-            painter.drawLines(pair)
-            
-            last_point = point
-
-    # TODO: retain max. magnitude for automated vertical scaling and peak hold visualization option  
-    def calculate_spectrum_point(self, painter, index, frequency, magnitude):
-        """Draw a single strobe effect based on frequency and magnitude."""
-
-        if frequency <= 0.0:
-            band_x = -1
-        else:
-            band_x = int(np.interp(np.log10(frequency), [0, 3.8], [0, self.width()]))
+        if self.max <= 0:
+            return  # Silence, nothing to scale
 
-        band_y = int(np.interp(magnitude, [0, self.max], [self.height(), 0]))
-    
-        # Calculate width and position (based on frequency)
-        band_point = QPoint(band_x, band_y)
+        if self.trace is None or self.trace.key != SpectrumTrace.key_for(self.width(), self.frequencies):
+            self.trace = SpectrumTrace(self.width(), self.frequencies)
 
-        return band_point
+        # TODO: retain max. magnitude for automated vertical scaling and peak hold visualization option
+        self.trace.update(self.magnitudes, self.height(), self.max)
+        painter.drawPolyline(self.trace.polygon)
@@ -0,0 +1,39 @@
+from PyQt6.QtWidgets import QLabel
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QFont
+
+class StatsOverlay(QLabel):
+    """Semi-transparent text overlay with the current stage timings and counters. Hidden by default."""
+
+    refresh_interval = 0.5  # Seconds between text updates while visible
+
+    def __init__(self, parent, instrumentation):
+        super().__init__(parent)
+        self.instrumentation = instrumentation
+        self.elapsed = 0.0
+
+        font = QFont("monospace")
+        font.setStyleHint(QFont.StyleHint.Monospace)
+        font.setPointSize(8)
+        self.setFont(font)
+        self.setStyleSheet("background-color: rgba(0, 0, 0, 180); color: rgb(0, 255, 0); padding: 4px;")
+        self.setAlignment(Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
+        self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.hide()
+
+    def advance(self, dt):
+        """Called by the frame clock. Refreshes the text every `refresh_interval` seconds while visible."""
+        if not self.isVisible():
+            return False
+
+        self.elapsed += dt
+        if self.elapsed < self.refresh_interval and self.text():
+            return False
+        self.elapsed = 0.0
+
+        if not self.instrumentation.enabled:
+            self.setText("instrumentation disabled")
+        else:
+            self.setText("\n".join(self.instrumentation.format_lines()))
+        self.adjustSize()
+        return False  # setText schedules its own repaint
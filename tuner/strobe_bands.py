@@ -0,0 +1,179 @@
+from PyQt6.QtWidgets import QWidget
+from PyQt6.QtGui import QPainter, QImage
+import numpy as np
+
+from tuner.strobe_texture import COLOURS_TUNE, COLOURS_DETUNE, COLOURS_NOISE
+from tuner.strobe_wheel import STROBE_SPEED
+
+class StrobeBands:
+    """
+    Draws all strobe bands into one shared ARGB buffer with NumPy, wrapped as a QImage without copying.
+
+    Band i is harmonic i + 1 and has 2 * (i + 1) stripes across the width, like `StrobeWheel`.
+    Phase, colour and motion blur of all bands are computed as (bands x width) array operations;
+    the blur is a box filter over the stripes, which turns the square wave into a trapezoid.
+    """
+
+    speed = STROBE_SPEED  # Stripe periods per second per cent off the target
+    gap = 6  # Transparent rows between bands
+
+    def __init__(self, strobe_count):
+        self.strobe_count = strobe_count
+        self.orders = np.arange(1, strobe_count + 1)
+        self.offsets = np.zeros(strobe_count)  # Stripe offset of every band in pixels
+        self.deltas = np.zeros(strobe_count)  # Deviation from the target in semitones
+        self.moving = np.zeros(strobe_count, dtype=bool)  # Bands whose stripes move, the others hold still
+        self.resize(1, 1)
+
+    def resize(self, width, height):
+        self.width = max(width, 1)
+        self.height = max(height, self.strobe_count)
+
+        # 0xAARRGGBB pixels, the gaps stay 0 (transparent)
+        self.pixels = np.zeros((self.height, self.width), dtype=np.uint32)
+        self.image = QImage(self.pixels.data, self.width, self.height, 4 * self.width, QImage.Format.Format_ARGB32_Premultiplied)
+
+        # every band is a view of `row_height` rows in the shared buffer
+        pitch = self.height // self.strobe_count
+        row_height = pitch - min(self.gap, pitch // 4)
+        self.bands = self.pixels[:pitch * self.strobe_count].reshape(self.strobe_count, pitch, self.width)[:, :row_height]
+
+        self.x = np.arange(self.width) + 0.5
+        self.segment_widths = np.maximum(self.width / (2 * self.orders), 1)
+        self.offsets %= self.segment_widths
+
+        self.phase = np.zeros((self.strobe_count, self.width))
+        self.coverage = np.zeros((self.strobe_count, self.width))
+        self.rgb = np.zeros((self.strobe_count, self.width, 3))
+        self.row = np.zeros((self.strobe_count, self.width), dtype=np.uint32)
+
+    def reset(self):
+        self.offsets[:] = 0
+        self.deltas[:] = 0
+        self.moving[:] = False
+
+    def advance(self, dt):
+        """Move the stripes by `dt` seconds at the current offsets."""
+        self.offsets += 100 * self.deltas * self.moving * self.speed * dt * self.segment_widths
+        self.offsets %= self.segment_widths
+
+    def colours(self):
+        """(foreground, background) RGB per band, (bands x 3) each, see `StrobeWheel.lerp_color`."""
+        deviation = np.abs(self.deltas)[:, None] / 100
+        t = np.minimum(deviation, 0.5)
+        tune, detune, noise = (np.array(colours, dtype=float) for colours in (COLOURS_TUNE, COLOURS_DETUNE, COLOURS_NOISE))
+
+        foreground = np.where(deviation >= 0.5, noise[0], (1 - t) * tune[0] + t * detune[0])
+        background = np.where(deviation >= 0.5, noise[1], (1 - t) * tune[1] + t * detune[1])
+        return foreground, background
+
+    def render(self):
+        """Render all bands into `pixels` (and so into `image`)."""
+        # distance of every pixel from the centre of the foreground stripe, in stripe periods (0..0.5)
+        phase = self.phase
+        np.subtract(self.x[None, :], self.offsets[:, None], out=phase)
+        phase /= self.segment_widths[:, None]
+        phase %= 1
+        phase -= 0.25
+        np.abs(phase, out=phase)
+        np.minimum(phase, 1 - phase, out=phase)
+
+        # box blur over `blur` pixels, wider the further off the target, like the QPainter wheels
+        blur = np.interp(np.abs(self.deltas), [0, 1], [4, 8]) / self.segment_widths
+        np.subtract(0.25, phase, out=self.coverage)
+        self.coverage /= blur[:, None]
+        self.coverage += 0.5
+        np.clip(self.coverage, 0, 1, out=self.coverage)
+
+        foreground, background = self.colours()
+        np.multiply(self.coverage[:, :, None], (foreground - background)[:, None, :], out=self.rgb)
+        self.rgb += background[:, None, :]
+
+        # pack one row per band, then repeat it over the band's rows
+        rgb = self.rgb.astype(np.uint32)
+        np.left_shift(rgb[..., 0], 16, out=self.row)
+        self.row |= rgb[..., 1] << 8
+        self.row |= rgb[..., 2]
+        self.row |= 0xff000000
+        self.bands[:] = self.row[:, None, :]
+
+class StrobeBandContainer(QWidget):
+    """Drop-in replacement for `StrobeContainer` that renders through `StrobeBands` instead of one QPainter widget per wheel."""
+
+    def __init__(self, parent=None, strobe_count=3):
+        super().__init__(parent)
+        self.setAutoFillBackground(False)
+        self.tuner = parent.tuner
+        self.instrumentation = self.tuner.instrumentation
+        self.frame_clock = parent.frame_clock
+        self.strobe_count = strobe_count
+        self.strobe_data = None  # Holds strobe data (frequencies, magnitudes)
+        self.changed = False  # New data since the last frame
+        self.target_midi = 69  # None to tune every band to its nearest note
+        self.bands = StrobeBands(strobe_count)
+        self.setMinimumHeight(24 * strobe_count)
+
+    def reset_strobe_wheels(self):
+        self.bands.reset()
+        self.frame_clock.add_animation(self)
+
+    def set_strobe_data(self, frequencies, magnitudes):
+        """Set the harmonic frequencies, band i shows harmonic i + 1. The frame clock repaints the bands."""
+        self.strobe_data = (np.asarray(frequencies), np.asarray(magnitudes))
+        self.bands.moving[:] = True
+        self.update_deltas()
+
+    def hold_strobes(self):
+        """Stop the bands where they are until the next data, e.g. while no pitch is detected or the input is frozen."""
+        self.bands.moving[:] = False
+
+    def set_target_midi(self, target_midi):
+        self.target_midi = target_midi
+        self.update_deltas()
+
+    def update_deltas(self):
+        if self.strobe_data is None:
+            return
+
+        frequencies = self.strobe_data[0][:self.strobe_count]
+        if len(frequencies) < self.strobe_count:
+            # more bands than reported partials, continue the series from the fundamental
+            frequencies = np.concatenate([frequencies, frequencies[0] * self.bands.orders[len(frequencies):]])
+
+        tuning = self.tuner.tuning
+        if self.target_midi is None:
+            _, cents = tuning.nearest(frequencies)
+        else:
+            # band i tunes harmonic i + 1 against the same harmonic of the target note
+            cents = tuning.cents(frequencies, tuning.frequency(self.target_midi) * self.bands.orders)
+        self.bands.deltas[:] = cents / 100
+        self.changed = True
+
+    def advance(self, dt):
+        """Move the bands by `dt` seconds. Returns True if they need a repaint."""
+        if self.strobe_data is None:
+            return False
+
+        changed = self.changed
+        self.changed = False
+        if not np.any(self.bands.deltas[self.bands.moving]):
+            return changed
+
+        self.bands.advance(dt)
+        return True
+
+    def paintEvent(self, event):
+        self.instrumentation.timed("paint_strobes", self.paint_bands)
+
+    def paint_bands(self):
+        if self.strobe_data is None:
+            return  # No data to render
+
+        if (self.width(), self.height()) != (self.bands.width, self.bands.height):
+            self.bands.resize(self.width(), self.height())
+
+        self.bands.render()
+
+        painter = QPainter(self)
+        painter.drawImage(0, 0, self.bands.image)
+        painter.end()
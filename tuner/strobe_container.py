@@ -12,16 +12,19 @@ class StrobeContainer(QWidget):
         super().__init__(parent)
         self.setAutoFillBackground(False)
         self.tuner = parent.tuner
+        self.frame_clock = parent.frame_clock
         self.strobe_count = strobe_count
         self.strobe_height = 0  # Will be updated in paintEvent
         self.strobe_data = None # Holds strobe data (frequencies, magnitudes)
         self.strobe_wheels = None
+        self.target_midi = 69  # None to tune every wheel to its nearest note
     
     def reset_strobe_wheels(self):
         self.strobe_wheels = []
 
         for i in range(self.strobe_count):
-            self.strobe_wheels.append(StrobeWheel(self, i, target_frequency=440))
+            self.strobe_wheels.append(StrobeWheel(self, i))
+            self.frame_clock.add_animation(self.strobe_wheels[i])
 
         strobe_layout = QVBoxLayout(self)
         
@@ -31,38 +34,47 @@ class StrobeContainer(QWidget):
         self.setLayout(strobe_layout)
 
     def set_strobe_data(self, frequencies, magnitudes):
-        """Set the data for the strobes and trigger a repaint."""
-        self.strobe_data = list(zip(frequencies, magnitudes))  # Combine frequencies and magnitudes
+        """Pass the data on to the strobes, the frame clock repaints them. Wheel i shows harmonic i + 1 of the fundamental."""
+        self.strobe_data = (np.asarray(frequencies), np.asarray(magnitudes))
         self.buffer_size = len(frequencies)
+        for wheel in self.strobe_wheels:
+            wheel.held = False
 
-        self.update()  # Trigger a repaint
-
-    def paintEvent(self, event):
-        """Paint the strobe effects on the widget."""
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
-
-        # Clear the background
-        painter.fillRect(self.rect(), QColor(0, 0, 0, 0))
-
-        if self.strobe_data == None:
-            return  # No data to render
+        if len(frequencies) == 0:
+            print(f"warning: strobe FFT data empty.")
+            return
 
         # Calculate strobe height based on the widget height
         self.strobe_height = round(self.height() / self.strobe_count)
+        self.update_wheels()
 
-        if len(self.strobe_data) == 0:
-            print(f"warning: strobe FFT data empty.")
-            return
+    def hold_strobes(self):
+        """Stop the wheels where they are until the next data, e.g. while no pitch is detected or the input is frozen."""
+        for wheel in self.strobe_wheels or ():
+            wheel.held = True
 
-        for i, (frequency, magnitude) in enumerate(self.strobe_data[-self.strobe_count:]):
-            wheel = self.strobe_wheels[i]
-            wheel.set_wheel_data(i, frequency, magnitude, wheel.auto_target)
-        
     def set_target_midi(self, target_midi):
-        for i, (frequency, magnitude) in enumerate(self.strobe_data[-self.strobe_count:]):
-            f = utility.midi_to_frequency(target_midi)
-            self.strobe_wheels[i].set_wheel_data(i, frequency, magnitude, auto_target=False, target_frequency=f)
+        self.target_midi = target_midi
+        if self.strobe_data is not None:
+            self.update_wheels()
+
+    def update_wheels(self):
+        """Convert all shown partials to (note, cents) at once, the wheels just take their entry."""
+        frequencies, magnitudes = self.strobe_data
+        count = min(self.strobe_count, len(frequencies))
+        frequencies = frequencies[:count]
+        tuning = self.tuner.tuning
+
+        if self.target_midi is None:
+            notes, cents = tuning.nearest(frequencies)
+        else:
+            # wheel i tunes harmonic i + 1 against the same harmonic of the target note
+            targets = tuning.frequency(self.target_midi) * np.arange(1, count + 1)
+            notes, _ = tuning.nearest(targets)
+            cents = tuning.cents(frequencies, targets)
+
+        for i in range(count):
+            self.strobe_wheels[i].set_wheel_data(i, frequencies[i], magnitudes[i], notes[i], cents[i])
 
 class StrobeSettingsPanel(QWidget):
     def __init__(self, parent=None):
@@ -0,0 +1,58 @@
+from functools import lru_cache
+from PyQt6.QtGui import QImage, QPixmap
+import numpy as np
+
+COLOUR_BUCKETS = 32  # Colour steps between in tune and the noise colour
+BLUR_STEPS = 2  # Blur levels per pixel of radius
+
+COLOURS_TUNE = ((0, 255, 0), (0, 20, 0))
+COLOURS_DETUNE = ((220, 220, 0), (16, 20, 0))
+COLOURS_NOISE = ((128, 128, 0), (16, 20, 0))
+
+def colour_bucket(deviation):
+    """Quantise a deviation in [0, 0.5) to a colour bucket, COLOUR_BUCKETS stands for noise."""
+    if deviation >= 0.5:
+        return COLOUR_BUCKETS
+    return int(deviation * 2 * COLOUR_BUCKETS)
+
+def blur_level(radius):
+    """Quantise a blur radius in pixels."""
+    return round(radius * BLUR_STEPS)
+
+def segment_colours(bucket):
+    """(foreground, background) RGB of a colour bucket."""
+    if bucket >= COLOUR_BUCKETS:
+        return np.array(COLOURS_NOISE, dtype=float)
+
+    t = (bucket + 0.5) / (2 * COLOUR_BUCKETS)  # deviation at the bucket centre
+    return (1 - t) * np.array(COLOURS_TUNE, dtype=float) + t * np.array(COLOURS_DETUNE, dtype=float)
+
+@lru_cache(maxsize=128)
+def strobe_texture(segment_width, height, bucket, blur):
+    """
+    Pixmap of one strobe segment, left half foreground and right half background, with the blur
+    already applied. The blur wraps around, so the pixmap tiles seamlessly.
+
+    Cached by (segment width, height, colour bucket, blur level); least recently used textures are evicted.
+    """
+    segment_width = max(segment_width, 1)
+    foreground, background = segment_colours(bucket)
+    row = np.where((np.arange(segment_width) < segment_width // 2)[:, None], foreground, background)
+
+    # the segment is constant along y, so the blur is a circular 1D gaussian along x
+    sigma = blur / BLUR_STEPS / 2
+    if sigma > 0:
+        offsets = np.arange(-int(3 * sigma), int(3 * sigma) + 1)
+        kernel = np.exp(-0.5 * (offsets / sigma) ** 2)
+        kernel /= np.sum(kernel)
+        taps = (np.arange(segment_width)[:, None] + offsets[None, :]) % segment_width
+        row = np.tensordot(row[taps], kernel, axes=([1], [0]))
+
+    # 0xffRRGGBB pixels, one row repeated over the height
+    pixels = np.empty((height, segment_width), dtype=np.uint32)
+    rgb = np.clip(np.rint(row), 0, 255).astype(np.uint32)
+    pixels[:] = 0xff000000 | (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+
+    image = QImage(pixels.data, segment_width, height, 4 * segment_width, QImage.Format.Format_RGB32)
+    # the image only wraps the array, copy it before the array goes away (fromImage may share the buffer)
+    return QPixmap.fromImage(image.copy())
@@ -1,17 +1,19 @@
-from PyQt6.QtWidgets import QWidget, QLabel, QVBoxLayout, QGraphicsBlurEffect, QGraphicsColorizeEffect
-from PyQt6.QtCore import Qt, QTimer, QPoint, QPointF
-from PyQt6.QtGui import QPainter, QColor, QPixmap, QTransform, QColor
+from PyQt6.QtWidgets import QWidget, QLabel, QVBoxLayout
+from PyQt6.QtCore import QPoint
+from PyQt6.QtGui import QPainter, QColor, QPixmap
 from numpy import interp
-import math
 
-import tuner.utils as utility
+from tuner.strobe_texture import strobe_texture, colour_bucket, blur_level
+
+STROBE_SPEED = 0.25  # Segments per second per cent off the target, like a mechanical strobe disc at A4
 
 class StrobeWheel(QWidget):
-    def __init__(self, parent=None, order=0, target_frequency=None, mode='auto'):
+    def __init__(self, parent=None, order=0):
         super().__init__(parent)
         self.setAutoFillBackground(False)
 
         self.tuner = parent.tuner
+        self.instrumentation = self.tuner.instrumentation
 
         self.order = order
         self.num_segments = (order + 1)  # Number of segments in the strobe wheel
@@ -21,28 +23,17 @@ class StrobeWheel(QWidget):
         self.segment_texture = None
         self.strobe_texture = None
         
+        self.strobe_phase = 0.0  # Offset of the stripes in segments, advanced by the frame clock
         self.strobe_xoffset = 0
-        self.strobe_max_speed = 10
+        self.strobe_speed = STROBE_SPEED
+        self.changed = False  # New data since the last frame
+        self.held = False  # Stripes stand still with their last colour, see StrobeContainer.hold_strobes
         
         self.frequency = None
         self.midi = None
         self.midi_target = None
         self.midi_delta = None
 
-        self.auto_target = True
-
-        # Create and set the blur effect
-        self.blur_effect = QGraphicsBlurEffect()
-        self.blur_effect.setBlurRadius(0)  # Adjust the radius for the desired blur amount
-        self.setGraphicsEffect(self.blur_effect)
-
-        if target_frequency is None:
-            self.target_frequency = -1
-        else:
-            self.target_frequency = target_frequency
-            self.auto_target = False
-            self.midi_target = utility.frequency_to_midi_with_cents(target_frequency)
-
         self.note_label = QLabel()
         self.frequency_label = QLabel()
         self.delta_label = QLabel()
@@ -52,47 +43,12 @@ class StrobeWheel(QWidget):
         self.label_layout.addWidget(self.frequency_label)
         self.label_layout.addWidget(self.delta_label)
 
-    def create_segment_texture(self, width, height, antialiasing=True):
-        self.num_segments = (self.order + 1)  # Number of segments in the strobe wheel
-        self.segment_width = round(self.width() / (2 * self.num_segments))
-
-        pixmap = QPixmap(width, height)
-
-        # Create a QPainter object to paint on the pixmap
-        painter = QPainter(pixmap)
-        
-        # Set the render hint for smoothness (optional)
-        # painter.setRenderHint(QPainter.Antialiasing, True)
-        
-        # Get the size of the pixmap
-        width = pixmap.width()
-        height = pixmap.height()
-
-        colors_tune = [QColor(0, 255, 0), QColor(0, 20, 0)]
-        colors_detune = [QColor(220, 220, 0), QColor(16, 20, 0)]
-        colors_noise = [QColor(128, 128, 0), QColor(16, 20, 0)]
-
+    def create_segment_texture(self, width, height):
+        """Cached, pre-blurred texture of one segment for the current deviation from the target."""
         deviation = abs(self.midi_delta) / 100
-        factor = int(interp(deviation, [1, 0], [0, 100]))
-
-        if deviation >= 0.5:
-            foreground_color = colors_noise[0]
-            background_color = colors_noise[1]
-        else:
-            foreground_color = self.lerp_color(deviation, colors_tune[0], colors_detune[0])
-            background_color = self.lerp_color(deviation, colors_tune[1], colors_detune[1])
-            
-
-        # Paint the left half green
-        painter.fillRect(0, 0, width // 2, height, QColor(foreground_color))
-        
-        # Paint the right half black
-        painter.fillRect(width // 2, 0, width // 2, height, QColor(background_color))
-
-        # End the painting
-        painter.end()
+        radius = interp(abs(self.midi_delta), [0, 1], [4, 8])
 
-        return pixmap
+        return strobe_texture(width, height, colour_bucket(deviation), blur_level(radius))
     
     def lerp_color(self, t, color1, color2):
         """
@@ -113,83 +69,62 @@ class StrobeWheel(QWidget):
 
         return QColor(int(r), int(g), int(b), int(a))
     
-    def create_strobe_texture(self, strobe_width, segment_texture):
-        # Create a QPixmap that will hold the full strobe texture (width x height)
-        strobe_texture = QPixmap(strobe_width + segment_texture.width(), segment_texture.height())
-
-        # Start painting on the strobe texture
-        painter = QPainter(strobe_texture)
-        
-        # Calculate how many segments fit across the width
-        num_segments = round(strobe_width / segment_texture.width())
-        
-        # Draw the segment texture repeatedly across the entire width of the strobe texture
-        for i in range(num_segments + 1):
-            # Draw the segment at the correct horizontal position
-            painter.drawPixmap(i * segment_texture.width(), 0, segment_texture)
-        
-        # End painting
-        painter.end()
-
-        # Return the resulting strobe texture
-        return strobe_texture
-
     def set_strobe_texture(self, texture: QPixmap):
-        """Set a custom texture for the strobe segment."""
+        """Set a custom segment texture, tiled instead of the cached one. None restores the default."""
 
         self.strobe_texture = texture
     
-    def set_wheel_data(self, i, frequency, magnitude, auto_target=True, target_frequency=None):
-        """Sets strobe parameters such as input frequency, target note and note difference for strobe movement."""
-
-        self.auto_target = auto_target
+    def set_wheel_data(self, i, frequency, magnitude, note, cents):
+        """Sets the input frequency, its target note and the deviation from the target in cents, for strobe movement."""
 
-        if self.auto_target:
-            self.midi_target = utility.frequency_to_midi(frequency)
-        else:
-            if target_frequency is not None:
-                self.midi_target = utility.frequency_to_midi_with_cents(target_frequency)
-        
-        self.midi = utility.frequency_to_midi_with_cents(frequency)
+        self.midi_target = note
+        self.midi_delta = cents / 100
+        self.midi = note + self.midi_delta
         self.frequency = frequency
+        self.changed = True
+
+        self.set_label_texts()
 
-        self.midi_delta = self.midi - self.midi_target
+    def advance(self, dt):
+        """Move the stripes by `dt` seconds at the current offset. Returns True if the wheel needs a repaint."""
+        if self.midi_delta is None:
+            return False
 
-        radius = interp(abs(self.midi_delta), [0, 1], [4, 8])
-        self.blur_effect.setBlurRadius(radius)  # Adjust the radius for the desired blur amount
+        changed = self.changed
+        self.changed = False
+        if self.held or self.midi_delta == 0:
+            return changed
 
-        self.set_label_texts()
+        self.strobe_phase = (self.strobe_phase + 100 * self.midi_delta * self.strobe_speed * dt) % 1
+        return True
     
     def set_label_texts(self):
-        self.note_label.text = utility.midi_to_note_name(self.midi_target)
+        self.note_label.text = self.tuner.tuning.note_name(self.midi_target)
         self.frequency_label.text = f"{round(self.frequency, 2)}"
         self.delta_label.text = f"{round(self.midi_delta, 2)}"
 
 
     def paintEvent(self, event):
+        self.instrumentation.timed(f"paint_strobe_{self.order + 1}", self.paint_wheel)
+
+    def paint_wheel(self):
         painter = QPainter(self)
         painter.eraseRect(self.rect())
         painter.setRenderHint(QPainter.RenderHint.Antialiasing)
 
         if self.midi_delta is None:
-            self.label_layout.update()
             return
         
-        speed_scale = 1000 / self.tuner.audio_processor.buffer_size
-
-        self.strobe_xoffset += self.midi_delta * self.strobe_max_speed * speed_scale
-        self.strobe_xoffset = round(self.strobe_xoffset % self.segment_width)
-        self.segment_texture = self.create_segment_texture(self.segment_width, self.height())  # Size of the segment texture
-        self.strobe_texture = self.create_strobe_texture(self.width(), self.segment_texture)
-        
-        self.setGraphicsEffect(self.blur_effect)
+        self.num_segments = (self.order + 1)  # Number of segments in the strobe wheel
+        self.segment_width = max(round(self.width() / (2 * self.num_segments)), 1)
+        self.strobe_xoffset = round(self.strobe_phase * self.segment_width) % self.segment_width
 
-        transform = QTransform().translate(self.strobe_xoffset - self.segment_width, 0)
-        painter.setTransform(transform)
-        painter.drawPixmap(0, 0, self.strobe_texture)
-        transform.reset()
+        # the blur is part of the cached texture, so a frame is a single tiled blit shifted by the offset
+        if self.strobe_texture is not None:
+            self.segment_texture = self.strobe_texture
+        else:
+            self.segment_texture = self.create_segment_texture(self.segment_width, self.height())
+        painter.drawTiledPixmap(self.rect(), self.segment_texture, QPoint(-self.strobe_xoffset % self.segment_texture.width(), 0))
         painter.end()
 
-        self.label_layout.update()
-
 
@@ -0,0 +1,100 @@
+import math
+import numpy as np
+
+from tuner.pitch_estimation import create_window
+
+class TargetTracker:
+    """
+    Follows a note near a chosen target with a handful of narrowband detectors instead of a full spectrum.
+
+    One single-frequency DFT (a Goertzel filter) per partial of the target, over the latest
+    `periods` periods of the target, evaluated for all partials as one matrix-vector product. The
+    phase advance of each detector over one hop gives the partial's frequency, unwrapped around
+    the current estimate, so the resolution is sub-cent like the phase vocoder's. The share of
+    the frame's power the detectors explain is the confidence: it drops when the note stops, is
+    drowned out, or drifts outside `lock_range`, and the caller then goes back to full search.
+    """
+
+    min_partial_level = 0.01  # Partials weaker than this fraction of the strongest one count as missing
+
+    def __init__(self, sample_rate, hop_size, target_frequency, partials=6, periods=16, max_length=32768,
+                 min_confidence=0.5, lock_range=50.0):
+        self.sample_rate = sample_rate
+        self.hop_size = hop_size
+        self.target_frequency = target_frequency
+        self.min_confidence = min_confidence
+        self.lock_range = lock_range  # Cents around the target within which a note is followed
+
+        # partials above the usable band would only pick up noise
+        count = max(min(partials, int(0.45 * sample_rate / target_frequency)), 1)
+        self.orders = np.arange(1, count + 1)
+        self.length = min(round(periods * sample_rate / target_frequency), max_length)
+
+        window = create_window("hann", self.length)
+        phase = -2 * np.pi * target_frequency / sample_rate * np.outer(self.orders, np.arange(self.length))
+        # cosine rows above sine rows, so all detectors take one product per frame
+        self.kernels = np.vstack((window * np.cos(phase), window * np.sin(phase)))
+        self.window = window / window.sum()
+        self.amplitude_scale = 2 / window.sum()
+        self.hop_phase = 2 * np.pi * hop_size / sample_rate
+
+        self.coefficients = np.zeros((2, count))  # Real and imaginary parts of each detector
+        self.phases = np.zeros(count)
+        self.squares = np.zeros(self.length)
+        self.reset()
+
+    def reset(self):
+        """Unlock and forget the phase history, e.g. after a gap in the input."""
+        self.locked = False
+        self.has_previous = False
+        self.fundamental = self.target_frequency  # Reference the phase is unwrapped around
+
+    def lock(self, fundamental, confidence):
+        """Offer a full-search result: lock onto it if it is a confident note within `lock_range` of the target."""
+        if confidence >= self.min_confidence and abs(1200 * math.log2(fundamental / self.target_frequency)) <= self.lock_range:
+            self.locked = True
+            self.fundamental = fundamental
+
+    def track(self, frame):
+        """
+        Evaluate the detectors on the latest samples of `frame`.
+
+        Returns (fundamental, partials, partial_magnitudes, confidence) while locked, None otherwise.
+        The phase history is updated either way, so a lock taken on this frame can be used on the next.
+        """
+        latest = frame[-self.length:]
+        previous_phases = self.phases
+        np.matmul(self.kernels, latest, out=self.coefficients.reshape(-1))
+        real, imag = self.coefficients
+        self.phases = np.arctan2(imag, real)
+        had_previous = self.has_previous
+        self.has_previous = True
+        if not self.locked or not had_previous:
+            return None
+
+        # unwrap partial k around k times the last fundamental
+        expected = self.orders * self.fundamental
+        deviation = np.mod(self.phases - previous_phases - expected * self.hop_phase + np.pi, 2 * np.pi) - np.pi
+        partials = expected + deviation / self.hop_phase
+
+        magnitudes = self.amplitude_scale * np.hypot(real, imag)
+        weights = magnitudes * magnitudes
+        total_weight = float(weights.sum())
+
+        # power of the partials (a^2 / 2 each) against the windowed power of the frame
+        power = float(np.multiply(latest, latest, out=self.squares) @ self.window)
+        confidence = min(0.5 * total_weight / power, 1.0) if power > 0 else 0.0
+        fundamental = float(weights @ (partials / self.orders) / total_weight) if total_weight > 0 else 0.0
+
+        if (confidence < self.min_confidence or fundamental <= 0
+                or abs(1200 * math.log2(fundamental / self.target_frequency)) > self.lock_range):
+            self.locked = False
+            return None
+
+        # partials that are not there have no meaningful phase, report them like HarmonicGrouper does
+        missing = magnitudes < self.min_partial_level * magnitudes.max()
+        partials[missing] = self.orders[missing] * fundamental
+        magnitudes[missing] = 0
+
+        self.fundamental = fundamental
+        return fundamental, partials, magnitudes, confidence
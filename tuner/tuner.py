@@ -1,17 +1,31 @@
 import sys
+import time
 from PyQt6.QtWidgets import QApplication
 from tuner.audio_processor import AudioProcessor
+from tuner.instrumentation import Instrumentation
+from tuner.pitch_engines import ENGINES
+from tuner.tuning import get_tuning_system
 from tuner.ui import TunerWindow
-import tuner.utils as utility
 
 class Tuner:
-    def __init__(self):
-        self.audio_processor = AudioProcessor()
+    def __init__(self, source=None, strobe_backend="painter", strobe_count=3, instrumentation=True, sample_rate=12000,
+                 decimation=1, channels=1, multichannel=False, reference=440.0, temperament="equal", engine_process=False):
+        self.tuning = get_tuning_system(reference, temperament)  # Target frequencies and names of the notes
+        self.created_at = time.perf_counter()  # Until the first frame is on screen, see mark_first_frame
+        self.instrumentation = Instrumentation(enabled=instrumentation)  # Timings and counters, see toggle_stats
+        self.audio_processor = AudioProcessor(sample_rate=sample_rate, channels=channels, source=source,
+                                              instrumentation=self.instrumentation, decimation=decimation,
+                                              multichannel=multichannel, engine_process=engine_process)
+        self.strobe_backend = strobe_backend  # See tuner.ui.STROBE_BACKENDS
+        self.strobe_count = strobe_count  # Harmonics shown, up to 12
         self.app = None
         self.ui = None
         self.is_running = False
+        self.recording_path = None  # File the session is recorded to, see toggle_recording
     
     def start(self):
+        # PortAudio initialises while Qt builds the window
+        self.audio_processor.prepare()
         self.app = QApplication(sys.argv)
 
         self.ui = TunerWindow(self)
@@ -21,6 +35,12 @@ class Tuner:
 
         sys.exit(self.app.exec())
 
+    def mark_first_frame(self):
+        """Record the cold start latency, from creating the tuner to the first analysed frame on screen."""
+        if self.created_at is not None:
+            self.instrumentation.add_duration("startup", time.perf_counter() - self.created_at)
+            self.created_at = None
+
     def toggle_input_freeze(self, first_run=False):
         if first_run:
             self.is_running = True
@@ -37,15 +57,59 @@ class Tuner:
             self.ui.buffer_pause_button.setText("Freeze Input")
         else:
             self.audio_processor.pause_audio_worker()
+            self.ui.hold_strobes()  # frames still in flight are not shown on the strobes either
             self.ui.buffer_pause_button.setText("Resume Input")
 
     def buffer_increase(self):
         self.audio_processor.worker.increase_buffer_size()
+        self.ui.auto_buffer_button.setChecked(False)
 
     def buffer_decrease(self):
         self.audio_processor.worker.decrease_buffer_size()
+        self.ui.auto_buffer_button.setChecked(False)
+
+    def toggle_adaptive_window(self, enabled):
+        """Let the buffer size follow the detected pitch: long for low notes, short for high ones."""
+        self.audio_processor.adaptive_window = enabled
+        self.audio_processor.worker.set_adaptive_window(enabled)
+
+    def cycle_engine(self):
+        """Switch to the next pitch engine (FFT, constant-Q, McLeod, YIN) without interrupting the input."""
+        engines = list(ENGINES)
+        worker = self.audio_processor.worker
+        engine = engines[(engines.index(worker.requested_engine) + 1) % len(engines)]
+
+        self.audio_processor.worker.set_engine(engine)
+        self.ui.engine_button.setText(engine.upper())
     
+    def toggle_stats(self):
+        """Show or hide the timing and counter overlay."""
+        self.ui.stats_overlay.setVisible(not self.ui.stats_overlay.isVisible())
+        self.ui.stats_overlay.raise_()
+
+    def dump_stats(self):
+        path = time.strftime("stroby-stats-%Y%m%d-%H%M%S.json")
+        self.instrumentation.dump(path)
+        print(f"stats written to {path}")
+
+    def toggle_recording(self):
+        """Start or stop recording the raw input and the analysis results, for replay with `stroby replay`."""
+        if self.audio_processor.multichannel:
+            print("warning: multi-channel sessions cannot be recorded.")
+            return
+
+        worker = self.audio_processor.worker
+        if self.recording_path is None:
+            self.recording_path = time.strftime("stroby-%Y%m%d-%H%M%S.stroby")
+            worker.start_recording(self.recording_path)
+            print(f"recording to {self.recording_path}")
+        else:
+            worker.stop_recording()
+            print(f"recording written to {self.recording_path}")
+            self.recording_path = None
+
     def set_target(self, midi=69):
+        self.audio_processor.set_target(self.tuning.frequency(midi))
         if self.ui is not None:
             self.ui.strobe_container.set_target_midi(midi)
-            self.ui.strobe_settings.note_wheel_widget.label.setText(utility.midi_to_note_name(midi))
+            self.ui.strobe_settings.note_wheel_widget.label.setText(self.tuning.note_name(midi))
@@ -0,0 +1,101 @@
+"""
+Reference pitch and temperaments: what "in tune" means for every MIDI note.
+
+A `TuningSystem` precomputes the target frequency and name of all 128 MIDI notes once, for a
+reference pitch (the frequency of A4) and a temperament, so the per-frame conversions are table
+lookups: `nearest` maps a whole array of frequencies to (note, cents) with one `searchsorted`
+over the log-frequency midpoints between neighbouring targets.
+"""
+
+from functools import lru_cache
+import numpy as np
+
+import tuner.utils as utility
+
+def scale(degrees):
+    """A temperament given as the cents of the 12 degrees above its root, the same in every octave."""
+    deviations = np.asarray(degrees, dtype=float) - 100 * np.arange(12)
+
+    def offsets(midi, key):
+        return deviations[(midi - key) % 12]
+    return offsets
+
+def railsback(midi, key):
+    """
+    Stretched piano tuning, a smooth fit of the Railsback curve: the inharmonicity of piano strings
+    pushes their partials sharp, so the bass is tuned flat and the treble sharp to beat-free
+    octaves, by ~30 cents at the ends of the keyboard and hardly at all around the middle.
+    """
+    octaves = (midi - 69) / 12
+    return np.where(octaves < 0, 0.47, 0.9) * octaves ** 3
+
+TEMPERAMENTS = {
+    "equal": lambda midi, key: np.zeros(len(midi)),
+    # 5-limit just intonation on the key: pure thirds and fifths from the root, unusable far from it
+    "just": scale(1200 * np.log2([1, 16/15, 9/8, 6/5, 5/4, 4/3, 45/32, 3/2, 8/5, 5/3, 9/5, 15/8])),
+    # Werckmeister III: C-G-D-A and B-F# narrowed by a quarter of the Pythagorean comma each
+    "werckmeister": scale([0, 90.225, 192.180, 294.135, 390.225, 498.045, 588.270, 696.090, 792.180, 888.270,
+                           996.090, 1092.180]),
+    # sweetened guitar tuning: the open E, D, G and B strings a little flat of equal temperament against A
+    "sweetened": scale(100 * np.arange(12) + np.array([0, 0, -2, 0, -2, 0, 0, -3, 0, 0, 0, -1])),
+    "stretched": railsback,
+}
+
+class TuningSystem:
+    """
+    Target frequencies and names of the MIDI notes 0-127 for a reference pitch and temperament.
+
+    `key` is the pitch class (0 = C) the temperament is built on, it only matters for the ones
+    that are not the same in every key. A4 is always exactly `reference`.
+    """
+
+    def __init__(self, reference=utility.A4_FREQUENCY, temperament="equal", key=0):
+        if temperament not in TEMPERAMENTS:
+            raise ValueError(f"unknown temperament {temperament!r}, expected one of {', '.join(TEMPERAMENTS)}")
+
+        self.reference = reference
+        self.temperament = temperament
+        self.key = key
+
+        midi = np.arange(128)
+        offsets = TEMPERAMENTS[temperament](midi, key)
+        self.offsets = offsets - offsets[69]  # Cents off equal temperament per note
+        self.frequencies = reference * 2 ** ((midi - 69 + self.offsets / 100) / 12)
+        self.log_frequencies = np.log2(self.frequencies)
+        self.boundaries = (self.log_frequencies[1:] + self.log_frequencies[:-1]) / 2  # Halfway between neighbours in cents
+        self.note_names = utility.MIDI_NOTE_NAMES
+
+    def frequency(self, midi):
+        """Target frequency of a MIDI note, or of an array of them."""
+        return self.frequencies[midi]
+
+    def note_name(self, midi):
+        if midi is None or not 0 <= midi < len(self.note_names):
+            return "..."
+        return self.note_names[midi]
+
+    def nearest(self, frequencies):
+        """
+        The closest note to each frequency and the deviation from it in cents, as two arrays shaped
+        like `frequencies`. Frequencies that are not positive give note -128 and 0 cents.
+        """
+        frequencies = np.asarray(frequencies, dtype=float)
+        valid = frequencies > 0
+        log = np.log2(np.where(valid, frequencies, 1.0))
+
+        notes = np.searchsorted(self.boundaries, log)
+        cents = 1200 * (log - self.log_frequencies[notes])
+        return np.where(valid, notes, -128), np.where(valid, cents, 0.0)
+
+    def cents(self, frequencies, targets):
+        """Deviation of each frequency from its own target frequency, 0 where either is not positive."""
+        frequencies = np.asarray(frequencies, dtype=float)
+        targets = np.asarray(targets, dtype=float)
+        valid = (frequencies > 0) & (targets > 0)
+        ratio = np.where(valid, frequencies, 1.0) / np.where(valid, targets, 1.0)
+        return np.where(valid, 1200 * np.log2(ratio), 0.0)
+
+@lru_cache(maxsize=8)
+def get_tuning_system(reference=utility.A4_FREQUENCY, temperament="equal", key=0):
+    """Return the cached tuning system for this configuration, building its tables on first use."""
+    return TuningSystem(reference, temperament, key)
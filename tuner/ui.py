@@ -1,9 +1,15 @@
-import sys
-from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton
+from PyQt6.QtGui import QShortcut, QKeySequence
 from tuner.strobe_container import StrobeContainer, StrobeSettingsPanel
+from tuner.strobe_bands import StrobeBandContainer
+from tuner.channel_strobes import ChannelStrobeContainer
 from tuner.spectrum_container import SpectrumContainer
+from tuner.frame_clock import FrameClock
+from tuner.waterfall_container import WaterfallContainer
+from tuner.stats_overlay import StatsOverlay
 
-import tuner.utils as utility
+# strobe renderers: one QPainter widget per wheel, or all bands drawn with NumPy into one image
+STROBE_BACKENDS = {"painter": StrobeContainer, "numpy": StrobeBandContainer}
 
 class TunerWindow(QWidget):
     def __init__(self, tuner):
@@ -15,10 +21,23 @@ class TunerWindow(QWidget):
 
         self.desktop_container = QVBoxLayout()
 
-        self.spectrum_container = SpectrumContainer()
+        # all repaints and strobe motion are driven by this clock, not by incoming data
+        self.frame_clock = FrameClock(parent=self)
+
+        self.spectrum_container = SpectrumContainer(self)
         self.spectrum_container.setFixedHeight(80)
 
-        self.strobe_container = StrobeContainer(self, strobe_count=3)
+        self.waterfall_container = WaterfallContainer(self)
+        self.waterfall_container.setFixedHeight(120)
+        self.frame_clock.add_animation(self.waterfall_container)
+
+        if tuner.audio_processor.multichannel:
+            # one band per input channel, the spectrum and waterfall show `spectrum_channel`
+            self.strobe_container = ChannelStrobeContainer(self, channel_count=tuner.audio_processor.channels)
+        else:
+            self.strobe_container = STROBE_BACKENDS[tuner.strobe_backend](self, strobe_count=tuner.strobe_count)
+        self.spectrum_channel = 0
+        self.spectrum_frame = None  # `spectrum_frame` of the spectrum on display, see show_spectrum
         self.strobe_settings = StrobeSettingsPanel(self)
 
         self.buffer_pause_button = QPushButton("Freeze Input")
@@ -32,36 +51,95 @@ class TunerWindow(QWidget):
         self.buffer_smaller_button.setFixedWidth(60)
         self.buffer_smaller_button.clicked.connect(self.tuner.buffer_decrease)
 
+        self.auto_buffer_button = QPushButton("Auto")
+        self.auto_buffer_button.setFixedWidth(50)
+        self.auto_buffer_button.setCheckable(True)
+        self.auto_buffer_button.setChecked(self.tuner.audio_processor.adaptive_window)
+        self.auto_buffer_button.toggled.connect(self.tuner.toggle_adaptive_window)
+
+        self.engine_button = QPushButton("FFT")
+        self.engine_button.setFixedWidth(60)
+        self.engine_button.clicked.connect(self.tuner.cycle_engine)
+
+        self.stats_button = QPushButton("Stats")
+        self.stats_button.setFixedWidth(60)
+        self.stats_button.clicked.connect(self.tuner.toggle_stats)
+
+        # timings and counters on top of everything, Ctrl+D writes them to a JSON file
+        self.stats_overlay = StatsOverlay(self, self.tuner.instrumentation)
+        self.frame_clock.add_animation(self.stats_overlay)
+        self.tuner.instrumentation.add_source("display", lambda: {"frames": self.frame_clock.frames})
+        self.dump_stats_shortcut = QShortcut(QKeySequence("Ctrl+D"), self)
+        self.dump_stats_shortcut.activated.connect(self.tuner.dump_stats)
+        # Ctrl+R starts and stops recording the session, see tuner.recording
+        self.recording_shortcut = QShortcut(QKeySequence("Ctrl+R"), self)
+        self.recording_shortcut.activated.connect(self.tuner.toggle_recording)
+
         graphics_buttons_container = QHBoxLayout()
         graphics_buttons_container.addWidget(self.buffer_pause_button)
         graphics_buttons_container.addWidget(self.buffer_larger_button)
         graphics_buttons_container.addWidget(self.buffer_smaller_button)
+        graphics_buttons_container.addWidget(self.auto_buffer_button)
+        graphics_buttons_container.addWidget(self.engine_button)
+        graphics_buttons_container.addWidget(self.stats_button)
 
 
         # strobe_layout = QVBoxLayout()
         self.desktop_container.addWidget(self.strobe_container)
         self.desktop_container.addWidget(self.spectrum_container)
+        self.desktop_container.addWidget(self.waterfall_container)
         self.desktop_container.addWidget(self.strobe_settings)
         self.desktop_container.addLayout(graphics_buttons_container) #TODO: refactor 
 
         # TODO: break out into separate function
         self.setLayout(self.desktop_container)
+        self.frame_clock.start()
     
     def closeEvent(self, event):
         """Handle window close event to stop the worker."""
+        self.frame_clock.stop()
         self.tuner.audio_processor.stop_audio_worker()  # Stop the worker when closing the window
         event.accept()  # Accept the close event and close the window
 
-    def paintEvent(self, event):
-        self.spectrum_container.update()
-        self.strobe_container.update()
-        pass
-
     def update_display_fft_data(self, data):
         """Update the strobe effect with the FFT data."""
-        
-        positive_frequencies, positive_magnitudes, peaks_idx, peak_frequencies, peak_magnitudes = data
-        self.spectrum_container.set_spectrum_data(positive_frequencies, positive_magnitudes, peaks_idx)
-        self.strobe_container.set_strobe_data(peak_frequencies, peak_magnitudes)
-        
-
+        self.tuner.mark_first_frame()
+        self.show_spectrum(data)
+
+        # the wheels follow the harmonics of the fundamental, and hold still while no pitch is detected
+        if data.fundamental > 0 and self.tuner.is_running:
+            self.strobe_container.set_strobe_data(data.partials, data.partial_magnitudes)
+        else:
+            self.strobe_container.hold_strobes()
+
+    def update_display_channel_data(self, results):
+        """Update the per-channel strobes with one analysis result (or None) per input channel."""
+        self.tuner.mark_first_frame()
+        shown = results[self.spectrum_channel]
+        if shown is not None:
+            self.show_spectrum(shown)
+
+        if self.tuner.is_running:
+            self.strobe_container.set_channel_data(results)
+        else:
+            self.strobe_container.hold_strobes()
+
+    def show_spectrum(self, data):
+        """Show the spectrum of a result in the spectrum view and waterfall, unless it is already shown."""
+        # while a target is tracked, most results repeat the spectrum of an earlier frame
+        if data.spectrum_frame == self.spectrum_frame:
+            return
+
+        # the new spectrum stands for every frame since the last one shown, so the waterfall keeps its time axis
+        frames = 1
+        if self.spectrum_frame is not None and data.spectrum_frame > self.spectrum_frame:
+            frames = data.spectrum_frame - self.spectrum_frame
+        self.spectrum_frame = data.spectrum_frame
+
+        self.spectrum_container.set_spectrum_data(data.frequencies, data.magnitudes, data.peaks_idx)
+        self.frame_clock.mark_dirty(self.spectrum_container)
+        self.waterfall_container.add_spectrum(data.frequencies, data.magnitudes, frames)  # scrolled by the frame clock
+
+    def hold_strobes(self):
+        """Stop the strobes where they are, once the input is frozen or the worker has stopped."""
+        self.strobe_container.hold_strobes()
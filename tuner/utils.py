@@ -1,6 +1,9 @@
 import numpy as np
 
 A4_FREQUENCY = 440.0
+NOTE_NAMES = ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")
+# names of the MIDI notes 0-127, built once instead of on every call; notes below C0 have none
+MIDI_NOTE_NAMES = tuple(f"{NOTE_NAMES[midi % 12]}{midi // 12 - 1}" if midi >= 12 else "" for midi in range(128))
 
 def frequency_to_midi(frequency):
     """Convert frequency to the closest MIDI note."""
@@ -36,9 +39,11 @@ def midi_to_note_name(midi_number):
     if midi_number is None or midi_number < -64:
         return "..."
 
-    notes = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
-    octave = round(midi_number // 12) - 1
-    return f"{notes[round(midi_number) % 12]}{octave}" if octave >= 0 else ""
+    midi_number = round(midi_number)
+    if midi_number < len(MIDI_NOTE_NAMES):
+        return MIDI_NOTE_NAMES[max(midi_number, 0)]
+
+    return f"{NOTE_NAMES[midi_number % 12]}{midi_number // 12 - 1}"
 
 
 def semitone_to_midi(semitones, octave):
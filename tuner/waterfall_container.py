@@ -0,0 +1,169 @@
+from PyQt6.QtWidgets import QWidget
+from PyQt6.QtCore import QRectF, Qt
+from PyQt6.QtGui import QPainter, QImage, qRgb
+import numpy as np
+
+from tuner.ring_buffer import RingBuffer
+from tuner.spectrum_container import SpectrumTrace
+
+# dark green over green and yellow to white, in the colours of the strobes
+PALETTE_STOPS = ((0, (0, 0, 0)), (64, (0, 40, 0)), (150, (0, 200, 0)), (220, (220, 220, 0)), (255, (255, 255, 255)))
+
+def waterfall_palette():
+    levels = np.arange(256)
+    stops = [stop for stop, _ in PALETTE_STOPS]
+    channels = [np.interp(levels, stops, [colour[c] for _, colour in PALETTE_STOPS]).astype(int) for c in range(3)]
+    return [qRgb(r, g, b) for r, g, b in zip(*channels)]
+
+class Waterfall:
+    """
+    The spectrum history: one uint8 row per analysis frame in a preallocated ring, columns on the
+    same log-frequency axis as the spectrum view.
+
+    Memory is fixed at `rows` x `columns` bytes for the whole session. Each spectrum is mapped to a
+    row once and written for every frame it stands for; the ring is wrapped as an indexed QImage
+    without copying.
+    """
+
+    floor_db = 60  # Levels this far below the reference are black
+    decay = 0.99  # Per frame, lets the level reference follow a fading note
+
+    def __init__(self, rows, columns=512):
+        self.rows = rows
+        self.columns = columns
+        self.ring = RingBuffer(rows, np.uint8, shape=(columns,))
+        self.row = np.zeros((1, columns), dtype=np.uint8)
+        self.levels = np.zeros(columns)
+        self.reference = 0.0
+        self.wrap_image()
+
+        self.key = None
+        self.column_frequencies = 10 ** np.interp(np.arange(columns) + 0.5, [0, columns], SpectrumTrace.log_range)
+
+    def wrap_image(self):
+        self.image = QImage(self.ring.buffer.data, self.columns, self.rows, self.columns, QImage.Format.Format_Indexed8)
+        self.image.setColorTable(waterfall_palette())
+
+    def resize(self, rows):
+        """Change the number of rows, keeping the most recent ones."""
+        self.rows = rows
+        self.ring.resize(rows)
+        self.wrap_image()  # the ring has a new buffer
+
+    def map_columns(self, frequencies):
+        """Precompute which bins fall into which column, once per frequency axis."""
+        self.key = SpectrumTrace.key_for(self.columns, frequencies)
+
+        trace = SpectrumTrace(self.columns, frequencies)
+        self.first = trace.first
+        self.starts = trace.starts
+        self.covered = (trace.points[0::2, 0] - 0.5).astype(int)  # Columns with at least one bin
+        self.column_max = np.zeros(len(self.starts))
+
+    def add_spectrum(self, frequencies, magnitudes, frames=1):
+        """Append one spectrum as the newest row, repeated over the `frames` analysis frames it stands for."""
+        if self.key != SpectrumTrace.key_for(self.columns, frequencies):
+            self.map_columns(frequencies)
+
+        # columns narrower than a bin are interpolated, wider ones take the loudest bin
+        self.levels[:] = np.interp(self.column_frequencies, frequencies, magnitudes)
+        if len(self.starts) > 0:
+            np.maximum.reduceat(magnitudes[self.first:], self.starts, out=self.column_max)
+            self.levels[self.covered] = self.column_max
+
+        self.reference = max(float(np.max(self.levels)), self.reference * self.decay ** frames)
+        if self.reference <= 0:
+            self.row[:] = 0
+        else:
+            # dB below the reference, mapped to 0..255
+            np.maximum(self.levels, self.reference * 1e-12, out=self.levels)
+            self.levels /= self.reference
+            np.log10(self.levels, out=self.levels)
+            self.levels *= 20 * 255 / self.floor_db
+            self.levels += 255
+            np.clip(self.levels, 0, 255, out=self.levels)
+            self.row[0] = self.levels
+
+        self.ring.write(np.broadcast_to(self.row, (frames, self.columns)))
+
+class WaterfallContainer(QWidget):
+    """
+    Scrolling spectrogram below the spectrum, newest row at the top.
+
+    It is an animation of the frame clock: on a tick after new rows arrived, the pixels on screen
+    are scrolled down by their height and only the uncovered strip at the top is painted.
+    """
+
+    def __init__(self, parent=None, seconds=10):
+        super().__init__(parent)
+        self.setAutoFillBackground(False)
+        self.setAttribute(Qt.WidgetAttribute.WA_OpaquePaintEvent)  # every paint covers its rectangle
+
+        self.instrumentation = parent.tuner.instrumentation
+        self.audio_processor = parent.tuner.audio_processor
+        self.seconds = seconds
+        self.waterfall = Waterfall(self.history_rows())
+        self.pending_rows = 0  # Rows added since the last scroll
+        self.scroll_offset = 0.0  # Fraction of a pixel scrolled too little so far
+
+    def history_rows(self):
+        """Rows for `seconds` of history, one per analysis frame."""
+        return max(round(self.seconds * self.audio_processor.analysis_rate / self.audio_processor.hop_size), 1)
+
+    def add_spectrum(self, frequencies, magnitudes, frames=1):
+        """Append one spectrum covering `frames` analysis frames. The repaint is left to the frame clock."""
+        # the input rate is only known once the capture is open, and a device may not support the requested one
+        rows = self.history_rows()
+        if rows != self.waterfall.rows:
+            self.waterfall.resize(rows)
+            self.update()
+
+        frames = min(frames, self.waterfall.rows)
+        self.waterfall.add_spectrum(frequencies, magnitudes, frames)
+        self.pending_rows += frames
+
+    def advance(self, dt):
+        """Scroll by the rows added since the last tick. Returns True only if the whole widget needs a repaint."""
+        if self.pending_rows == 0:
+            return False
+
+        self.scroll_offset += self.pending_rows * self.height() / self.waterfall.rows
+        self.pending_rows = 0
+        pixels = int(self.scroll_offset)
+        self.scroll_offset -= pixels
+        if pixels >= self.height():
+            return True
+        if pixels > 0:
+            self.scroll(0, pixels)  # Qt moves the pixels and repaints the uncovered strip
+        return False
+
+    def paintEvent(self, event):
+        self.instrumentation.timed("paint_waterfall", self.paint_waterfall, event.rect())
+
+    def paint_waterfall(self, rect):
+        painter = QPainter(self)
+        painter.setClipRect(rect)
+        painter.eraseRect(rect)
+
+        waterfall = self.waterfall
+        ring = waterfall.ring
+        if len(ring) == 0:
+            return
+
+        # rows are drawn oldest first upwards from the bottom edge, so the newest row ends up on top
+        row_height = self.height() / ring.capacity
+        painter.translate(0, self.height())
+        painter.scale(1, -1)
+
+        def draw(first_row, count, newer):
+            """Draw `count` ring rows from `first_row` on, below `newer` more recent rows."""
+            if count == 0:
+                return
+            target = QRectF(0, (ring.capacity - newer - count) * row_height, self.width(), count * row_height)
+            painter.drawImage(target, waterfall.image, QRectF(0, first_row, waterfall.columns, count))
+
+        # the ring holds the oldest rows after the write index, then the newest ones before it
+        if len(ring) == ring.capacity:
+            draw(ring.write_index, ring.capacity - ring.write_index, ring.write_index)
+        draw(0, ring.write_index, 0)
+        painter.end()